@@ -3,6 +3,11 @@ from flask_caching import Cache
 
 from config import Config
 from .models import db
+from .utils import circuit_breaker
+from .utils.assets import init_assets
+from .utils.profiling import init_profiling
+from .utils.storage import configure_engine, init_storage
+from .utils.timing import init_server_timing
 
 # Инициализация кэша
 cache = Cache()
@@ -15,14 +20,41 @@ def create_app() -> Flask:
     # Настройка кэша
     cache.init_app(app)
 
+    configure_engine(app)
     db.init_app(app)
+    init_storage(app)
+
+    circuit_breaker.configure(
+        failure_threshold=app.config["CIRCUIT_FAILURE_THRESHOLD"],
+        backoff_base=app.config["CIRCUIT_BACKOFF_BASE_SECONDS"],
+        backoff_max=app.config["CIRCUIT_BACKOFF_MAX_SECONDS"],
+    )
+
+    from .services import http_recording
+    http_recording.configure(
+        mode=app.config["HTTP_RECORD_MODE"],
+        directory=app.config["HTTP_RECORD_DIR"],
+        speed=app.config["HTTP_REPLAY_SPEED"],
+    )
 
     # with app.app_context():
     #     db.create_all()
 
+    init_server_timing(app)
+    init_profiling(app)
+    init_assets(app)
+
     from .routes.dashboard import dashboard_bp
+    from .routes.export import export_bp
+    from .routes.metrics import metrics_bp
 
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(export_bp)
+    app.register_blueprint(metrics_bp)
+
+    if app.config.get("CACHE_WARMUP_ON_BOOT"):
+        from .services.warmup import warm_up
+        warm_up(app)
 
     return app
 
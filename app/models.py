@@ -14,7 +14,146 @@ class StockSnapshot(db.Model):
     warehouse_name = db.Column(db.String(120), nullable=False)
     sku = db.Column(db.String(64))
     quantity = db.Column(db.Integer, nullable=False, default=0)
-    captured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    captured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+class StockDaily(db.Model):
+    """Дневная сводка остатков (UTC-сутки) для истории старше срока хранения сырых данных."""
+    __tablename__ = "stock_daily"
+    __table_args__ = (db.UniqueConstraint("marketplace", "warehouse_name", "sku", "date"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(db.String(32), nullable=False)  # как в stock_deltas
+    warehouse_name = db.Column(db.String(120), nullable=False)
+    sku = db.Column(db.String(64))
+    date = db.Column(db.Date, nullable=False, index=True)
+    min_quantity = db.Column(db.Integer, nullable=False)
+    max_quantity = db.Column(db.Integer, nullable=False)
+    close_quantity = db.Column(db.Integer, nullable=False)
+    close_at = db.Column(db.DateTime, nullable=False)
+
+
+class StockDelta(db.Model):
+    """
+    История остатков по SKU и складам в виде изменений.
+
+    Строки с ``is_keyframe`` — полный срез остатков маркетплейса на момент
+    ``captured_at``; остальные — только изменившиеся пары (sku, склад),
+    пропавшая пара записывается с нулевым остатком. См. app/services/stock_history.py.
+    """
+    __tablename__ = "stock_deltas"
+    __table_args__ = (
+        db.Index("ix_stock_deltas_keyframes", "marketplace", "is_keyframe", "captured_at"),
+        db.Index("ix_stock_deltas_sku", "marketplace", "sku", "captured_at"),
+        db.Index("ix_stock_deltas_captured_at", "marketplace", "captured_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(db.String(32), nullable=False)  # 'wb' | 'ozon:<client_id>'
+    warehouse_name = db.Column(db.String(120), nullable=False)
+    sku = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    captured_at = db.Column(db.DateTime, nullable=False)
+    is_keyframe = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class OrderEvent(db.Model):
+    """
+    Заказы и продажи маркетплейсов построчно: одна строка на srid WB или на
+    товар отправления Ozon. Строки не удаляются, повторная загрузка обновляет
+    их по (marketplace, kind, event_id). См. app/services/event_store.py.
+    """
+    __tablename__ = "order_events"
+    __table_args__ = (
+        db.UniqueConstraint("marketplace", "kind", "event_id"),
+        db.Index("ix_order_events_day_sku", "marketplace", "date", "sku"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(db.String(16), nullable=False)  # 'wb' | 'ozon'
+    account = db.Column(db.String(32), nullable=False, default="")  # client_id Ozon
+    kind = db.Column(db.String(8), nullable=False)  # 'order' | 'sale'
+    event_id = db.Column(db.String(96), nullable=False)
+    sku = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    occurred_at = db.Column(db.DateTime, nullable=False)  # UTC
+    date = db.Column(db.Date, nullable=False)  # локальная дата по TIMEZONE
+    city = db.Column(db.String(120), nullable=False, default="")
+    warehouse = db.Column(db.String(120), nullable=False, default="")
+    status = db.Column(db.String(32), nullable=False, default="")
+    is_cancel = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class HourlyRollup(db.Model):
+    """
+    Заказы и продажи по часам локального дня (сумма quantity без отмен).
+    Обновляется приращениями при каждой записи order_events и сверяется
+    с сырыми строками в scripts/retention.py. См. app/services/event_store.py.
+    """
+    __tablename__ = "hourly_rollups"
+    __table_args__ = (db.UniqueConstraint("marketplace", "kind", "date", "hour"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(db.String(16), nullable=False)  # 'wb' | 'ozon'
+    kind = db.Column(db.String(8), nullable=False)  # 'order' | 'sale'
+    date = db.Column(db.Date, nullable=False)  # локальная дата по TIMEZONE
+    hour = db.Column(db.Integer, nullable=False)  # 0..23, локальное время
+    count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class StockCover(db.Model):
+    """
+    Скорость заказов и запас в днях по SKU и складу (app/services/stock_cover.py).
+
+    Пересчитывается целиком после каждого обновления; строка со складом
+    ``"*"`` — итог по SKU.
+    """
+
+    __tablename__ = "stock_cover"
+    __table_args__ = (
+        db.UniqueConstraint("marketplace", "sku", "warehouse_name"),
+        db.Index("ix_stock_cover_days", "marketplace", "days_of_cover"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    marketplace = db.Column(db.String(16), nullable=False)  # 'wb' | 'ozon'
+    sku = db.Column(db.String(64), nullable=False)
+    warehouse_name = db.Column(db.String(120), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    ordered = db.Column(db.Integer, nullable=False, default=0)  # заказов за окно STOCK_VELOCITY_DAYS
+    velocity = db.Column(db.Float, nullable=False, default=0.0)  # заказов в сутки
+    days_of_cover = db.Column(db.Float)  # None — заказов за окно не было
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class OzonPostingStatus(db.Model):
+    """
+    Последний известный статус товара отправления Ozon.
+
+    ``delivered_at`` — момент, когда обновление впервые увидело статус
+    delivered (UTC); по нему считаются выкупы за день. У отправлений,
+    доставленных до начала отслеживания, он пустой. См. app/services/posting_status.py.
+    """
+    __tablename__ = "ozon_posting_statuses"
+    __table_args__ = (
+        db.UniqueConstraint("client_id", "posting_number", "sku"),
+        db.Index("ix_ozon_posting_statuses_open", "client_id", "status", "in_process_at"),
+        db.Index("ix_ozon_posting_statuses_delivered", "client_id", "delivered_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.String(32), nullable=False)
+    posting_number = db.Column(db.String(64), nullable=False)
+    sku = db.Column(db.String(64), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(32), nullable=False, default="")
+    in_process_at = db.Column(db.DateTime, nullable=False)  # UTC
+    city = db.Column(db.String(120), nullable=False, default="")
+    warehouse = db.Column(db.String(120), nullable=False, default="")
+    delivered_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 
 class DailyMetric(db.Model):
@@ -33,6 +172,6 @@ class KeyValue(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(64), unique=True, nullable=False, index=True)
     value_json = db.Column(db.Text, nullable=False)
-    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
 
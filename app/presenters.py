@@ -1,8 +1,12 @@
 """
 Модуль для подготовки данных к отображению в шаблонах (Presenters).
 """
+from datetime import datetime
 from typing import Any
 
+from .utils.compact import EventSummaryView
+from .utils.stock_cube import FROM_CLIENT, TO_CLIENT, StockCube
+
 
 def tooltip_text(details: list[tuple[str, int]]) -> str:
     if not details:
@@ -10,10 +14,27 @@ def tooltip_text(details: list[tuple[str, int]]) -> str:
     return "\n".join([f"{name}: {qty}" for name, qty in details])
 
 
-def prepare_ozon_stock_lines(ozon_stocks_data: dict, limit: int = 8) -> list[str]:
+# Запас меньше этого числа дней выделяется в плитках остатков
+LOW_COVER_DAYS = 7
+
+
+def cover_label(days: float | None) -> str:
+    """Запас в днях для плитки: «≈12 дн.»; пусто, если заказов за окно не было."""
+    if days is None:
+        return ""
+    return "<1 дн." if days < 1 else f"≈{days:.0f} дн."
+
+
+def cover_badge(days: float | None) -> str:
+    label = cover_label(days)
+    if not label:
+        return ""
+    css = "text-danger" if days < LOW_COVER_DAYS else "text-secondary"
+    return f' <span class="{css} ms-1">{label}</span>'
+
+
+def prepare_ozon_stock_lines(oz_skus_full: list[tuple[str, int]], limit: int = 8) -> list[str]:
     ozon_stock_sku_lines: list[str] = []
-    oz_skus_full = ozon_stocks_data.get("skus", [])
-    oz_analytics = ozon_stocks_data.get("sku_analytics", {})
     if not oz_skus_full:
         return ozon_stock_sku_lines
     for sku, qty in oz_skus_full[:limit]:
@@ -24,18 +45,111 @@ def prepare_ozon_stock_lines(ozon_stocks_data: dict, limit: int = 8) -> list[str
     return ozon_stock_sku_lines
 
 
-def prepare_sku_tooltips(details_map: dict[str, list[tuple[str, int]]]) -> dict[str, str]:
+def prepare_sku_tooltips(details_map: dict[str, list[tuple[str, int]]], cover: dict[str, dict] | None = None) -> dict[str, str]:
+    """Подсказки по складам SKU; с ``cover`` — и запас в днях: «Коледино: 7 (≈12 дн.)»."""
     sku_tooltips: dict[str, str] = {}
     if not details_map:
         return sku_tooltips
     for sku, pairs in details_map.items():
         if not pairs:
             continue
-        sku_tooltips[sku] = tooltip_text(pairs)
+        by_warehouse = (cover or {}).get(sku, {})
+        labels = [cover_label(by_warehouse.get(name)) for name, _qty in pairs]
+        sku_tooltips[sku] = "\n".join(
+            f"{name}: {qty} ({label})" if label else f"{name}: {qty}" for (name, qty), label in zip(pairs, labels)
+        )
     return sku_tooltips
 
 
-def prepare_dashboard_context(wb_data: dict, ozon_data: dict, now: Any) -> dict:
+def _local_time(iso_value: str, now: Any) -> datetime:
+    value = datetime.fromisoformat(iso_value)
+    if getattr(now, "tzinfo", None):
+        value = value.astimezone(now.tzinfo)
+    return value
+
+
+def prepare_stale_notes(data: dict, now: Any) -> list[str]:
+    """Пометка для данных, отданных из резервного кэша вместо API."""
+    if data.get("warmed") and data.get("fetched_at"):
+        return [f"Данные от {_local_time(data['fetched_at'], now).strftime('%d.%m %H:%M')}, идет обновление"]
+    if not data.get("stale"):
+        return []
+    if data.get("fetched_at"):
+        return [f"API недоступен, данные от {_local_time(data['fetched_at'], now).strftime('%d.%m %H:%M')}"]
+    return ["API недоступен, данные могут быть устаревшими"]
+
+
+def prepare_breaker_alerts(breakers: list[dict]) -> list[str]:
+    """Описывает разомкнутые circuit breaker'ы для шапки страницы."""
+    alerts: list[str] = []
+    for b in breakers:
+        if b["state"] == "open":
+            alerts.append(f"{b['name']}: пауза, повтор через {b['retry_in']} с")
+        elif b["state"] == "half_open":
+            alerts.append(f"{b['name']}: проверка доступности")
+    return alerts
+
+
+def prepare_accounts_notes(accounts: list[dict], now: Any) -> list[str]:
+    """Формирует пометки для магазинов, данные которых устарели или недоступны."""
+    notes: list[str] = []
+    for acc in accounts or []:
+        if acc.get("fetched_at") is None:
+            notes.append(f"Магазин {acc.get('client_id')}: нет данных")
+        elif acc.get("stale") or acc.get("warmed"):
+            fetched_at = _local_time(acc["fetched_at"], now)
+            notes.append(f"Магазин {acc.get('client_id')}: данные от {fetched_at.strftime('%d.%m %H:%M')}")
+    return notes
+
+
+def prepare_last_updated(wb_data: dict, ozon_data: dict, tz: Any) -> datetime | None:
+    """Время самой свежей загрузки из API среди всех источников (по ``fetched_at``)."""
+    stamps: list[str] = []
+    for part in (wb_data.get("stocks"), wb_data.get("today")):
+        if part and part.get("fetched_at"):
+            stamps.append(part["fetched_at"])
+    for part in (ozon_data.get("stocks"), ozon_data.get("today")):
+        for acc in (part or {}).get("accounts", []):
+            if acc.get("fetched_at"):
+                stamps.append(acc["fetched_at"])
+    if not stamps:
+        return None
+    return max(datetime.fromisoformat(s) for s in stamps).astimezone(tz)
+
+
+def prepare_combined_stocks(cube: StockCube, limit: int = 5) -> dict:
+    """Остатки WB и Ozon вместе: итоги и крупнейшие склады для строки над плитками."""
+    return {
+        "total": cube.total(),
+        "to_client": cube.total(TO_CLIENT),
+        "from_client": cube.total(FROM_CLIENT),
+        "tooltip": tooltip_text(cube.warehouse_ranking(limit=limit)),
+    }
+
+
+def prepare_dashboard_context(
+    wb_data: dict,
+    ozon_data: dict,
+    now: Any,
+    breakers: list[dict] | None = None,
+    cover: dict[str, dict] | None = None,
+    cube: StockCube | None = None,
+) -> dict:
+    """
+    ``cover`` — запас в днях по маркетплейсам из stock_cover.sku_cover:
+    {"wb": {sku: {склад или "*": дней}}}; без него плитки показывают только остатки.
+    ``cube`` — куб остатков (utils/stock_cube.stock_cube); если не передан,
+    строится из ``wb_data``/``ozon_data``.
+    """
+    if cube is None:
+        cube = StockCube.build({
+            "wb": (wb_data.get("stocks") or {}).get("stock_table"),
+            "ozon": (ozon_data.get("stocks") or {}).get("stock_table"),
+        })
+    cover = cover or {}
+    wb_cover = cover.get("wb", {})
+    ozon_cover = cover.get("ozon", {})
+
     # WB
     if wb_data.get("error"):
         stocks_wb_context = {"error": True}
@@ -48,69 +162,70 @@ def prepare_dashboard_context(wb_data: dict, ozon_data: dict, now: Any) -> dict:
         wb_today = wb_data.get("today", {})
 
         wb_stock_items = []
-        wb_skus_list = wb_stocks.get("skus", [])
-        sku_in_way_data = wb_stocks.get("sku_in_way", {})
-        in_way_to = sku_in_way_data.get("to_client", {})
-        in_way_from = sku_in_way_data.get("from_client", {})
-
-        for sku, qty in wb_skus_list:
-            item = {"text": f"{sku}: {qty}", "sku": sku, "in_transit": None}
-            to_count = in_way_to.get(sku, 0)
-            from_count = in_way_from.get(sku, 0)
+        for sku, qty, to_count, from_count in cube.product_rows("wb"):
+            item = {"text": f"{sku}: {qty}", "sku": sku, "in_transit": None, "cover": cover_badge(wb_cover.get(sku, {}).get("*"))}
             if to_count > 0 or from_count > 0:
                 item["in_transit"] = {"to": to_count, "from": from_count}
             wb_stock_items.append(item)
 
         stocks_wb_context = {
-            "total": wb_stocks.get("total", 0),
-            "total_in_transit": wb_stocks.get("total_in_transit", 0),
-            "tooltip": tooltip_text(wb_stocks.get("warehouses", [])),
+            "total": cube.total(marketplace="wb"),
+            "total_in_transit": cube.total(TO_CLIENT, "wb"),
+            "tooltip": tooltip_text(sorted(cube.warehouse_totals("wb").items())),
             "sku_items": wb_stock_items,
-            "sku_tooltips": prepare_sku_tooltips(wb_stocks.get("sku_details", {})),
+            "sku_tooltips": prepare_sku_tooltips(cube.sku_details("wb"), wb_cover),
+            "notes": prepare_stale_notes(wb_stocks, now),
         }
-        wb_today_context = wb_today
-        wb_ordered_skus_details = wb_today.get("ordered_skus_details", {})
-        wb_purchased_skus_details = wb_today.get("purchased_skus_details", {})
+        wb_today_context = dict(wb_today, notes=prepare_stale_notes(wb_today, now))
+        wb_ordered_skus_details = EventSummaryView(wb_today.get("ordered_events"))
+        wb_purchased_skus_details = EventSummaryView(wb_today.get("purchased_events"))
 
     # Ozon
     if ozon_data.get("error"):
         stocks_ozon_context = {"error": True}
         ozon_today_context = {"error": True}
         ozon_ordered_skus_lines: list[str] = []
+        ozon_ordered_skus_details = {}
         ozon_purchased_skus_lines: list[str] = []
+        ozon_purchased_skus_details = {}
     else:
         ozon_stocks = ozon_data.get("stocks", {})
         ozon_today = ozon_data.get("today", {})
 
-        ozon_sku_analytics = ozon_stocks.get("sku_analytics", {})
+        ozon_rows = cube.product_rows("ozon")
+        ozon_in_way_to = {sku: to_count for sku, _qty, to_count, _from in ozon_rows}
+        ozon_in_way_from = {sku: from_count for sku, _qty, _to, from_count in ozon_rows}
         ozon_sku_lines_with_transit: list[str] = []
-        for line in prepare_ozon_stock_lines(ozon_stocks):
+        for line in prepare_ozon_stock_lines([(sku, qty) for sku, qty, _to, _from in ozon_rows]):
             sku_name = line.split(":")[0]
-            analytics = ozon_sku_analytics.get(sku_name, {})
 
-            transit_to_count = analytics.get("in_transit", 0)
+            transit_to_count = ozon_in_way_to.get(sku_name, 0)
             if transit_to_count > 0:
                 line += f' <span class="text-success">↑{transit_to_count}</span>'
 
-            transit_from_count = analytics.get("in_transit_from", 0)
+            transit_from_count = ozon_in_way_from.get(sku_name, 0)
             if transit_from_count > 0:
                 line += f' <span class="text-danger ms-1">↓{transit_from_count}</span>'
 
+            line += cover_badge(ozon_cover.get(sku_name, {}).get("*"))
             ozon_sku_lines_with_transit.append(line)
 
         stocks_ozon_context = {
-            "total": ozon_stocks.get("total", 0),
-            "total_in_transit": ozon_stocks.get("total_in_transit", 0),
-            "tooltip": tooltip_text(ozon_stocks.get("warehouses", [])),
+            "total": cube.total(marketplace="ozon"),
+            "total_in_transit": cube.total(TO_CLIENT, "ozon"),
+            "tooltip": tooltip_text(sorted(cube.warehouse_totals("ozon").items())),
             "sku_lines": ozon_sku_lines_with_transit,
-            "sku_tooltips": prepare_sku_tooltips(ozon_stocks.get("sku_details", {})),
+            "sku_tooltips": prepare_sku_tooltips(cube.sku_details("ozon"), ozon_cover),
+            "notes": prepare_accounts_notes(ozon_stocks.get("accounts", []), now),
         }
-        ozon_today_context = ozon_today
+        ozon_today_context = dict(ozon_today, notes=prepare_accounts_notes(ozon_today.get("accounts", []), now))
         ozon_ordered_skus_lines = [f"{sku}: {count}" for sku, count in ozon_today.get("ordered_skus", [])]
-        ozon_ordered_skus_details = ozon_today.get("ordered_skus_details", {})
-        ozon_purchased_skus_lines = []
+        ozon_ordered_skus_details = EventSummaryView(ozon_today.get("ordered_events"))
+        ozon_purchased_skus_lines = [f"{sku}: {count}" for sku, count in ozon_today.get("purchased_skus", [])]
+        ozon_purchased_skus_details = EventSummaryView(ozon_today.get("purchased_events"))
 
     context = {
+        "stocks_combined": prepare_combined_stocks(cube),
         "stocks_wb": stocks_wb_context,
         "stocks_ozon": stocks_ozon_context,
         "wb_today": wb_today_context,
@@ -120,7 +235,9 @@ def prepare_dashboard_context(wb_data: dict, ozon_data: dict, now: Any) -> dict:
         "ozon_ordered_skus_lines": ozon_ordered_skus_lines,
         "ozon_ordered_skus_details": ozon_ordered_skus_details,
         "ozon_purchased_skus_lines": ozon_purchased_skus_lines,
+        "ozon_purchased_skus_details": ozon_purchased_skus_details,
         "now": now,
+        "breaker_alerts": prepare_breaker_alerts(breakers or []),
     }
     return context
 
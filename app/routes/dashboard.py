@@ -1,39 +1,73 @@
-import os
-import shutil
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
-from flask import Blueprint, current_app, render_template, request
+from flask import Blueprint, Response, abort, current_app, jsonify, render_template, request, stream_with_context
+from sqlalchemy.exc import SQLAlchemyError
+import json
 import logging
+import queue
+import time
 
 from ..services.wb_api import fetch_stocks as wb_fetch_stocks, fetch_today_metrics as wb_fetch_today
 from ..services.ozon_api import fetch_stocks as ozon_fetch_stocks, fetch_today_metrics as ozon_fetch_today, _make_hashable as ozon_make_hashable
-from ..presenters import prepare_dashboard_context
+from ..services import event_store, ozon_api, stock_cover, wb_api
+from ..models import db
+from ..presenters import prepare_dashboard_context, prepare_last_updated
+from ..utils.circuit_breaker import breaker_states
+from ..utils.metrics import RENDER_DURATION
+from ..utils.stock_cube import METRICS, stock_cube
+from ..utils.timing import span
 from .. import cache
 
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
 
+# Загрузчики из API, чьи результаты сбрасывает ?force=1
+FORCE_REFRESH_LOADERS = (
+    wb_api.load_stocks,
+    wb_api.load_today_metrics,
+    ozon_api.fetch_catalog,
+    ozon_api.fetch_account_returns,
+    ozon_api.fetch_account_stocks,
+    ozon_api.fetch_account_today,
+)
+
+
+def drop_loader_caches() -> None:
+    """
+    Сбрасывает закэшированные ответы API. Остальной кэш (блокировки
+    fetch_lock, прогрев, общий кэш других узлов) не трогается.
+    """
+    for loader in FORCE_REFRESH_LOADERS:
+        cache.delete_memoized(loader)
+
+
 @dashboard_bp.route("/")
 def dashboard_index():
     if request.args.get("force") == "1":
-        cache_dir = current_app.config.get("CACHE_DIR")
-        if cache_dir and os.path.exists(cache_dir):
-            shutil.rmtree(cache_dir)
-            os.makedirs(cache_dir)
+        drop_loader_caches()
 
     tz_name = current_app.config.get("TIMEZONE", "Europe/Moscow")
     tz = ZoneInfo(tz_name)
 
     wb_token = (current_app.config.get("WB_API_TOKEN", "") or "").strip()
 
+    # Прошедший день (?date=YYYY-MM-DD) строится из локального хранилища событий
+    today = datetime.now(tz).date()
+    day = _parse_day(request.args.get("date")) or today
+    if day > today:
+        day = today
+    history_day = day if day < today else None
+
     # WB
     if not wb_token:
         wb_data = {"error": True, "reason": "missing_wb_token"}
     else:
         try:
-            wb_stocks = wb_fetch_stocks(wb_token)
-            wb_today = wb_fetch_today(wb_token, tz)
+            with span("wb_stocks"):
+                wb_stocks = wb_fetch_stocks(wb_token)
+            with span("wb_today"):
+                wb_today = event_store.day_summary("wb", history_day, tz) if history_day else wb_fetch_today(wb_token, tz)
             wb_data = {"stocks": wb_stocks, "today": wb_today}
         except Exception as exc:
             logging.exception("WB failed: %s", exc)
@@ -48,37 +82,228 @@ def dashboard_index():
         ozon_today = {}
         try:
             ozon_accounts_hashable = ozon_make_hashable(ozon_accounts)
-            ozon_stocks = ozon_fetch_stocks(ozon_accounts_hashable)
+            with span("ozon_stocks"):
+                ozon_stocks = ozon_fetch_stocks(ozon_accounts_hashable)
         except Exception as exc:
             logging.exception("Ozon stocks failed: %s", exc)
         try:
             ozon_accounts_hashable = ozon_make_hashable(ozon_accounts)
-            ozon_today = ozon_fetch_today(ozon_accounts_hashable, tz)
+            with span("ozon_today"):
+                ozon_today = event_store.day_summary("ozon", history_day, tz) if history_day else ozon_fetch_today(ozon_accounts_hashable, tz)
         except Exception as exc:
             logging.exception("Ozon today failed: %s", exc)
         ozon_data = {"stocks": ozon_stocks, "today": ozon_today}
 
-    context = prepare_dashboard_context(
-        wb_data=wb_data,
-        ozon_data=ozon_data,
-        now=datetime.now(tz)
-    )
-
-    # Get cache update time
-    last_updated = None
+    # Запас в днях считается при обновлении (stock_cover); здесь только чтение
+    cover = {}
     try:
-        cache_dir = current_app.config.get("CACHE_DIR")
-        if cache_dir and os.path.exists(cache_dir):
-            files = [f for f in os.listdir(cache_dir) if os.path.isfile(os.path.join(cache_dir, f))]
-            if files:
-                latest_file = max(files, key=lambda f: os.path.getmtime(os.path.join(cache_dir, f)))
-                last_updated = datetime.fromtimestamp(os.path.getmtime(os.path.join(cache_dir, latest_file)), tz=tz)
-    except Exception:
-        pass  # Ignore errors in getting cache time
-
-    context["last_updated"] = last_updated
+        with span("stock_cover"):
+            cover = {marketplace: stock_cover.sku_cover(marketplace) for marketplace in ("wb", "ozon")}
+    except SQLAlchemyError as exc:
+        db.session.rollback()
+        logging.warning("Stock cover unavailable: %s", exc)
+
+    with span("prepare_dashboard_context"), RENDER_DURATION.labels("presenter").time():
+        context = prepare_dashboard_context(
+            wb_data=wb_data,
+            ozon_data=ozon_data,
+            now=datetime.now(tz),
+            breakers=breaker_states(),
+            cover=cover,
+            cube=stock_cube(wb_data.get("stocks"), ozon_data.get("stocks")),
+        )
+
+    context["last_updated"] = prepare_last_updated(wb_data, ozon_data, tz)
     context["cache_ttl_minutes"] = current_app.config.get("CACHE_DEFAULT_TIMEOUT", 1800) // 60
+    # Поток /api/updates есть только у кэша с уведомлениями (Redis)
+    context["updates_stream"] = hasattr(cache.cache, "add_listener")
+    context["selected_day"] = day
+    context["today"] = today
+    context["day_label"] = f"за {day.strftime('%d.%m.%Y')}" if history_day else "сегодня"
+
+    with span("render_template"), RENDER_DURATION.labels("template").time():
+        return render_template("dashboard.html", **context)
+
+
+def _parse_day(value: str | None) -> date | None:
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+@dashboard_bp.route("/api/events/daily")
+def api_events_daily():
+    """
+    Заказы и продажи по дням из локального хранилища событий.
+
+    Параметры: ``from``/``to`` (YYYY-MM-DD, по умолчанию — последние 7 дней),
+    ``marketplace`` (wb или ozon), ``sku`` (через запятую).
+    """
+    tz = ZoneInfo(current_app.config.get("TIMEZONE", "Europe/Moscow"))
+    end = _parse_day(request.args.get("to")) or datetime.now(tz).date()
+    start = _parse_day(request.args.get("from")) or end - timedelta(days=6)
+    if start > end:
+        abort(400, description="from must not be later than to")
+    skus = [s.strip() for s in request.args.get("sku", "").split(",") if s.strip()]
+    return jsonify({"days": event_store.daily_totals(start, end, request.args.get("marketplace") or None, skus or None)})
 
-    return render_template("dashboard.html", **context)
 
+def _current_stocks() -> tuple[dict | None, dict | None]:
+    """Остатки WB и Ozon из кэша загрузчиков (как на дашборде); None — источник недоступен."""
+    wb_stocks = ozon_stocks = None
+    wb_token = (current_app.config.get("WB_API_TOKEN", "") or "").strip()
+    if wb_token:
+        try:
+            wb_stocks = wb_fetch_stocks(wb_token)
+        except Exception as exc:
+            logging.exception("WB failed: %s", exc)
+    ozon_accounts = current_app.config.get("OZON_ACCOUNTS", [])
+    if ozon_accounts:
+        try:
+            ozon_stocks = ozon_fetch_stocks(ozon_make_hashable(ozon_accounts))
+        except Exception as exc:
+            logging.exception("Ozon stocks failed: %s", exc)
+    return wb_stocks, ozon_stocks
 
+
+@dashboard_bp.route("/api/stocks")
+def api_stocks():
+    """
+    Срезы куба остатков WB и Ozon.
+
+    Параметры: ``view`` — ``totals`` (по умолчанию), ``products`` (товары
+    на всех маркетплейсах по убыванию показателя), ``warehouses`` (рейтинг
+    складов) или ``product`` (один товар, ``sku``); ``marketplace`` (wb или
+    ozon, для warehouses), ``metric`` (available, to_client, from_client),
+    ``limit``.
+    """
+    view = request.args.get("view", "totals")
+    metric_name = request.args.get("metric", "available")
+    if metric_name not in METRICS:
+        abort(400, description=f"metric must be one of {', '.join(METRICS)}")
+    metric = METRICS.index(metric_name)
+    try:
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError:
+        abort(400, description="limit must be a number")
+
+    cube = stock_cube(*_current_stocks())
+    if view == "totals":
+        data = {
+            marketplace: {name: cube.total(k, marketplace) for k, name in enumerate(METRICS)}
+            for marketplace in cube.marketplaces
+        }
+        data["all"] = {name: cube.total(k) for k, name in enumerate(METRICS)}
+    elif view == "products":
+        data = [{"sku": sku, "total": total, "by_marketplace": parts} for sku, total, parts in cube.product_ranking(metric, limit)]
+    elif view == "warehouses":
+        ranking = cube.warehouse_ranking(request.args.get("marketplace") or None, metric, limit)
+        data = [{"warehouse": name, "quantity": qty} for name, qty in ranking]
+    elif view == "product":
+        sku = request.args.get("sku", "")
+        data = {
+            marketplace: dict(
+                zip(METRICS, values),
+                warehouses=[{"warehouse": name, "quantity": qty} for name, qty in cube.product_warehouses(marketplace, sku)],
+            )
+            for marketplace, values in cube.product(sku).items()
+        }
+    else:
+        abort(400, description="view must be totals, products, warehouses or product")
+    return jsonify({"view": view, "metric": metric_name, "data": data})
+
+
+@dashboard_bp.route("/api/stock-cover")
+def api_stock_cover():
+    """
+    Запас в днях по SKU и складам, по возрастанию (ближайшие к нулю — первыми).
+
+    Параметры: ``marketplace`` (wb или ozon), ``sku`` (через запятую),
+    ``max_days`` (только строки с запасом не больше), ``total=1`` — итоги
+    по SKU вместо пар SKU × склад, ``limit`` (до 10000).
+    """
+    try:
+        max_days = float(request.args["max_days"]) if request.args.get("max_days") else None
+        limit = min(int(request.args.get("limit", 1000)), 10000)
+    except ValueError:
+        abort(400, description="max_days and limit must be numbers")
+    skus = [s.strip() for s in request.args.get("sku", "").split(",") if s.strip()]
+    rows = stock_cover.query_cover(
+        request.args.get("marketplace") or None,
+        skus or None,
+        max_days,
+        by_warehouse=request.args.get("total") != "1",
+        limit=limit,
+    )
+    return jsonify({"rows": rows, "velocity_days": current_app.config.get("STOCK_VELOCITY_DAYS", 14)})
+
+
+@dashboard_bp.route("/api/intraday")
+def api_intraday():
+    """
+    Кривая заказов за день по часам (накопленным итогом) против того же
+    времени вчера и неделю назад. Читает только почасовые суммы.
+
+    Параметры: ``marketplace`` (wb или ozon, по умолчанию — оба),
+    ``kind`` (order или sale), ``date`` (YYYY-MM-DD, по умолчанию — сегодня).
+    """
+    tz = ZoneInfo(current_app.config.get("TIMEZONE", "Europe/Moscow"))
+    now = datetime.now(tz)
+    day = _parse_day(request.args.get("date")) or now.date()
+    kind = request.args.get("kind", "order")
+    if kind not in ("order", "sale"):
+        abort(400, description="kind must be order or sale")
+    curves = event_store.intraday_curves(day, now.hour if day == now.date() else None, kind, request.args.get("marketplace") or None)
+    return jsonify(dict(curves, date=day.isoformat(), kind=kind))
+
+
+@dashboard_bp.route("/api/status")
+def api_status():
+    """Состояние circuit breaker'ов эндпоинтов маркетплейсов."""
+    return jsonify({"breakers": breaker_states()})
+
+
+@dashboard_bp.route("/api/updates")
+def api_updates():
+    """
+    Поток Server-Sent Events о новых версиях данных в общем кэше.
+
+    Доступен только с кэшем в Redis (app/utils/redis_cache.py), где узлы
+    узнают о записи через pub/sub. Поток закрывается через
+    UPDATES_STREAM_SECONDS — браузер переподключается сам, а воркер
+    Gunicorn не занят бесконечно.
+    """
+    backend = cache.cache
+    if not hasattr(backend, "add_listener"):
+        abort(404)
+    events: queue.Queue = queue.Queue(maxsize=100)
+
+    def listener(event: dict) -> None:
+        try:
+            events.put_nowait(event)
+        except queue.Full:
+            pass
+
+    deadline = time.monotonic() + current_app.config.get("UPDATES_STREAM_SECONDS", 300)
+
+    def stream():
+        backend.add_listener(listener)
+        try:
+            yield "retry: 5000\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=min(15, max(0.1, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                payload = {"key": event["key"], "version": event["version"]}
+                yield f"event: update\ndata: {json.dumps(payload)}\n\n"
+        finally:
+            backend.remove_listener(listener)
+
+    return Response(
+        stream_with_context(stream()),
+        content_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,29 @@
+from datetime import date
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from ..services.export import FORMATS, export, parse_filter
+
+
+export_bp = Blueprint("export", __name__)
+
+
+@export_bp.route("/export/<dataset>")
+def export_dataset(dataset: str):
+    """
+    Потоковая выгрузка набора данных (см. app/services/export.py).
+
+    Параметры: ``format`` (csv или ndjson), ``from``/``to`` (YYYY-MM-DD),
+    ``sku`` (через запятую), ``marketplace`` (wb или ozon).
+    """
+    fmt = request.args.get("format", "csv")
+    try:
+        chunks = export(dataset, fmt, parse_filter(request.args))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    response = Response(stream_with_context(chunks), content_type=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{dataset}-{date.today().isoformat()}.{fmt}"'
+    # Nginx не должен накапливать ответ целиком перед отправкой клиенту
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+
+from ..utils.metrics import render_latest
+
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics")
+def metrics_index():
+    """Метрики в формате Prometheus (агрегированные по всем воркерам)."""
+    payload, content_type = render_latest()
+    return Response(payload, content_type=content_type)
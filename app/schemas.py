@@ -54,6 +54,8 @@ class OzonAnalyticsData(BaseModel):
     warehouse_name: Optional[str] = ""
 
 class OzonPosting(BaseModel):
+    posting_number: str = ""
+    status: Optional[str] = ""
     products: List[OzonPostingProduct]
     in_process_at: str
     cluster_from: Optional[str] = ""
@@ -62,6 +64,34 @@ class OzonPosting(BaseModel):
 class OzonPostingResponse(BaseModel):
     result: List[OzonPosting]
 
+class OzonProductListItem(BaseModel):
+    product_id: int
+    offer_id: str
+    archived: bool = False
+    updated_at: Optional[str] = ""
+
+class OzonProductListResult(BaseModel):
+    items: List[OzonProductListItem]
+    total: int = 0
+    last_id: str = ""
+
+class OzonProductListResponse(BaseModel):
+    result: OzonProductListResult
+
+class OzonProductSource(BaseModel):
+    sku: Optional[int] = None
+    source: Optional[str] = ""
+
+class OzonProductInfoItem(BaseModel):
+    id: int
+    offer_id: str
+    sku: Optional[int] = None
+    sources: List[OzonProductSource] = []
+    updated_at: Optional[str] = ""
+
+class OzonProductInfoResponse(BaseModel):
+    items: List[OzonProductInfoItem]
+
 class OzonReturnProduct(BaseModel):
     quantity: int
     offer_id: str
@@ -0,0 +1,305 @@
+"""
+Локальное хранилище заказов и продаж (таблица order_events).
+
+Загрузчики «сегодня» (wb_api.load_today_metrics, ozon_api.fetch_account_today)
+сохраняют все полученные строки, а не только агрегаты. Каждая строка
+обновляется по ключу (marketplace, kind, event_id): srid у WB, номер
+отправления и товар у Ozon, поэтому повторные загрузки и отмены не создают
+дубликатов. Любой прошедший день или диапазон потом строится локальным
+запросом по индексу (marketplace, date, sku), без обращения к API.
+"""
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import partial
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from ..models import db, HourlyRollup, OrderEvent
+from ..utils.compact import EventSummaryBuilder
+from ..utils.persistent_cache import defer_write
+from ..utils.sku_aliases import alias_sku, sort_pairs_by_alias
+
+
+UTC = ZoneInfo("UTC")
+UPSERT_BATCH_SIZE = 500
+_UPDATE_COLUMNS = ("account", "sku", "quantity", "occurred_at", "date", "city", "warehouse", "status", "is_cancel", "updated_at")
+
+
+def _event_times(value: str, tz: ZoneInfo) -> tuple[datetime, date]:
+    """Время события в UTC (без tzinfo) и локальная дата; разбор — как в агрегатах «сегодня»."""
+    local = datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(tz)
+    return local.astimezone(UTC).replace(tzinfo=None), local.date()
+
+
+def _local_hour(occurred_at: datetime, tz: ZoneInfo) -> tuple[date, int]:
+    """Локальные дата и час события по времени в UTC (без tzinfo)."""
+    local = occurred_at.replace(tzinfo=UTC).astimezone(tz)
+    return local.date(), local.hour
+
+
+def wb_rows(kind: str, items: Iterable, tz: ZoneInfo) -> list[dict]:
+    """Строки order_events из валидированных заказов (``kind="order"``) или продаж (``"sale"``) WB."""
+    rows = []
+    for item in items:
+        occurred_at, day = _event_times(item.date, tz)
+        rows.append({
+            "marketplace": "wb",
+            "account": "",
+            "kind": kind,
+            "event_id": str(item.srid),
+            "sku": str(item.supplier_article),
+            "quantity": 1,
+            "occurred_at": occurred_at,
+            "date": day,
+            "tz": tz,
+            "city": item.oblast_okrug_name or "",
+            "warehouse": item.warehouse_name or "",
+            "status": "",
+            "is_cancel": bool(item.is_cancel),
+        })
+    return rows
+
+
+def ozon_rows(client_id: str, postings: Iterable, tz: ZoneInfo, kind: str = "order", occurred_at: datetime | None = None) -> list[dict]:
+    """
+    Строки order_events из отправлений Ozon: по строке на товар отправления.
+
+    Для заказов время события — ``in_process_at``; для выкупов (``kind="sale"``)
+    передается ``occurred_at`` — момент, когда замечен статус delivered (UTC).
+    """
+    rows = []
+    for p in postings:
+        if occurred_at is None:
+            event_at, day = _event_times(p.in_process_at, tz)
+        else:
+            event_at, day = occurred_at.replace(tzinfo=None), occurred_at.astimezone(tz).date()
+        city = ""
+        warehouse = p.cluster_from or ""
+        if p.analytics_data:
+            city = p.analytics_data.city or p.analytics_data.region or ""
+            warehouse = p.cluster_from or p.analytics_data.warehouse_name or ""
+        for pr in p.products:
+            rows.append({
+                "marketplace": "ozon",
+                "account": client_id,
+                "kind": kind,
+                "event_id": f"{p.posting_number or p.in_process_at}:{pr.offer_id}",
+                "sku": str(pr.offer_id),
+                "quantity": pr.quantity,
+                "occurred_at": event_at,
+                "date": day,
+                "tz": tz,
+                "city": city,
+                "warehouse": warehouse,
+                "status": p.status or "",
+                "is_cancel": p.status == "cancelled",
+            })
+    return rows
+
+
+def upsert_statement(model, keys: Iterable[str], columns: Iterable[str], keep: Iterable[str] = ()):
+    """
+    INSERT ... ON CONFLICT (keys) DO UPDATE для SQLite и Postgres.
+
+    Колонки ``columns`` берутся из вставляемой строки; колонки ``keep``
+    сохраняют уже записанное значение, если оно не пустое.
+    """
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(model)
+    set_ = {column: stmt.excluded[column] for column in columns}
+    set_.update({column: func.coalesce(getattr(model, column), stmt.excluded[column]) for column in keep})
+    return stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+
+
+def _contribution(is_cancel: bool, quantity: int) -> int:
+    return 0 if is_cancel else quantity
+
+
+def _rollup_deltas(rows: list[dict]) -> dict[tuple, int]:
+    """
+    Приращения почасовых сумм от записи ``rows``: новая строка добавляет
+    свое количество, отмена вычитает записанное ранее. Если время события
+    изменилось (например, Ozon заново заметил выкуп), записанное ранее
+    вычитается из старого часа и добавляется к новому. Участвуют строки с
+    часовым поясом ``tz`` (см. wb_rows, ozon_rows).
+    """
+    groups: dict[tuple[str, str], list[dict]] = defaultdict(list)
+    for row in rows:
+        if row.get("tz") is not None:
+            groups[(row["marketplace"], row["kind"])].append(row)
+    deltas: dict[tuple, int] = defaultdict(int)
+    for (marketplace, kind), group in groups.items():
+        known: dict[str, tuple[int, datetime]] = {}
+        for i in range(0, len(group), UPSERT_BATCH_SIZE):
+            ids = [row["event_id"] for row in group[i : i + UPSERT_BATCH_SIZE]]
+            known.update(
+                (event_id, (_contribution(is_cancel, quantity), occurred_at))
+                for event_id, is_cancel, quantity, occurred_at in db.session.execute(
+                    select(OrderEvent.event_id, OrderEvent.is_cancel, OrderEvent.quantity, OrderEvent.occurred_at).where(
+                        OrderEvent.marketplace == marketplace, OrderEvent.kind == kind, OrderEvent.event_id.in_(ids)
+                    )
+                )
+            )
+        for row in group:
+            bucket = (marketplace, kind, *_local_hour(row["occurred_at"], row["tz"]))
+            deltas[bucket] += _contribution(row["is_cancel"], row["quantity"])
+            if row["event_id"] in known:
+                recorded, occurred_at = known[row["event_id"]]
+                deltas[(marketplace, kind, *_local_hour(occurred_at, row["tz"]))] -= recorded
+    return {bucket: delta for bucket, delta in deltas.items() if delta}
+
+
+def _apply_rollup_deltas(deltas: dict[tuple, int], now: datetime) -> None:
+    """Прибавляет приращения к почасовым суммам одним upsert (count = count + delta)."""
+    if not deltas:
+        return
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(HourlyRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["marketplace", "kind", "date", "hour"],
+        set_={"count": HourlyRollup.count + stmt.excluded.count, "updated_at": stmt.excluded.updated_at},
+    )
+    db.session.execute(stmt, [
+        {"marketplace": m, "kind": k, "date": d, "hour": h, "count": delta, "updated_at": now}
+        for (m, k, d, h), delta in deltas.items()
+    ])
+
+
+def record_events(rows: list[dict], commit: bool = True) -> int:
+    """
+    Сохраняет строки событий (upsert) и обновляет почасовые суммы
+    приращениями. Возвращает число уникальных строк.
+
+    Ошибка записи не мешает отдать данные дашборду: она логируется, а с
+    ``commit=False`` (пакетная запись, см. deferred_writes) пробрасывается.
+    """
+    # Одна строка на ключ: Postgres не дает обновить строку дважды за один INSERT
+    unique = {(r["marketplace"], r["kind"], r["event_id"]): r for r in rows}
+    if not unique:
+        return 0
+    if defer_write(partial(record_events, list(unique.values()), commit=False)):
+        return len(unique)
+    now = datetime.utcnow()
+    batch = [dict(row, updated_at=now) for row in unique.values()]
+    try:
+        deltas = _rollup_deltas(batch)
+        stmt = upsert_statement(OrderEvent, ("marketplace", "kind", "event_id"), _UPDATE_COLUMNS)
+        columns = [{k: v for k, v in row.items() if k != "tz"} for row in batch]
+        for i in range(0, len(columns), UPSERT_BATCH_SIZE):
+            db.session.execute(stmt, columns[i : i + UPSERT_BATCH_SIZE])
+        _apply_rollup_deltas(deltas, now)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logging.exception("Failed to record order events")
+        if not commit:
+            raise
+    return len(unique)
+
+
+def day_summary(marketplace: str, day: date, tz: ZoneInfo) -> dict:
+    """
+    Заказы и продажи маркетплейса за локальный день ``day`` в форме агрегата
+    «сегодня»: итоги, пары (sku, количество) и таблицы событий. Отмененные
+    строки не учитываются.
+    """
+    rows = db.session.execute(
+        select(OrderEvent.kind, OrderEvent.sku, OrderEvent.quantity, OrderEvent.occurred_at, OrderEvent.city, OrderEvent.warehouse)
+        .where(OrderEvent.marketplace == marketplace, OrderEvent.date == day, OrderEvent.is_cancel.is_(False))
+        .order_by(OrderEvent.occurred_at)
+    )
+    totals = {"order": 0, "sale": 0}
+    by_sku = {"order": defaultdict(int), "sale": defaultdict(int)}
+    events = {"order": EventSummaryBuilder(), "sale": EventSummaryBuilder()}
+    for kind, sku, quantity, occurred_at, city, warehouse in rows:
+        sku = alias_sku(sku)
+        totals[kind] += quantity
+        by_sku[kind][sku] += quantity
+        events[kind].add(sku, occurred_at.replace(tzinfo=UTC).astimezone(tz), city or "Неизвестно", warehouse or "Неизвестно")
+    return {
+        "ordered": totals["order"],
+        "purchased": totals["sale"],
+        "ordered_skus": sort_pairs_by_alias(list(by_sku["order"].items())),
+        "purchased_skus": sort_pairs_by_alias(list(by_sku["sale"].items())),
+        "ordered_events": events["order"].build(),
+        "purchased_events": events["sale"].build(),
+    }
+
+
+def daily_totals(start: date, end: date, marketplace: str | None = None, skus: Iterable[str] | None = None) -> list[dict]:
+    """Количество заказов и продаж по дням за [start, end] (включительно) по маркетплейсам."""
+    ordered = func.sum(OrderEvent.quantity).filter(OrderEvent.kind == "order")
+    purchased = func.sum(OrderEvent.quantity).filter(OrderEvent.kind == "sale")
+    stmt = (
+        select(OrderEvent.date, OrderEvent.marketplace, ordered, purchased)
+        .where(OrderEvent.date >= start, OrderEvent.date <= end, OrderEvent.is_cancel.is_(False))
+        .group_by(OrderEvent.date, OrderEvent.marketplace)
+        .order_by(OrderEvent.date, OrderEvent.marketplace)
+    )
+    if marketplace:
+        stmt = stmt.where(OrderEvent.marketplace == marketplace)
+    if skus:
+        stmt = stmt.where(OrderEvent.sku.in_(list(skus)))
+    return [
+        {"date": day.isoformat(), "marketplace": mp, "ordered": int(o or 0), "purchased": int(p or 0)}
+        for day, mp, o, p in db.session.execute(stmt)
+    ]
+
+
+def intraday_curves(day: date, now_hour: int | None, kind: str = "order", marketplace: str | None = None) -> dict:
+    """
+    Накопленные по часам суммы за ``day``, тот же день вчера и неделю назад.
+
+    Строится только из hourly_rollups. Ряд ``today`` обрывается после часа
+    ``now_hour`` (None — день целиком).
+    """
+    days = {"today": day, "yesterday": day - timedelta(days=1), "last_week": day - timedelta(days=7)}
+    stmt = (
+        select(HourlyRollup.date, HourlyRollup.hour, func.sum(HourlyRollup.count))
+        .where(HourlyRollup.kind == kind, HourlyRollup.date.in_(list(days.values())))
+        .group_by(HourlyRollup.date, HourlyRollup.hour)
+    )
+    if marketplace:
+        stmt = stmt.where(HourlyRollup.marketplace == marketplace)
+    hourly = {d: [0] * 24 for d in days.values()}
+    for d, hour, count in db.session.execute(stmt):
+        hourly[d][hour] += int(count or 0)
+    curves: dict = {"hours": list(range(24))}
+    for name, d in days.items():
+        total, cumulative = 0, []
+        for count in hourly[d]:
+            total += count
+            cumulative.append(total)
+        curves[name] = cumulative
+    if now_hour is not None:
+        curves["today"] = curves["today"][: now_hour + 1] + [None] * (23 - now_hour)
+    return curves
+
+
+def rebuild_rollups(start: date, end: date, tz: ZoneInfo) -> int:
+    """
+    Пересчитывает почасовые суммы за [start, end] из строк order_events.
+    Используется при первом запуске и для сверки приращений. Возвращает число строк сумм.
+    """
+    sums: dict[tuple, int] = defaultdict(int)
+    rows = db.session.execute(
+        select(OrderEvent.marketplace, OrderEvent.kind, OrderEvent.occurred_at, OrderEvent.quantity)
+        .where(OrderEvent.date >= start, OrderEvent.date <= end, OrderEvent.is_cancel.is_(False))
+        .execution_options(yield_per=5000)
+    )
+    for marketplace, kind, occurred_at, quantity in rows:
+        sums[(marketplace, kind, *_local_hour(occurred_at, tz))] += quantity
+    now = datetime.utcnow()
+    db.session.query(HourlyRollup).filter(HourlyRollup.date >= start, HourlyRollup.date <= end).delete(synchronize_session=False)
+    db.session.add_all(
+        HourlyRollup(marketplace=m, kind=k, date=d, hour=h, count=count, updated_at=now)
+        for (m, k, d, h), count in sums.items()
+        if start <= d <= end
+    )
+    db.session.commit()
+    return len(sums)
@@ -0,0 +1,212 @@
+"""
+Потоковая выгрузка сырых данных в CSV или NDJSON (маршрут /export и scripts/export.py).
+
+Наборы данных:
+    orders, sales      — заказы и продажи за сегодня: строки order_events,
+                         сохраненные теми же кэшированными загрузками, что
+                         и у дашборда (продажи Ozon — замеченные выкупы);
+    stock_history      — строки stock_deltas: keyframe и изменения остатков
+                         (см. app/services/stock_history.py);
+    stock_daily        — дневные min/max/close остатков;
+    daily_metrics      — число заказов и продаж по дням.
+
+Выгрузка — генератор строк. История читается курсором на стороне сервера
+(``yield_per``), поэтому выгрузка за месяцы не загружается в память воркера
+целиком, а первые байты уходят клиенту сразу.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Mapping, NamedTuple
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import or_, select
+
+from ..models import db, DailyMetric, OrderEvent, StockDaily, StockDelta
+from ..utils.sku_aliases import alias_sku
+from ..utils.storage import flush_writes
+from . import ozon_api, wb_api
+
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+DATASETS = ("orders", "sales", "stock_history", "stock_daily", "daily_metrics")
+CHUNK_ROWS = 500
+YIELD_PER = 1000
+UTC = ZoneInfo("UTC")
+
+EVENT_COLUMNS = ("marketplace", "date", "time", "sku", "city", "warehouse")
+
+
+class ExportFilter(NamedTuple):
+    """Фильтры выгрузки; None — без ограничения. Даты включительные."""
+    start: date | None = None
+    end: date | None = None
+    skus: frozenset[str] | None = None
+    marketplace: str | None = None
+
+
+def _parse_date(value: str | None, name: str) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format") from None
+
+
+def parse_filter(params: Mapping[str, str]) -> ExportFilter:
+    """Разбирает параметры ``from``, ``to``, ``sku`` (через запятую) и ``marketplace``."""
+    start = _parse_date(params.get("from"), "from")
+    end = _parse_date(params.get("to"), "to")
+    if start and end and start > end:
+        raise ValueError("from must not be later than to")
+    skus = frozenset(s.strip() for s in (params.get("sku") or "").split(",") if s.strip()) or None
+    marketplace = (params.get("marketplace") or "").strip() or None
+    if marketplace not in (None, "wb", "ozon"):
+        raise ValueError("marketplace must be wb or ozon")
+    return ExportFilter(start, end, skus, marketplace)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode(columns: tuple[str, ...], rows: Iterable[tuple], fmt: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[str]:
+    """Кодирует строки в CSV (с заголовком) или NDJSON и отдает их пачками по ``chunk_rows``."""
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        # Заголовок уходит сразу, до первой строки данных
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+        def write(row):
+            writer.writerow([_plain(v) for v in row])
+    elif fmt == "ndjson":
+        def write(row):
+            buffer.write(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n")
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def _today_events(dataset: str, flt: ExportFilter) -> Iterator[tuple]:
+    tz = ZoneInfo(current_app.config.get("TIMEZONE", "Europe/Moscow"))
+    today = datetime.now(tz).date()
+    if (flt.start and today < flt.start) or (flt.end and today > flt.end):
+        return
+
+    # Кэшированные загрузки «сегодня» (те же, что у дашборда) сохраняют каждую
+    # строку в order_events; в кэше лежат только сводки ограниченного размера
+    marketplaces = []
+    wb_token = (current_app.config.get("WB_API_TOKEN", "") or "").strip()
+    if wb_token and flt.marketplace in (None, "wb"):
+        wb_api.fetch_today_metrics(wb_token, tz)
+        marketplaces.append("wb")
+    accounts = current_app.config.get("OZON_ACCOUNTS", [])
+    if accounts and flt.marketplace in (None, "ozon"):
+        ozon_api.fetch_today_metrics(ozon_api._make_hashable(accounts), tz)
+        marketplaces.append("ozon")
+    if not marketplaces:
+        return
+    flush_writes()
+
+    stmt = (
+        select(OrderEvent.marketplace, OrderEvent.occurred_at, OrderEvent.sku, OrderEvent.city, OrderEvent.warehouse)
+        .where(
+            OrderEvent.marketplace.in_(marketplaces),
+            OrderEvent.kind == ("order" if dataset == "orders" else "sale"),
+            OrderEvent.date == today,
+            OrderEvent.is_cancel.is_(False),
+        )
+        .order_by(OrderEvent.marketplace, OrderEvent.sku, OrderEvent.occurred_at)
+    )
+    for marketplace, occurred_at, sku, city, warehouse in _stream(stmt):
+        sku = alias_sku(sku)
+        if flt.skus is not None and sku not in flt.skus:
+            continue
+        local = occurred_at.replace(tzinfo=UTC).astimezone(tz)
+        yield (marketplace, today, local.strftime("%H:%M"), sku, city or "Неизвестно", warehouse or "Неизвестно")
+
+
+def _stream(stmt) -> Iterator[tuple]:
+    """Читает запрос курсором на стороне сервера пачками по YIELD_PER строк."""
+    result = db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+    try:
+        for row in result:
+            yield tuple(row)
+    finally:
+        result.close()
+
+
+def _marketplace_clause(column, marketplace: str):
+    # В stock_deltas аккаунты Ozon записаны как ozon:<client_id>
+    return or_(column == marketplace, column.like(f"{marketplace}:%"))
+
+
+def _history_query(dataset: str, flt: ExportFilter):
+    if dataset == "stock_history":
+        model, when = StockDelta, StockDelta.captured_at
+        columns = (StockDelta.marketplace, StockDelta.captured_at, StockDelta.sku, StockDelta.warehouse_name, StockDelta.quantity, StockDelta.is_keyframe)
+        order = (StockDelta.captured_at, StockDelta.id)
+        start = datetime.combine(flt.start, time.min) if flt.start else None
+        end = datetime.combine(flt.end + timedelta(days=1), time.min) if flt.end else None
+    elif dataset == "stock_daily":
+        model, when = StockDaily, StockDaily.date
+        columns = (StockDaily.marketplace, StockDaily.date, StockDaily.sku, StockDaily.warehouse_name, StockDaily.min_quantity, StockDaily.max_quantity, StockDaily.close_quantity)
+        order = (StockDaily.date, StockDaily.id)
+        start, end = flt.start, (flt.end + timedelta(days=1) if flt.end else None)
+    else:
+        model, when = DailyMetric, DailyMetric.date
+        columns = (DailyMetric.marketplace, DailyMetric.date, DailyMetric.ordered_count, DailyMetric.purchased_count)
+        order = (DailyMetric.date, DailyMetric.marketplace)
+        start, end = flt.start, (flt.end + timedelta(days=1) if flt.end else None)
+
+    stmt = select(*columns).order_by(*order)
+    if start:
+        stmt = stmt.where(when >= start)
+    if end:
+        stmt = stmt.where(when < end)
+    if flt.marketplace:
+        stmt = stmt.where(_marketplace_clause(model.marketplace, flt.marketplace))
+    if flt.skus is not None and hasattr(model, "sku"):
+        stmt = stmt.where(model.sku.in_(sorted(flt.skus)))
+    return tuple(c.key for c in columns), stmt
+
+
+def export(dataset: str, fmt: str, flt: ExportFilter = ExportFilter()) -> Iterator[str]:
+    """
+    Возвращает генератор фрагментов выгрузки.
+
+    Параметры проверяются сразу, а данные читаются по мере потребления
+    генератора — в маршруте он должен выполняться в контексте приложения
+    (stream_with_context).
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"unknown dataset: {dataset}")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format: {fmt}")
+    if dataset in ("orders", "sales"):
+        return encode(EVENT_COLUMNS, _today_events(dataset, flt), fmt)
+    columns, stmt = _history_query(dataset, flt)
+    return encode(columns, _stream(stmt), fmt)
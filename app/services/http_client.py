@@ -0,0 +1,64 @@
+"""
+Общая точка выполнения HTTP-запросов к API маркетплейсов.
+
+Каждый запрос идет через circuit breaker своего эндпоинта
+(см. app/utils/circuit_breaker.py) и попадает в метрики
+длительности и ошибок (см. app/utils/metrics.py). В режимах записи и
+воспроизведения (HTTP_RECORD_MODE) ответы сохраняются на диск или берутся
+с диска (см. app/services/http_recording.py).
+"""
+import time
+
+import requests
+
+from ..utils import metrics
+from . import http_recording
+from ..utils.circuit_breaker import CircuitOpenError, get_breaker
+
+
+def call(endpoint: str, method: str, url: str, account: str = "default", **kwargs) -> requests.Response:
+    """
+    Выполняет запрос ``requests.<method>`` к эндпоинту ``endpoint``.
+
+    Сетевые ошибки, таймауты, ответы 5xx и 429 считаются отказами эндпоинта.
+    Если автомат разомкнут, сразу выбрасывает CircuitOpenError.
+    """
+    breaker = get_breaker(endpoint)
+    if not breaker.allow():
+        metrics.FETCH_ERRORS.labels(endpoint, account, "circuit_open").inc()
+        raise CircuitOpenError(f"Circuit for {endpoint} is open")
+    start = time.perf_counter()
+    mode = http_recording.mode()
+    try:
+        if mode == "replay":
+            resp = http_recording.replay(account, method, url, kwargs)
+        else:
+            resp = getattr(requests, method)(url, **kwargs)
+    except requests.RequestException as exc:
+        if mode == "record":
+            http_recording.record(endpoint, account, method, url, kwargs, time.perf_counter() - start, error=exc)
+        reason = "timeout" if isinstance(exc, requests.Timeout) else "network"
+        metrics.FETCH_ERRORS.labels(endpoint, account, reason).inc()
+        breaker.record_failure(type(exc).__name__)
+        metrics.set_circuit_state(endpoint, breaker.state)
+        raise
+    except Exception as exc:
+        # Любой исход пробного запроса должен быть записан, иначе автомат
+        # останется в полуоткрытом состоянии с занятой пробой
+        metrics.FETCH_ERRORS.labels(endpoint, account, "exception").inc()
+        breaker.record_failure(type(exc).__name__)
+        metrics.set_circuit_state(endpoint, breaker.state)
+        raise
+    finally:
+        metrics.FETCH_DURATION.labels(endpoint, account).observe(time.perf_counter() - start)
+    if not resp.ok and (resp.status_code >= 500 or resp.status_code == 429):
+        metrics.FETCH_ERRORS.labels(endpoint, account, f"http_{resp.status_code}").inc()
+        breaker.record_failure(f"HTTP {resp.status_code}")
+    else:
+        if not resp.ok:
+            metrics.FETCH_ERRORS.labels(endpoint, account, f"http_{resp.status_code}").inc()
+        breaker.record_success()
+    metrics.set_circuit_state(endpoint, breaker.state)
+    if mode == "record":
+        http_recording.record(endpoint, account, method, url, kwargs, time.perf_counter() - start, resp=resp)
+    return resp
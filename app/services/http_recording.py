@@ -0,0 +1,170 @@
+"""
+Запись и воспроизведение ответов API маркетплейсов (HTTP_RECORD_MODE).
+
+``record`` — каждый запрос через http_client.call выполняется как обычно, а
+ответ (статус, тело, время выполнения) или сетевая ошибка дописывается в
+файл ``<HTTP_RECORD_DIR>/<pid>-<время старта>.jsonl.gz`` (по gzip-блоку на
+запись, поэтому файл читается даже после аварийного завершения). Заголовки
+запроса, в том числе токены, не сохраняются.
+
+``replay`` — запросы не уходят в сеть: ответ берется из всех файлов каталога
+и отдается с исходной задержкой, деленной на HTTP_REPLAY_SPEED (0 — без
+задержки). Запрос сопоставляется сначала точно (аккаунт, метод, путь,
+параметры и тело), затем — по аккаунту, методу и пути: даты в параметрах
+меняются каждый день, а записанные ответы нужны и завтра. Аккаунт входит в
+оба ключа: запросы аккаунтов Ozon различаются только заголовком Client-Id,
+и без него параллельное обновление раздало бы ответы не тем аккаунтам. Повторяющиеся запросы получают
+записанные ответы по очереди, по кругу. Если записи нет, выбрасывается
+requests.ConnectionError — дальше работают обычные резервные пути.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+MODES = ("", "record", "replay")
+
+_mode = ""
+_directory = ""
+_speed = 1.0
+_lock = threading.Lock()
+_record_path: str | None = None
+_recordings: dict | None = None
+_positions: dict = defaultdict(int)
+
+
+def configure(mode: str = "", directory: str = "", speed: float = 1.0) -> None:
+    """Задает режим записи/воспроизведения для процесса (вызывается из create_app)."""
+    global _mode, _directory, _speed, _record_path, _recordings
+    if mode not in MODES:
+        raise ValueError(f"unknown HTTP_RECORD_MODE: {mode}")
+    with _lock:
+        _mode, _directory, _speed = mode, directory, speed
+        _record_path = None
+        _recordings = None
+        _positions.clear()
+    if mode:
+        logging.info("HTTP %s mode, directory %s", mode, directory)
+
+
+def mode() -> str:
+    return _mode
+
+
+def _request_parts(account: str, method: str, url: str, kwargs: dict) -> tuple[str, str]:
+    """Ключ точного совпадения и путь запроса (метод и путь URL)."""
+    parts = urlsplit(url)
+    path = f"{method.upper()} {parts.path}"
+    exact = json.dumps(
+        [account, path, parts.query, kwargs.get("params"), kwargs.get("json")],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha1(exact.encode()).hexdigest(), path
+
+
+def _path_key(account: str, path: str) -> str:
+    """Ключ совпадения по аккаунту, методу и пути."""
+    return f"{account} {path}"
+
+
+def _append(entry: dict) -> None:
+    global _record_path
+    with _lock:
+        # Файл на процесс: воркеры и потоки пишут без общих блокировок файлов
+        if _record_path is None or not os.path.basename(_record_path).startswith(f"{os.getpid()}-"):
+            os.makedirs(_directory, exist_ok=True)
+            _record_path = os.path.join(_directory, f"{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}.jsonl.gz")
+        with gzip.open(_record_path, "at", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def record(endpoint: str, account: str, method: str, url: str, kwargs: dict, elapsed: float,
+           resp: requests.Response | None = None, error: Exception | None = None) -> None:
+    """Дописывает обмен с API в файл записи. Ошибка записи не влияет на запрос."""
+    key, path = _request_parts(account, method, url, kwargs)
+    entry = {
+        "endpoint": endpoint,
+        "account": account,
+        "key": key,
+        "path": path,
+        "url": url,
+        "params": kwargs.get("params"),
+        "json": kwargs.get("json"),
+        "elapsed": round(elapsed, 4),
+        "recorded_at": time.time(),
+    }
+    if resp is not None:
+        entry.update(status=resp.status_code, content_type=resp.headers.get("Content-Type", ""), body=resp.text)
+    else:
+        entry.update(error=type(error).__name__, message=str(error))
+    try:
+        _append(entry)
+    except Exception:
+        logging.exception("Failed to record %s", path)
+
+
+def load_recordings(directory: str) -> dict:
+    """Читает все записи каталога: {"exact": {ключ: [...]}, "path": {аккаунт и путь: [...]}} в порядке записи."""
+    by_key, by_path = defaultdict(list), defaultdict(list)
+    entries = []
+    for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else ():
+        if not name.endswith(".jsonl.gz"):
+            continue
+        try:
+            with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+        except (OSError, EOFError, ValueError):
+            logging.warning("Recording %s is damaged, readable part is used", name)
+    for entry in sorted(entries, key=lambda e: e["recorded_at"]):
+        by_key[entry["key"]].append(entry)
+        by_path[_path_key(entry["account"], entry["path"])].append(entry)
+    return {"exact": dict(by_key), "path": dict(by_path)}
+
+
+def _next(group: str, key: str) -> dict | None:
+    entries = _recordings[group].get(key)
+    if not entries:
+        return None
+    position = _positions[(group, key)]
+    _positions[(group, key)] = position + 1
+    return entries[position % len(entries)]
+
+
+_ERRORS = {
+    "Timeout": requests.Timeout,
+    "ReadTimeout": requests.ReadTimeout,
+    "ConnectTimeout": requests.ConnectTimeout,
+    "ConnectionError": requests.ConnectionError,
+}
+
+
+def replay(account: str, method: str, url: str, kwargs: dict) -> requests.Response:
+    """Отдает записанный ответ аккаунту с исходной задержкой, ускоренной в HTTP_REPLAY_SPEED раз."""
+    global _recordings
+    key, path = _request_parts(account, method, url, kwargs)
+    with _lock:
+        if _recordings is None:
+            _recordings = load_recordings(_directory)
+        entry = _next("exact", key) or _next("path", _path_key(account, path))
+    if entry is None:
+        raise requests.ConnectionError(f"No recording for {path} ({account})")
+    if _speed > 0:
+        time.sleep(entry["elapsed"] / _speed)
+    if "error" in entry:
+        raise _ERRORS.get(entry["error"], requests.RequestException)(entry["message"])
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp._content = entry["body"].encode("utf-8")
+    resp.encoding = "utf-8"
+    resp.headers = CaseInsensitiveDict({"Content-Type": entry["content_type"]})
+    resp.url = url
+    return resp
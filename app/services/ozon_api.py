@@ -1,19 +1,46 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from collections import defaultdict
 import logging
-import requests
 from typing import List, Tuple, Optional
+import requests
 from pydantic import ValidationError
-import json
+from flask import current_app
 
+from config import Config
 from .. import cache
+from ..utils import metrics
+from .http_client import call
+from ..utils.circuit_breaker import CircuitOpenError
+from .event_store import record_events, ozon_rows
+from . import posting_status
 from ..utils.sku_aliases import alias_sku, sort_pairs_by_alias
-from ..utils.cache_utils import get_timeout_to_next_half_hour
-from ..schemas import OzonStockResponse, OzonPostingResponse
+from ..utils.compact import EventSummaryBuilder, StockTableBuilder
+from ..utils.cache_utils import fetch_lock, get_timeout_to_next_half_hour
+from ..utils.persistent_cache import save_to_persistent_cache, load_from_persistent_cache, load_with_fallback
+from ..schemas import (
+    OzonStockItem,
+    OzonStockResponse,
+    OzonPosting,
+    OzonPostingResponse,
+    OzonProductListResponse,
+    OzonProductInfoResponse,
+    OzonReturnResponse,
+)
 
 
 OZON_BASE = "https://api-seller.ozon.ru"
+# Размер страницы списочных методов (максимум Seller API)
+PAGE_SIZE = 1000
+
+
+def _base_url() -> str:
+    """Базовый URL Seller API; переопределяется OZON_BASE в конфигурации."""
+    return current_app.config.get("OZON_BASE") or OZON_BASE
+
+
+class OzonAccountError(Exception):
+    """Ошибка загрузки данных аккаунта Ozon."""
 
 
 def _headers(client_id: str, api_key: str) -> dict:
@@ -37,161 +64,505 @@ def _make_hashable(accounts: list[dict]) -> Tuple[Tuple[str, str, Tuple[str, ...
         for acc in sorted(accounts, key=lambda x: x['client_id'])
     )
 
+def _list_products(client_id: str, api_key: str) -> dict[str, dict]:
+    """Возвращает {product_id: {offer_id, updated_at}} по всем неархивным товарам аккаунта."""
+    products: dict[str, dict] = {}
+    last_id = ""
+    while True:
+        resp = call(
+            "ozon:product_list",
+            "post",
+            f"{_base_url()}/v3/product/list",
+            account=client_id,
+            headers=_headers(client_id, api_key),
+            json={"filter": {"visibility": "ALL"}, "last_id": last_id, "limit": PAGE_SIZE},
+            timeout=30,
+        )
+        resp.raise_for_status()
+        with metrics.observe_validation("ozon:product_list") as probe:
+            page = OzonProductListResponse.model_validate(resp.json()).result
+            probe.rows = len(page.items)
+        for item in page.items:
+            if not item.archived:
+                products[str(item.product_id)] = {"offer_id": item.offer_id, "updated_at": item.updated_at}
+        if not page.items or not page.last_id or page.last_id == last_id:
+            break
+        last_id = page.last_id
+    return products
+
+
+def _fetch_products_info(client_id: str, api_key: str, product_ids: list[str]) -> dict[str, dict]:
+    """Загружает SKU и дату изменения для указанных товаров чанками по 1000."""
+    info: dict[str, dict] = {}
+    for i in range(0, len(product_ids), 1000):
+        chunk = [int(pid) for pid in product_ids[i : i + 1000]]
+        resp = call(
+            "ozon:product_info",
+            "post",
+            f"{_base_url()}/v3/product/info/list",
+            account=client_id,
+            headers=_headers(client_id, api_key),
+            json={"product_id": chunk},
+            timeout=30,
+        )
+        resp.raise_for_status()
+        with metrics.observe_validation("ozon:product_info") as probe:
+            items = OzonProductInfoResponse.model_validate(resp.json()).items
+            probe.rows = len(items)
+        for item in items:
+            sku = item.sku or next((src.sku for src in item.sources if src.sku), None)
+            info[str(item.id)] = {
+                "offer_id": item.offer_id,
+                "sku": str(sku) if sku else None,
+                "updated_at": item.updated_at,
+            }
+    return info
+
+
+def _changed(known: dict | None, listed: dict) -> bool:
+    """Нужно ли перезапросить товар: новый, сменился offer_id или товар изменен после сохранения."""
+    if known is None or known.get("offer_id") != listed["offer_id"]:
+        return True
+    return bool(listed["updated_at"]) and listed["updated_at"] != known.get("updated_at")
+
+
+@cache.memoize(timeout=Config.OZON_CATALOG_TTL_SECONDS)
+@fetch_lock
+@metrics.counts_cache_misses
+def fetch_catalog(client_id: str, api_key: str) -> dict:
+    """
+    Возвращает каталог товаров аккаунта Ozon: {product_id: {offer_id, sku, updated_at}}.
+
+    Каталог хранится в персистентном кэше и обновляется инкрементально:
+    список товаров запрашивается целиком (он дешевый), а /v3/product/info/list —
+    только для новых товаров и товаров, у которых сменился offer_id или
+    updated_at. Если сохраненный каталог моложе OZON_CATALOG_TTL_SECONDS,
+    API не вызывается вовсе. Ошибки API пробрасываются, чтобы резервный
+    каталог не попал в кэш на весь срок (см. catalog_skus).
+    """
+    key = f"ozon_catalog:{client_id}"
+    previous = load_from_persistent_cache(key) or {}
+    products: dict[str, dict] = previous.get("products", {})
+    refreshed_at = previous.get("refreshed_at")
+    now = datetime.now(ZoneInfo("UTC"))
+    if refreshed_at and (now - datetime.fromisoformat(refreshed_at)).total_seconds() < Config.OZON_CATALOG_TTL_SECONDS:
+        return previous
+
+    listed = _list_products(client_id, api_key)
+    changed = [pid for pid, item in listed.items() if _changed(products.get(pid), item)]
+    updated = {pid: products[pid] for pid in listed if pid in products}
+    if changed:
+        updated.update(_fetch_products_info(client_id, api_key, changed))
+
+    logging.info("Ozon catalog %s: %d products, %d new or changed", client_id, len(updated), len(changed))
+    catalog = {"refreshed_at": now.isoformat(), "products": updated}
+    save_to_persistent_cache(key, catalog)
+    return catalog
+
+
+def skus_from_catalog(catalog: dict) -> Tuple[str, ...]:
+    """Возвращает отсортированный кортеж SKU из каталога (см. fetch_catalog)."""
+    products = catalog.get("products", {})
+    return tuple(sorted({p["sku"] for p in products.values() if p.get("sku")}))
+
+
+def catalog_skus(client_id: str, api_key: str) -> Tuple[str, ...]:
+    """
+    Возвращает отсортированный кортеж SKU из каталога аккаунта. Если API
+    недоступен, SKU берутся из сохраненного каталога; такой результат не
+    кэшируется, и следующий запрос снова попробует обновить каталог.
+    """
+    with metrics.observe_cache("fetch_catalog") as outcome:
+        try:
+            catalog = fetch_catalog(client_id, api_key)
+        except (requests.RequestException, CircuitOpenError, ValidationError) as exc:
+            catalog = load_from_persistent_cache(f"ozon_catalog:{client_id}")
+            if not catalog:
+                raise
+            logging.warning("Ozon catalog refresh failed for %s, using saved catalog: %s", client_id, exc)
+            outcome["result"] = "stale"
+    return skus_from_catalog(catalog)
+
+
+def aggregate_stock_items(items: list[OzonStockItem], returns: dict[str, int] | None = None) -> dict:
+    """
+    Агрегирует строки /v1/analytics/stocks одного аккаунта по складам и SKU.
+
+    Детализация хранится в компактной таблице ``stock_table``
+    (см. app/utils/compact.py): товары в пути на склад (``transit_stock_count``)
+    — как «в пути к», возвраты ``returns`` ({offer_id: количество}) — как
+    «в пути от» для SKU, которые есть в остатках.
+    """
+    table = StockTableBuilder()
+    total = 0
+    total_in_transit = 0
+    for row in items:
+        total += row.available_stock_count
+        total_in_transit += row.transit_stock_count
+        table.add(
+            alias_sku(str(row.offer_id)),
+            row.warehouse_name or "Неизвестный кластер",
+            row.available_stock_count,
+            in_way_to=row.transit_stock_count,
+        )
+    for offer_id, qty in (returns or {}).items():
+        table.add_transit(alias_sku(offer_id), in_way_from=qty)
+    return {"total": total, "total_in_transit": total_in_transit, "stock_table": table.build()}
+
+
+@cache.memoize(timeout=Config.OZON_RETURNS_TTL_SECONDS)
+@fetch_lock
+@metrics.counts_cache_misses
+def fetch_account_returns(client_id: str, api_key: str) -> dict[str, int]:
+    """
+    Возвраты FBO одного аккаунта, еще не принятые на склад: {offer_id: количество}.
+
+    Один постраничный запрос на аккаунт вместо запросов по SKU; результат
+    кэшируется на OZON_RETURNS_TTL_SECONDS, поэтому обновление остатков
+    обычно не обращается к API возвратов.
+    """
+    by_offer: dict[str, int] = defaultdict(int)
+    payload = {"limit": PAGE_SIZE, "offset": 0}
+    while True:
+        resp = call(
+            "ozon:returns",
+            "post",
+            f"{_base_url()}/v3/returns/company/fbo",
+            account=client_id,
+            headers=_headers(client_id, api_key),
+            json=payload,
+            timeout=30,
+        )
+        if not resp.ok:
+            raise OzonAccountError(f"Ozon returns failed {client_id}: {resp.status_code}")
+        with metrics.observe_validation("ozon:returns") as probe:
+            rj = OzonReturnResponse.model_validate(resp.json())
+            probe.rows = len(rj.result)
+        for posting in rj.result:
+            for pr in posting.products:
+                by_offer[str(pr.offer_id)] += pr.quantity
+        if len(rj.result) < payload["limit"]:
+            return dict(by_offer)
+        payload["offset"] += payload["limit"]
+
+
+def _account_returns(client_id: str, api_key: str) -> dict[str, int]:
+    """Возвраты аккаунта; при ошибке — пусто, остатки показываются без них."""
+    try:
+        return fetch_account_returns(client_id, api_key)
+    except Exception as exc:
+        logging.warning("Ozon returns unavailable for %s: %s", client_id, exc)
+        return {}
+
+
 @cache.memoize(timeout=get_timeout_to_next_half_hour())
-def fetch_stocks(accounts_tuple: Tuple[Tuple[str, str, Tuple[str, ...]], ...]) -> dict:
+@fetch_lock
+@metrics.counts_cache_misses
+def fetch_account_stocks(client_id: str, api_key: str, skus: Tuple[str, ...]) -> dict:
     """
-    Агрегирует данные об остатках FBO по всем аккаунтам Ozon.
+    Загружает остатки FBO одного аккаунта Ozon через /v1/analytics/stocks.
 
-    Проходит по каждому аккаунту, запрашивает остатки через /v1/analytics/stocks
-    и суммирует их. Данные разбиваются на чанки по 100 SKU, как того
-    требует API Ozon.
+    Данные разбиваются на чанки по 100 SKU, как того требует API Ozon.
+    Кэшируется отдельно для каждого аккаунта, поэтому изменение списка SKU
+    одного магазина не сбрасывает кэш остальных. Если хотя бы один чанк не
+    загрузился, выбрасывает исключение: неполный результат не кэшируется.
     """
-    accounts = [
-        {'client_id': acc[0], 'api_key': acc[1], 'skus': list(acc[2])}
-        for acc in accounts_tuple
-    ]
+    items = []
+    # analytics/stocks поддерживает до 100 SKU за раз
+    sku_ids: List[int] = []
+    for s in skus:
+        try:
+            sku_ids.append(int(s))
+        except Exception:
+            pass
+    for i in range(0, len(sku_ids), 100):
+        chunk = sku_ids[i : i + 100]
+        resp = call(
+            "ozon:analytics_stocks",
+            "post",
+            f"{_base_url()}/v1/analytics/stocks",
+            account=client_id,
+            headers=_headers(client_id, api_key),
+            json={"skus": chunk},
+            timeout=30,
+        )
+        if not resp.ok:
+            raise OzonAccountError(f"Ozon analytics/stocks failed {client_id}: {resp.status_code}")
+
+        with metrics.observe_validation("ozon:analytics_stocks") as probe:
+            rj = OzonStockResponse.model_validate(resp.json())
+            probe.rows = len(rj.items)
+        items.extend(rj.items)
+
+    result = dict(
+        aggregate_stock_items(items, _account_returns(client_id, api_key)),
+        client_id=client_id,
+        fetched_at=datetime.now(ZoneInfo("UTC")).isoformat(),
+    )
+    save_to_persistent_cache(f"ozon_stocks:{client_id}", result)
+    return result
 
-    final_total = 0
-    final_by_warehouse: dict[str, int] = defaultdict(int)
-    final_by_sku: dict[str, int] = defaultdict(int)
-    final_by_sku_warehouses: dict[str, dict[str, int]] = {}
 
+def _load_account(loader, persistent_key: str, client_id: str, *args) -> dict | None:
+    """
+    Загружает данные одного аккаунта, при ошибке — из персистентного кэша.
+
+    Результат из резервного кэша помечается флагами ``stale`` и ``error``
+    (см. load_with_fallback); он не попадает в кэш Flask-Caching, поэтому
+    следующий запрос снова попробует обратиться к API. Возвращает None,
+    если данных нет вовсе.
+    """
     try:
-        for account in accounts:
-            client_id = account["client_id"]
-            api_key = account["api_key"]
-            ozon_skus = account.get("skus", [])
-            if not ozon_skus:
+        return load_with_fallback(loader, persistent_key, client_id, *args)
+    except Exception:
+        return None
+
+
+def _account_status(client_id: str, part: dict | None) -> dict:
+    if part is None:
+        return {"client_id": client_id, "fetched_at": None, "stale": False, "warmed": False, "error": True}
+    return {
+        "client_id": client_id,
+        "fetched_at": part.get("fetched_at"),
+        "stale": bool(part.get("stale")),
+        "warmed": bool(part.get("warmed")),
+        "error": bool(part.get("error")),
+    }
+
+
+def fetch_stocks(accounts_tuple: Tuple[Tuple[str, str, Tuple[str, ...]], ...]) -> dict:
+    """
+    Агрегирует данные об остатках FBO по всем аккаунтам Ozon.
+
+    Каждый аккаунт загружается и кэшируется отдельно (см. fetch_account_stocks),
+    здесь результаты только суммируются. Для аккаунтов без явного списка
+    SKU он берется из каталога товаров (см. fetch_catalog). Для каждого аккаунта в ключе
+    ``accounts`` возвращается время загрузки и признак ошибки/устаревания.
+    """
+    parts: list[dict] = []
+    accounts_status: list[dict] = []
+
+    for client_id, api_key, skus in accounts_tuple:
+        if not skus:
+            # SKU не заданы в .env — берем их из каталога товаров аккаунта
+            try:
+                skus = catalog_skus(client_id, api_key)
+            except Exception as exc:
+                logging.exception("Ozon catalog unavailable for %s: %s", client_id, exc)
+                accounts_status.append(_account_status(client_id, None))
                 continue
-            # analytics/stocks поддерживает до 100 SKU за раз
-            sku_ids: List[int] = []
-            for s in ozon_skus:
-                try:
-                    sku_ids.append(int(s))
-                except Exception:
-                    pass
-            for i in range(0, len(sku_ids), 100):
-                chunk = sku_ids[i : i + 100]
-                resp = requests.post(
-                    f"{OZON_BASE}/v1/analytics/stocks",
-                    headers=_headers(client_id, api_key),
-                    json={"skus": chunk},
-                    timeout=30,
-                )
-                if not resp.ok:
-                    logging.warning("Ozon analytics/stocks failed %s: %s", client_id, resp.status_code)
-                    continue
-                
-                try:
-                    rj = OzonStockResponse.model_validate(resp.json())
-                    for row in rj.items:
-                        qty = row.available_stock_count
-                        wh_name = row.warehouse_name or "Неизвестный кластер"
-                        sku_name = alias_sku(str(row.offer_id))
-                        final_total += qty
-                        final_by_warehouse[wh_name] += qty
-                        final_by_sku[sku_name] += qty
-                        sku_wh = final_by_sku_warehouses.setdefault(sku_name, defaultdict(int))
-                        sku_wh[wh_name] += qty
-                except (ValidationError, json.JSONDecodeError) as exc:
-                    logging.error("Failed to parse Ozon stocks for %s: %s", client_id, exc)
-                    continue
-
-        warehouses = sorted(final_by_warehouse.items(), key=lambda x: x[0])
-        skus = sort_pairs_by_alias(list(final_by_sku.items()))
-        sku_details: dict[str, list[tuple[str, int]]] = {}
-        for sku_name, wh_map in final_by_sku_warehouses.items():
-            pairs = [(w, q) for w, q in wh_map.items() if q > 0]
-            pairs.sort(key=lambda x: (-x[1], x[0]))
-            sku_details[sku_name] = pairs
-
-        return {
-            "total": final_total,
-            "warehouses": warehouses,
-            "skus": skus,
-            "sku_details": sku_details,
-        }
-    except Exception as exc:
-        logging.exception("Ozon fetch_stocks failed: %s", exc)
-        raise
+            if not skus:
+                continue
+        part = _load_account(fetch_account_stocks, f"ozon_stocks:{client_id}", client_id, api_key, skus)
+        accounts_status.append(_account_status(client_id, part))
+        if part is not None:
+            parts.append(part)
+
+    if accounts_status and not parts:
+        raise OzonAccountError("Ozon stocks unavailable for all accounts")
+
+    return dict(merge_account_stocks(parts), accounts=accounts_status)
+
+
+def merge_account_stocks(parts: list[dict]) -> dict:
+    """Суммирует остатки аккаунтов в одну таблицу остатков."""
+    table = StockTableBuilder()
+    total = 0
+    total_in_transit = 0
+    for part in parts:
+        total += part["total"]
+        total_in_transit += part.get("total_in_transit", 0)
+        table.extend(part["stock_table"])
+    return {"total": total, "total_in_transit": total_in_transit, "stock_table": table.build()}
 
 
 def _fetch_postings(client_id: str, api_key: str, start_iso: str, status: str | None = None) -> list:
+    """Загружает отправления FBO постранично (по PAGE_SIZE), пока страница не окажется неполной."""
     payload = {
         "dir": "asc",
         "filter": {"since": start_iso, "to": datetime.now().isoformat() + "Z"},
-        "limit": 1000,
+        "limit": PAGE_SIZE,
         "offset": 0,
     }
     if status:
         payload["filter"]["status"] = status
-    # Используем v2 для FBO, как наиболее актуальную версию API
-    resp = requests.post(f"{OZON_BASE}/v2/posting/fbo/list", headers=_headers(client_id, api_key), json=payload, timeout=30)
-    resp.raise_for_status()
-    validated_resp = OzonPostingResponse.model_validate(resp.json())
-    return validated_resp.result
+    postings = []
+    while True:
+        # Используем v2 для FBO, как наиболее актуальную версию API
+        resp = call("ozon:postings", "post", f"{_base_url()}/v2/posting/fbo/list", account=client_id, headers=_headers(client_id, api_key), json=payload, timeout=30)
+        resp.raise_for_status()
+        with metrics.observe_validation("ozon:postings") as probe:
+            validated_resp = OzonPostingResponse.model_validate(resp.json())
+            probe.rows = len(validated_resp.result)
+        postings.extend(validated_resp.result)
+        if len(validated_resp.result) < payload["limit"]:
+            return postings
+        payload["offset"] += payload["limit"]
+
+
+def aggregate_postings(postings: list[OzonPosting], tz: ZoneInfo) -> dict:
+    """Считает заказанные товары по SKU и детализацию заказов по отправлениям."""
+    ordered_total = 0
+    ordered_by_sku: dict[str, int] = defaultdict(int)
+    ordered_events = EventSummaryBuilder()
+    for p in postings:
+        order_time_local = datetime.fromisoformat(p.in_process_at.replace('Z', '+00:00')).astimezone(tz)
+
+        city = "Неизвестно"
+        warehouse = p.cluster_from or "Неизвестно"
+        if p.analytics_data:
+            city = p.analytics_data.city or p.analytics_data.region or "Неизвестно"
+            warehouse = p.cluster_from or p.analytics_data.warehouse_name or "Неизвестно"
+
+        for pr in p.products:
+            sku_name = alias_sku(str(pr.offer_id))
+            ordered_by_sku[sku_name] += pr.quantity
+            ordered_total += pr.quantity
+            ordered_events.add(sku_name, order_time_local, city, warehouse)
+    return {
+        "ordered": ordered_total,
+        "ordered_by_sku": dict(ordered_by_sku),
+        "ordered_events": ordered_events.build(),
+    }
 
 
 @cache.memoize(timeout=get_timeout_to_next_half_hour())
+@fetch_lock
+@metrics.counts_cache_misses
+def fetch_account_today(client_id: str, api_key: str, tz: ZoneInfo) -> dict:
+    """
+    Загружает заказы одного аккаунта Ozon за сегодняшний день.
+
+    Запрашивает все отправления (postings) с начала сегодняшнего дня по
+    указанной таймзоне и собирает разбивку по SKU и детализацию по заказам.
+    Кэшируется отдельно для каждого аккаунта.
+    """
+    start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    # Заказано: все постинги с начала суток (без статуса)
+    postings = _fetch_postings(client_id, api_key, start)
+    record_events(ozon_rows(client_id, postings, tz))
+    try:
+        delivered = track_deliveries(client_id, api_key, tz, postings)
+    except Exception as exc:
+        # Выкупы — дополнительная информация, без них заказы все равно показываются
+        logging.exception("Ozon delivery tracking failed for %s: %s", client_id, exc)
+        delivered = {}
+    result = dict(
+        aggregate_postings(postings, tz),
+        **delivered,
+        client_id=client_id,
+        fetched_at=datetime.now(ZoneInfo("UTC")).isoformat(),
+    )
+    save_to_persistent_cache(f"ozon_today:{client_id}:{datetime.now(tz).date().isoformat()}", result)
+    return result
+
+
+def track_deliveries(client_id: str, api_key: str, tz: ZoneInfo, today_postings: list[OzonPosting]) -> dict:
+    """
+    Обновляет статусы отправлений аккаунта и считает выкупы за сегодня.
+
+    Запрашиваются только отправления в статусах delivered и cancelled,
+    созданные после водяной отметки (см. app/services/posting_status.py);
+    выкупом считается новый переход в delivered. Первый запуск только
+    запоминает текущие статусы за OZON_DELIVERY_LOOKBACK_DAYS дней, не
+    считая их выкупами. Новые выкупы также попадают в хранилище событий.
+    """
+    now = datetime.now(ZoneInfo("UTC"))
+    now_naive = now.replace(tzinfo=None)
+    lookback_start = now_naive - timedelta(days=current_app.config.get("OZON_DELIVERY_LOOKBACK_DAYS", 14))
+    today_start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0).astimezone(ZoneInfo("UTC")).replace(tzinfo=None)
+
+    # Уже учтенные выкупы за сегодня читаются до записи новых
+    delivered_rows = [tuple(row) for row in posting_status.delivered_since(client_id, today_start)]
+
+    watermark = posting_status.load_watermark(client_id)
+    if watermark is None:
+        baseline = _fetch_postings(client_id, api_key, lookback_start.isoformat() + "Z")
+        posting_status.record_postings(posting_status.posting_rows(client_id, baseline))
+        newly_delivered = []
+    else:
+        since = max(lookback_start, min(watermark, posting_status.oldest_open(client_id) or watermark))
+        changed = [
+            p
+            for status in posting_status.TERMINAL_STATUSES
+            for p in _fetch_postings(client_id, api_key, since.isoformat() + "Z", status)
+        ]
+        known = posting_status.known_statuses(client_id, [p.posting_number for p in changed])
+        changed = [p for p in changed if known.get(p.posting_number) != p.status]
+        newly_delivered = [p for p in changed if p.status == "delivered"]
+        posting_status.record_postings(posting_status.posting_rows(client_id, changed, delivered_at=now_naive))
+        record_events(ozon_rows(client_id, newly_delivered, tz, kind="sale", occurred_at=now))
+        delivered_rows += [
+            (row["sku"], row["quantity"], now_naive, row["city"], row["warehouse"])
+            for row in posting_status.posting_rows(client_id, newly_delivered, delivered_at=now_naive)
+        ]
+
+    # Незавершенные сегодняшние отправления — чтобы отметка не ушла дальше них
+    open_today = [p for p in today_postings if p.status not in posting_status.TERMINAL_STATUSES]
+    posting_status.record_postings(posting_status.posting_rows(client_id, open_today))
+    posting_status.save_watermark(client_id, now_naive)
+
+    purchased_by_sku: dict[str, int] = defaultdict(int)
+    purchased_events = EventSummaryBuilder()
+    for sku, quantity, delivered_at, city, warehouse in delivered_rows:
+        sku_name = alias_sku(sku)
+        purchased_by_sku[sku_name] += quantity
+        purchased_events.add(sku_name, delivered_at.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz), city or "Неизвестно", warehouse or "Неизвестно")
+    logging.info("Ozon %s: %d postings newly delivered", client_id, len(newly_delivered))
+    return {
+        "purchased": sum(purchased_by_sku.values()),
+        "purchased_by_sku": dict(purchased_by_sku),
+        "purchased_events": purchased_events.build(),
+    }
+
+
 def fetch_today_metrics(accounts_tuple: Tuple[Tuple[str, str, Tuple[str, ...]], ...], tz: ZoneInfo) -> dict:
     """
     Агрегирует данные о заказах за сегодняшний день по всем аккаунтам Ozon.
 
-    Для каждого аккаунта запрашивает все отправления (postings) с начала
-    сегодняшнего дня по указанной таймзоне. Собирает общую статистику
-    (количество заказанных товаров, разбивка по SKU), а также детализацию
-    по каждому заказу для отображения в интерфейсе.
+    Каждый аккаунт загружается и кэшируется отдельно (см. fetch_account_today),
+    здесь результаты суммируются, а сводки заказов объединяются.
     """
-    accounts = [
-        {'client_id': acc[0], 'api_key': acc[1], 'skus': list(acc[2])}
-        for acc in accounts_tuple
-    ]
+    day = datetime.now(tz).date().isoformat()
+    parts: list[dict] = []
+    accounts_status: list[dict] = []
+
+    for client_id, api_key, _skus in accounts_tuple:
+        part = _load_account(fetch_account_today, f"ozon_today:{client_id}:{day}", client_id, api_key, tz)
+        accounts_status.append(_account_status(client_id, part))
+        if part is not None:
+            parts.append(part)
+
+    if accounts_status and not parts:
+        raise OzonAccountError("Ozon today metrics unavailable for all accounts")
 
+    return dict(merge_account_today(parts), accounts=accounts_status)
+
+
+def merge_account_today(parts: list[dict]) -> dict:
+    """Суммирует заказы и выкупы аккаунтов и объединяет сводки событий."""
     ordered_total = 0
+    purchased_total = 0
     ordered_by_sku: dict[str, int] = defaultdict(int)
-    ordered_skus_details: dict[str, list] = defaultdict(list)
-    try:
-        start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-        for account in accounts:
-            client_id = account["client_id"]
-            api_key = account["api_key"]
-            # Заказано: все постинги с начала суток (без статуса)
-            for p in _fetch_postings(client_id, api_key, start):
-                for pr in p.products:
-                    qty = pr.quantity
-                    sku_name = alias_sku(str(pr.offer_id))
-                    ordered_by_sku[sku_name] += qty
-                    ordered_total += qty
-
-                    order_time_utc = datetime.fromisoformat(p.in_process_at.replace('Z', '+00:00'))
-                    order_time_local = order_time_utc.astimezone(tz)
-
-                    city = "Неизвестно"
-                    warehouse = p.cluster_from or "Неизвестно"
-                    if p.analytics_data:
-                        city = p.analytics_data.city or p.analytics_data.region or "Неизвестно"
-                        warehouse = p.cluster_from or p.analytics_data.warehouse_name or "Неизвестно"
-
-                    details = {
-                        "time": order_time_local.strftime('%H:%M'),
-                        "warehouse": warehouse,
-                        "city": city
-                    }
-                    ordered_skus_details[sku_name].append(details)
-        
-        # Сортируем заказы внутри каждого SKU по времени
-        for sku in ordered_skus_details:
-            ordered_skus_details[sku].sort(key=lambda x: x['time'])
-
-        return {
-            "ordered": ordered_total,
-            "purchased": 0, # Больше не запрашиваем
-            "ordered_skus": sort_pairs_by_alias(list(ordered_by_sku.items())),
-            "purchased_skus": [], # Больше не запрашиваем
-            "ordered_skus_details": ordered_skus_details,
-        }
-    except (ValidationError, Exception) as exc:
-        logging.exception("Ozon fetch_today_metrics failed: %s", exc)
-        raise
-
+    purchased_by_sku: dict[str, int] = defaultdict(int)
+    ordered_events = EventSummaryBuilder()
+    purchased_events = EventSummaryBuilder()
+    for part in parts:
+        ordered_total += part["ordered"]
+        for sku_name, qty in part["ordered_by_sku"].items():
+            ordered_by_sku[sku_name] += qty
+        ordered_events.extend(part["ordered_events"])
+        # Выкупы могут отсутствовать, если отслеживание статусов не удалось
+        purchased_total += part.get("purchased", 0)
+        for sku_name, qty in part.get("purchased_by_sku", {}).items():
+            purchased_by_sku[sku_name] += qty
+        purchased_events.extend(part.get("purchased_events"))
 
+    return {
+        "ordered": ordered_total,
+        "purchased": purchased_total,
+        "ordered_skus": sort_pairs_by_alias(list(ordered_by_sku.items())),
+        "purchased_skus": sort_pairs_by_alias(list(purchased_by_sku.items())),
+        "ordered_events": ordered_events.build(),
+        "purchased_events": purchased_events.build(),
+    }
@@ -0,0 +1,122 @@
+"""
+Статусы отправлений Ozon для инкрементального подсчета выкупов
+(таблица ozon_posting_statuses).
+
+Отправления не перезапрашиваются за весь день: обновление запрашивает
+только отправления в статусах delivered и cancelled, созданные не раньше
+водяной отметки, и сравнивает их с сохраненными статусами. Выкупом
+считается переход в delivered. Отметка — самое старое еще не завершенное
+отправление или момент прошлой проверки, но не раньше
+OZON_DELIVERY_LOOKBACK_DAYS дней назад.
+"""
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Iterable
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func, select
+
+from ..models import db, OzonPostingStatus
+from ..utils.persistent_cache import defer_write, load_from_persistent_cache, save_to_persistent_cache
+from .event_store import UPSERT_BATCH_SIZE, upsert_statement
+
+
+UTC = ZoneInfo("UTC")
+TERMINAL_STATUSES = ("delivered", "cancelled")
+_UPDATE_COLUMNS = ("quantity", "status", "in_process_at", "city", "warehouse", "updated_at")
+
+
+def _naive_utc(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(UTC).replace(tzinfo=None)
+
+
+def posting_rows(client_id: str, postings: Iterable, delivered_at: datetime | None = None) -> list[dict]:
+    """Строки таблицы по товарам отправлений; ``delivered_at`` ставится только доставленным."""
+    rows = []
+    for p in postings:
+        city = ""
+        warehouse = p.cluster_from or ""
+        if p.analytics_data:
+            city = p.analytics_data.city or p.analytics_data.region or ""
+            warehouse = p.cluster_from or p.analytics_data.warehouse_name or ""
+        for pr in p.products:
+            rows.append({
+                "client_id": client_id,
+                "posting_number": p.posting_number,
+                "sku": str(pr.offer_id),
+                "quantity": pr.quantity,
+                "status": p.status or "",
+                "in_process_at": _naive_utc(p.in_process_at),
+                "city": city,
+                "warehouse": warehouse,
+                "delivered_at": delivered_at if p.status == "delivered" else None,
+            })
+    return rows
+
+
+def record_postings(rows: list[dict], commit: bool = True) -> int:
+    """Сохраняет статусы (upsert); уже записанный ``delivered_at`` не перезаписывается."""
+    unique = {(r["client_id"], r["posting_number"], r["sku"]): r for r in rows if r["posting_number"]}
+    if not unique:
+        return 0
+    if defer_write(partial(record_postings, list(unique.values()), commit=False)):
+        return len(unique)
+    now = datetime.utcnow()
+    batch = [dict(row, updated_at=now) for row in unique.values()]
+    try:
+        stmt = upsert_statement(OzonPostingStatus, ("client_id", "posting_number", "sku"), _UPDATE_COLUMNS, keep=("delivered_at",))
+        for i in range(0, len(batch), UPSERT_BATCH_SIZE):
+            db.session.execute(stmt, batch[i : i + UPSERT_BATCH_SIZE])
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logging.exception("Failed to record Ozon posting statuses")
+        if not commit:
+            raise
+    return len(unique)
+
+
+def known_statuses(client_id: str, posting_numbers: Iterable[str]) -> dict[str, str]:
+    """Сохраненные статусы отправлений: {posting_number: статус}."""
+    numbers = sorted(set(posting_numbers))
+    statuses: dict[str, str] = {}
+    for i in range(0, len(numbers), UPSERT_BATCH_SIZE):
+        chunk = numbers[i : i + UPSERT_BATCH_SIZE]
+        statuses.update(db.session.execute(
+            select(OzonPostingStatus.posting_number, OzonPostingStatus.status)
+            .where(OzonPostingStatus.client_id == client_id, OzonPostingStatus.posting_number.in_(chunk))
+        ).all())
+    return statuses
+
+
+def oldest_open(client_id: str) -> datetime | None:
+    """Время создания самого старого незавершенного отправления (UTC)."""
+    return db.session.execute(
+        select(func.min(OzonPostingStatus.in_process_at))
+        .where(OzonPostingStatus.client_id == client_id, OzonPostingStatus.status.not_in(TERMINAL_STATUSES))
+    ).scalar()
+
+
+def delivered_since(client_id: str, start: datetime) -> list[tuple]:
+    """Выкупы аккаунта, замеченные с ``start`` (UTC): (sku, количество, delivered_at, город, склад)."""
+    return db.session.execute(
+        select(OzonPostingStatus.sku, OzonPostingStatus.quantity, OzonPostingStatus.delivered_at, OzonPostingStatus.city, OzonPostingStatus.warehouse)
+        .where(OzonPostingStatus.client_id == client_id, OzonPostingStatus.delivered_at >= start)
+        .order_by(OzonPostingStatus.delivered_at)
+    ).all()
+
+
+def _watermark_key(client_id: str) -> str:
+    return f"ozon_postings_watermark:{client_id}"
+
+
+def load_watermark(client_id: str) -> datetime | None:
+    """Момент прошлой проверки статусов (UTC, без tzinfo) или None до первой проверки."""
+    data = load_from_persistent_cache(_watermark_key(client_id))
+    return datetime.fromisoformat(data["checked_at"]) if data else None
+
+
+def save_watermark(client_id: str, checked_at: datetime) -> None:
+    save_to_persistent_cache(_watermark_key(client_id), {"checked_at": checked_at.isoformat()})
@@ -0,0 +1,187 @@
+"""
+Пакетное обновление данных дашборда (scripts/refresh.py).
+
+Выбранные источники (см. warmup.iter_sources) загружаются из API
+параллельно в пуле потоков, минуя memoize и fetch_lock. Свежие результаты кладутся в
+кэш Flask-Caching под ключами memoize. Снимки резервного кэша, события
+заказов, история остатков (stock_deltas), дневные метрики (daily_metrics)
+и индекс запаса в днях (stock_cover) пишутся одной транзакцией после
+загрузки всех источников.
+
+Каталоги Ozon загружаются первым этапом: от них зависит список SKU
+аккаунтов без OZON_SKUS_n.
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, NamedTuple
+from zoneinfo import ZoneInfo
+
+from flask import Flask
+
+from .. import cache
+from ..models import db, DailyMetric
+from ..utils.compact import StockView
+from ..utils.persistent_cache import deferred_writes
+from . import ozon_api
+from .stock_cover import cover_cache_key, refresh_cover
+from .stock_history import record_state
+from .warmup import Source, cache_key, iter_sources
+
+
+SOURCE_NAMES = ("wb_stocks", "wb_today", "ozon_catalog", "ozon_stocks", "ozon_today")
+
+
+class SourceReport(NamedTuple):
+    """Итог обновления одного источника."""
+    name: str
+    account: str
+    ok: bool
+    seconds: float
+    rows: int
+    error: str | None = None
+
+
+def _rows(result: dict) -> int:
+    """Размер результата: ячейки (sku, склад), события или товары каталога."""
+    if "stock_table" in result:
+        return len(StockView(result["stock_table"]).cells)
+    if "products" in result:
+        return len(result["products"])
+    return sum(
+        summary[0]
+        for key in ("ordered_events", "purchased_events")
+        for summary in (result.get(key) or {}).get("summaries", {}).values()
+    )
+
+
+def _load(app: Flask, source: Source) -> tuple[SourceReport, dict | None]:
+    started = time.perf_counter()
+    # Мимо memoize и fetch_lock: ожидание чужой загрузки вернуло бы ее
+    # (или уже закэшированный) результат вместо свежего ответа API
+    loader = source.loader.uncached
+    loader = getattr(loader, "unlocked", loader)
+    with app.app_context():
+        try:
+            result = loader(*source.args)
+        except Exception as exc:
+            logging.warning("Refresh of %s failed: %s", source.persistent_key, exc)
+            seconds = time.perf_counter() - started
+            return SourceReport(source.name, source.account, False, seconds, 0, str(exc) or type(exc).__name__), None
+    return SourceReport(source.name, source.account, True, time.perf_counter() - started, _rows(result)), result
+
+
+def _load_all(app: Flask, sources: list[Source], workers: int) -> list[tuple[Source, SourceReport, dict | None]]:
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="refresh") as pool:
+        loaded = list(pool.map(lambda source: _load(app, source), sources))
+    return [(source, report, result) for source, (report, result) in zip(sources, loaded)]
+
+
+def _selected(source: Source, names, accounts) -> bool:
+    return (names is None or source.name in names) and (accounts is None or source.account in accounts)
+
+
+def _persist(app: Flask, outcomes, writes: list[Callable[[], None]], history: bool) -> None:
+    """
+    Пишет отложенные записи загрузчиков (снимки резервного кэша, события) и
+    (с ``history``) историю остатков и дневные метрики одной транзакцией.
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Europe/Moscow"))
+    today = datetime.now(tz).date()
+    captured_at = datetime.utcnow()
+    ok = {(source.name, source.account): result for source, report, result in outcomes if report.ok}
+
+    for write in writes:
+        write()
+    if not history:
+        db.session.commit()
+        return
+
+    # История остатков ведется по аккаунтам: сбой одного аккаунта Ozon не
+    # должен выглядеть как обнуление его остатков в общей истории.
+    for (name, account), result in ok.items():
+        if name == "wb_stocks":
+            record_state("wb", StockView(result["stock_table"]).cells, captured_at)
+        elif name == "ozon_stocks":
+            record_state(f"ozon:{account}", StockView(result["stock_table"]).cells, captured_at)
+
+    # Индекс запаса в днях: события заказов уже записаны выше
+    covered = []
+    if ("wb_stocks", "wb") in ok:
+        refresh_cover("wb", StockView(ok[("wb_stocks", "wb")]["stock_table"]).cells, captured_at)
+        covered.append("wb")
+    ozon_accounts = [client_id for client_id, _api_key, _skus in ozon_api._make_hashable(app.config.get("OZON_ACCOUNTS", []))]
+    if ozon_accounts and all(("ozon_stocks", client_id) in ok for client_id in ozon_accounts):
+        ozon_cells: dict[tuple[str, str], int] = defaultdict(int)
+        for client_id in ozon_accounts:
+            for key, qty in StockView(ok[("ozon_stocks", client_id)]["stock_table"]).cells.items():
+                ozon_cells[key] += qty
+        refresh_cover("ozon", ozon_cells, captured_at)
+        covered.append("ozon")
+
+    daily = {}
+    if ("wb_today", "wb") in ok:
+        wb_today = ok[("wb_today", "wb")]
+        daily["wb"] = (wb_today["ordered"], wb_today["purchased"])
+    # Сумма по Ozon пишется, только если обновились все аккаунты
+    if ozon_accounts and all(("ozon_today", client_id) in ok for client_id in ozon_accounts):
+        parts = [ok[("ozon_today", client_id)] for client_id in ozon_accounts]
+        daily["ozon"] = (sum(part["ordered"] for part in parts), sum(part.get("purchased", 0) for part in parts))
+
+    for marketplace, (ordered, purchased) in daily.items():
+        row = DailyMetric.query.filter_by(marketplace=marketplace, date=today).first()
+        if not row:
+            row = DailyMetric(marketplace=marketplace, date=today)
+        row.ordered_count = int(ordered or 0)
+        row.purchased_count = int(purchased or 0)
+        db.session.add(row)
+
+    db.session.commit()
+    for marketplace in covered:
+        cache.delete(cover_cache_key(marketplace))
+
+
+def run_refresh(
+    app: Flask,
+    names: set[str] | None = None,
+    accounts: set[str] | None = None,
+    workers: int | None = None,
+    history: bool = True,
+) -> list[SourceReport]:
+    """
+    Обновляет выбранные источники и возвращает отчет по каждому.
+
+    ``names`` — подмножество SOURCE_NAMES, ``accounts`` — client_id аккаунтов
+    Ozon и/или ``wb``; None означает «все». Без ``history`` пишутся только
+    кэш и снимки резервного кэша. Источники с ошибкой не трогают кэш и
+    историю. Если транзакция не записалась, исключение пробрасывается.
+    """
+    workers = workers or app.config.get("REFRESH_WORKERS", 4)
+    with deferred_writes() as writes:
+        with app.app_context():
+            catalogs = [s for s in iter_sources(app) if s.name == "ozon_catalog" and _selected(s, names, accounts)]
+        outcomes = _load_all(app, catalogs, workers)
+        loaded_catalogs = {source.account: result for source, report, result in outcomes if report.ok}
+
+        with app.app_context():
+            sources = [
+                s for s in iter_sources(app, catalogs=loaded_catalogs)
+                if s.name != "ozon_catalog" and _selected(s, names, accounts)
+            ]
+        outcomes += _load_all(app, sources, workers)
+
+    with app.app_context():
+        for source, report, result in outcomes:
+            if report.ok:
+                cache.set(cache_key(source), result, timeout=source.timeout)
+        try:
+            _persist(app, outcomes, writes, history)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return [report for _source, report, _result in outcomes]
@@ -0,0 +1,247 @@
+"""
+Хранение истории: прореживание истории остатков и очистка kv_store.
+
+Политики задаются в конфигурации (RETENTION_*):
+
+- из истории остатков stock_deltas удаляется все, что раньше последнего
+  keyframe перед границей RETENTION_STOCK_HISTORY_DAYS дней, — так
+  состояние на любой момент после границы остается восстановимым;
+  перед удалением каждые UTC-сутки, теряющие строки, сворачиваются в
+  stock_daily (min/max/close по маркетплейсу, складу и SKU);
+- сырые строки stock_snapshots (история до перехода на stock_deltas)
+  хранятся RETENTION_RAW_SNAPSHOT_DAYS дней, более старые так же
+  сворачиваются в stock_daily и удаляются;
+- строки stock_daily старше RETENTION_DAILY_DAYS дней удаляются (0 — никогда);
+- строки kv_store, не обновлявшиеся RETENTION_KV_DAYS дней (прошедшие дни
+  ``wb_today:<дата>``, отключенные магазины), удаляются; служебные ключи
+  (``retention:*``, водяные знаки отправлений Ozon) не трогаются;
+- почасовые суммы hourly_rollups за последние RETENTION_ROLLUP_RECONCILE_DAYS
+  дней пересчитываются из order_events: так расхождение приращений
+  (например, после сбоя записи) не живет дольше суток.
+
+Удаление идет короткими транзакциями по RETENTION_BATCH_SIZE строк с паузой
+между ними, чтобы не блокировать чтение приложением. В конце выполняется
+ANALYZE, а раз в RETENTION_VACUUM_INTERVAL_DAYS дней — VACUUM.
+Повторный запуск после сбоя безопасен: свертка дня идемпотентна.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+from itertools import groupby
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+from sqlalchemy import func, or_
+
+from ..models import db, KeyValue, StockDaily, StockDelta, StockSnapshot
+from ..utils.persistent_cache import load_from_persistent_cache, save_to_persistent_cache
+from .event_store import rebuild_rollups
+from .stock_history import last_keyframe_at, state_at
+
+
+VACUUM_STATE_KEY = "retention:last_vacuum"
+# Ключи kv_store, которые не истекают по RETENTION_KV_DAYS: без водяного
+# знака отправлений Ozon следующее обновление перечитает окно целиком
+KV_KEEP_PREFIXES = ("retention:", "ozon_postings_watermark:")
+
+
+def _ensure_schema() -> None:
+    """Создает недостающие таблицы и индексы, добавленные после создания таблиц."""
+    db.create_all()
+    for table in (StockSnapshot.__table__, KeyValue.__table__, StockDelta.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def _delete_in_batches(model, condition, batch_size: int, pause: float) -> int:
+    """Удаляет строки ``model`` по условию пачками, каждая пачка — отдельная транзакция."""
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id).filter(condition).limit(batch_size)]
+        if not ids:
+            return deleted
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+        if pause:
+            time.sleep(pause)
+
+
+def _merge_daily(day, rows) -> int:
+    """
+    Объединяет строки (marketplace, склад, sku, min, max, close, close_at)
+    со сводкой дня: min/max складываются, close — по последнему времени.
+    Возвращает число строк сводки дня.
+    """
+    existing = {
+        (d.marketplace, d.warehouse_name, d.sku): d
+        for d in StockDaily.query.filter_by(date=day)
+    }
+    for marketplace, warehouse_name, sku, low, high, close, close_at in rows:
+        key = (marketplace, warehouse_name, sku)
+        daily = existing.get(key)
+        if daily is None:
+            daily = existing[key] = StockDaily(
+                marketplace=marketplace,
+                warehouse_name=warehouse_name,
+                sku=sku,
+                date=day,
+                min_quantity=low,
+                max_quantity=high,
+                close_quantity=close,
+                close_at=close_at,
+            )
+            db.session.add(daily)
+            continue
+        daily.min_quantity = min(daily.min_quantity, low)
+        daily.max_quantity = max(daily.max_quantity, high)
+        if close_at >= daily.close_at:
+            daily.close_quantity = close
+            daily.close_at = close_at
+    db.session.commit()
+    return len(existing)
+
+
+def downsample_day(day) -> int:
+    """Сворачивает сырые снимки stock_snapshots одного дня в stock_daily."""
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    rows = (
+        db.session.query(StockSnapshot.marketplace, StockSnapshot.warehouse_name, StockSnapshot.sku, StockSnapshot.quantity, StockSnapshot.captured_at)
+        .filter(StockSnapshot.captured_at >= start, StockSnapshot.captured_at < end)
+        .order_by(StockSnapshot.captured_at)
+    )
+    return _merge_daily(day, ((m, wh, sku, qty, qty, qty, ts) for m, wh, sku, qty, ts in rows))
+
+
+def downsample_deltas_day(marketplace: str, day) -> int:
+    """
+    Сворачивает историю stock_deltas маркетплейса за UTC-сутки в stock_daily.
+
+    Состояние на начало суток восстанавливается через state_at, дальше
+    применяются изменения за сутки; пара, появившаяся за сутки, имеет
+    минимум 0, исчезнувшая — закрывается нулем. Если история начинается
+    внутри суток (более ранние строки уже удалены), отсчет идет от первого
+    keyframe: повторная свертка частично удаленного дня ничего не портит.
+    Возвращает число строк сводки дня.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    end = start + timedelta(days=1)
+    known = last_keyframe_at(marketplace, start - timedelta(microseconds=1)) is not None
+    # [min, max, close, close_at] по паре (sku, склад)
+    stats = {key: [qty, qty, qty, start] for key, qty in state_at(marketplace, start - timedelta(microseconds=1)).items()}
+    rows = (
+        db.session.query(StockDelta.captured_at, StockDelta.sku, StockDelta.warehouse_name, StockDelta.quantity, StockDelta.is_keyframe)
+        .filter(StockDelta.marketplace == marketplace, StockDelta.captured_at >= start, StockDelta.captured_at < end)
+        .order_by(StockDelta.captured_at, StockDelta.id)
+    )
+    for ts, group in groupby(rows, key=lambda row: row[0]):
+        group = list(group)
+        updates = {(sku, warehouse_name): qty for _ts, sku, warehouse_name, qty, _kf in group}
+        if group[0][4]:
+            # Keyframe — полный срез: пары не из него обнулились
+            updates = {**{key: 0 for key, item in stats.items() if item[2]}, **updates}
+        for key, qty in updates.items():
+            item = stats.get(key)
+            if item is None:
+                stats[key] = [0 if known else qty, qty, qty, ts]
+            else:
+                item[0], item[1], item[2], item[3] = min(item[0], qty), max(item[1], qty), qty, ts
+        known = True
+    return _merge_daily(day, (
+        (marketplace, warehouse_name, sku, *item)
+        for (sku, warehouse_name), item in stats.items()
+    ))
+
+
+def _maintenance(vacuum: bool) -> None:
+    """ANALYZE и, при необходимости, VACUUM вне транзакции."""
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("ANALYZE")
+        if vacuum:
+            conn.exec_driver_sql("VACUUM")
+
+
+def _vacuum_due(now: datetime, interval_days: int) -> bool:
+    if interval_days <= 0:
+        return False
+    state = load_from_persistent_cache(VACUUM_STATE_KEY) or {}
+    last = state.get("at")
+    return last is None or now - datetime.fromisoformat(last) >= timedelta(days=interval_days)
+
+
+def run_retention(now: datetime | None = None, force_vacuum: bool = False) -> dict:
+    """
+    Применяет политики хранения. Вызывается в контексте приложения.
+
+    Возвращает отчет: сколько дней свернуто и сколько строк удалено
+    из каждой таблицы, выполнялись ли ANALYZE и VACUUM.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    batch_size = config["RETENTION_BATCH_SIZE"]
+    pause = config["RETENTION_BATCH_PAUSE_SECONDS"]
+    report = {"downsampled_days": 0, "daily_rows": 0, "snapshots_deleted": 0, "daily_deleted": 0, "deltas_deleted": 0, "kv_deleted": 0, "rollup_rows": 0}
+
+    _ensure_schema()
+
+    # Свертка и удаление сырых снимков — по одному дню, от самого старого
+    raw_cutoff = datetime.combine((now - timedelta(days=config["RETENTION_RAW_SNAPSHOT_DAYS"])).date(), datetime.min.time())
+    while True:
+        oldest = db.session.query(func.min(StockSnapshot.captured_at)).filter(StockSnapshot.captured_at < raw_cutoff).scalar()
+        if oldest is None:
+            break
+        day = oldest.date()
+        report["daily_rows"] += downsample_day(day)
+        day_start = datetime.combine(day, datetime.min.time())
+        report["snapshots_deleted"] += _delete_in_batches(
+            StockSnapshot,
+            (StockSnapshot.captured_at >= day_start) & (StockSnapshot.captured_at < day_start + timedelta(days=1)),
+            batch_size,
+            pause,
+        )
+        report["downsampled_days"] += 1
+
+    if config["RETENTION_DAILY_DAYS"] > 0:
+        daily_cutoff = (now - timedelta(days=config["RETENTION_DAILY_DAYS"])).date()
+        report["daily_deleted"] = _delete_in_batches(StockDaily, StockDaily.date < daily_cutoff, batch_size, pause)
+
+    history_cutoff = now - timedelta(days=config["RETENTION_STOCK_HISTORY_DAYS"])
+    for (marketplace,) in db.session.query(StockDelta.marketplace).distinct().all():
+        keyframe_at = last_keyframe_at(marketplace, history_cutoff)
+        if keyframe_at is not None:
+            # Сутки, теряющие строки, сворачиваются до удаления (от самых старых)
+            day = db.session.query(func.min(StockDelta.captured_at)).filter(StockDelta.marketplace == marketplace).scalar().date()
+            while day <= keyframe_at.date() and day < now.date():
+                report["daily_rows"] += downsample_deltas_day(marketplace, day)
+                report["downsampled_days"] += 1
+                day += timedelta(days=1)
+            report["deltas_deleted"] += _delete_in_batches(
+                StockDelta,
+                (StockDelta.marketplace == marketplace) & (StockDelta.captured_at < keyframe_at),
+                batch_size,
+                pause,
+            )
+
+    if config["RETENTION_ROLLUP_RECONCILE_DAYS"] > 0:
+        today = now.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(config["TIMEZONE"])).date()
+        report["rollup_rows"] = rebuild_rollups(
+            today - timedelta(days=config["RETENTION_ROLLUP_RECONCILE_DAYS"] - 1), today, ZoneInfo(config["TIMEZONE"])
+        )
+
+    kv_cutoff = now - timedelta(days=config["RETENTION_KV_DAYS"])
+    report["kv_deleted"] = _delete_in_batches(
+        KeyValue,
+        (KeyValue.updated_at < kv_cutoff) & ~or_(*(KeyValue.key.startswith(prefix) for prefix in KV_KEEP_PREFIXES)),
+        batch_size,
+        pause,
+    )
+
+    vacuum = force_vacuum or _vacuum_due(now, config["RETENTION_VACUUM_INTERVAL_DAYS"])
+    _maintenance(vacuum)
+    if vacuum:
+        save_to_persistent_cache(VACUUM_STATE_KEY, {"at": now.isoformat()})
+    report.update(analyzed=True, vacuumed=vacuum)
+    logging.info("Retention: %s", report)
+    return report
@@ -0,0 +1,167 @@
+"""
+Скорость заказов и запас в днях по SKU и складу (таблица stock_cover).
+
+После каждого обновления (scripts/refresh.py) индекс пересчитывается для
+маркетплейса целиком: заказы за последние STOCK_VELOCITY_DAYS суток
+суммируются одним GROUP BY по (sku, склад) в order_events, и для каждой
+пары складывается с текущим остатком:
+
+- ``velocity`` — заказов в сутки за окно;
+- ``days_of_cover`` — на сколько дней хватит остатка при такой скорости
+  (None, если заказов за окно не было).
+
+Окно не длиннее истории в order_events: сразу после запуска заказов
+меньше, чем за STOCK_VELOCITY_DAYS, и деление на полное окно занизило бы
+скорость.
+
+Строка со складом ``"*"`` — итог по SKU. У Ozon заказы привязаны к
+кластеру отправки, а остатки — к складам отчета, поэтому для Ozon
+пишутся только итоги по SKU. Дашборд и ``/api/stock-cover``
+читают готовые строки и ничего не пересчитывают; плитки берут словарь
+sku_cover из кэша, который сбрасывается после записи нового индекса.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from .. import cache
+from ..models import db, OrderEvent, StockCover
+from ..utils.sku_aliases import alias_sku
+
+
+TOTAL = "*"
+INSERT_BATCH_SIZE = 1000
+
+Cells = dict[tuple[str, str], int]
+
+
+def ordered_by_cell(marketplace: str, since: datetime) -> Cells:
+    """Заказы (без отмен) с момента ``since`` (UTC) по парам (SKU с алиасом, склад)."""
+    stmt = (
+        select(OrderEvent.sku, OrderEvent.warehouse, func.sum(OrderEvent.quantity))
+        .where(
+            OrderEvent.marketplace == marketplace,
+            OrderEvent.kind == "order",
+            OrderEvent.is_cancel.is_(False),
+            OrderEvent.occurred_at >= since,
+        )
+        .group_by(OrderEvent.sku, OrderEvent.warehouse)
+    )
+    ordered: Cells = defaultdict(int)
+    for sku, warehouse, quantity in db.session.execute(stmt):
+        ordered[(alias_sku(sku), warehouse or "Неизвестно")] += int(quantity or 0)
+    return ordered
+
+
+def covered_days(marketplace: str, now: datetime, window_days: int) -> float:
+    """Длина окна в сутках, за которое в order_events есть заказы: не больше окна и не меньше суток."""
+    first = db.session.execute(
+        select(func.min(OrderEvent.occurred_at)).where(OrderEvent.marketplace == marketplace, OrderEvent.kind == "order")
+    ).scalar()
+    if first is None:
+        return float(window_days)
+    return min(float(window_days), max(1.0, (now - first).total_seconds() / 86400))
+
+
+def cover_rows(stock: Cells, ordered: Cells, window_days: float, by_warehouse: bool = True) -> list[dict]:
+    """
+    Строки индекса по остаткам и заказам за окно: по паре (sku, склад) из
+    обоих словарей и итог по SKU (склад TOTAL); без ``by_warehouse`` — только итоги.
+    """
+    totals_stock: dict[str, int] = defaultdict(int)
+    totals_ordered: dict[str, int] = defaultdict(int)
+    cells = []
+    for key in stock.keys() | ordered.keys():
+        qty, sold = stock.get(key, 0), ordered.get(key, 0)
+        totals_stock[key[0]] += qty
+        totals_ordered[key[0]] += sold
+        if by_warehouse:
+            cells.append((key[0], key[1], qty, sold))
+    cells.extend((sku, TOTAL, qty, totals_ordered[sku]) for sku, qty in totals_stock.items())
+    return [
+        {
+            "sku": sku,
+            "warehouse_name": warehouse,
+            "quantity": qty,
+            "ordered": sold,
+            "velocity": sold / window_days,
+            "days_of_cover": qty * window_days / sold if sold else None,
+        }
+        for sku, warehouse, qty, sold in cells
+    ]
+
+
+def refresh_cover(marketplace: str, stock: Cells, now: datetime | None = None) -> int:
+    """
+    Пересчитывает индекс маркетплейса по срезу остатков {(sku, склад): остаток}.
+    Для Ozon склады заказов и остатков не сопоставимы — пишутся только итоги по SKU.
+
+    Строки пишутся в текущую сессию, транзакцию фиксирует вызывающий код.
+    Возвращает число строк индекса.
+    """
+    now = now or datetime.utcnow()
+    window_days = current_app.config.get("STOCK_VELOCITY_DAYS", 14)
+    ordered = ordered_by_cell(marketplace, now - timedelta(days=window_days))
+    rows = cover_rows(stock, ordered, covered_days(marketplace, now, window_days), by_warehouse=marketplace != "ozon")
+    db.session.execute(StockCover.__table__.delete().where(StockCover.marketplace == marketplace))
+    batch = [dict(row, marketplace=marketplace, computed_at=now) for row in rows]
+    for i in range(0, len(batch), INSERT_BATCH_SIZE):
+        db.session.execute(insert(StockCover), batch[i : i + INSERT_BATCH_SIZE])
+    return len(batch)
+
+
+def cover_cache_key(marketplace: str) -> str:
+    return f"stock_cover:{marketplace}"
+
+
+def sku_cover(marketplace: str) -> dict[str, dict[str, float | None]]:
+    """
+    Запас в днях для плиток: {sku: {склад или TOTAL: дней}}. Читается из
+    таблицы один раз после каждого пересчета, дальше — из кэша.
+    """
+    result = cache.get(cover_cache_key(marketplace))
+    if result is not None:
+        return result
+    result = defaultdict(dict)
+    stmt = select(StockCover.sku, StockCover.warehouse_name, StockCover.days_of_cover).where(StockCover.marketplace == marketplace)
+    for sku, warehouse, days in db.session.execute(stmt):
+        result[sku][warehouse] = None if days is None else round(days, 1)
+    result = dict(result)
+    cache.set(cover_cache_key(marketplace), result)
+    return result
+
+
+def query_cover(
+    marketplace: str | None = None,
+    skus: Iterable[str] | None = None,
+    max_days: float | None = None,
+    by_warehouse: bool = True,
+    limit: int = 1000,
+) -> list[dict]:
+    """Строки индекса по возрастанию запаса в днях (SKU без заказов — в конце)."""
+    stmt = select(StockCover).order_by(
+        StockCover.days_of_cover.is_(None), StockCover.days_of_cover, StockCover.marketplace, StockCover.sku, StockCover.warehouse_name
+    )
+    if marketplace:
+        stmt = stmt.where(StockCover.marketplace == marketplace)
+    if skus:
+        stmt = stmt.where(StockCover.sku.in_(list(skus)))
+    if max_days is not None:
+        stmt = stmt.where(StockCover.days_of_cover <= max_days)
+    stmt = stmt.where(StockCover.warehouse_name != TOTAL) if by_warehouse else stmt.where(StockCover.warehouse_name == TOTAL)
+    return [
+        {
+            "marketplace": row.marketplace,
+            "sku": row.sku,
+            "warehouse": row.warehouse_name,
+            "quantity": row.quantity,
+            "ordered": row.ordered,
+            "velocity": round(row.velocity, 3),
+            "days_of_cover": None if row.days_of_cover is None else round(row.days_of_cover, 1),
+            "computed_at": row.computed_at.isoformat(),
+        }
+        for row in db.session.scalars(stmt.limit(limit))
+    ]
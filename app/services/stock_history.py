@@ -0,0 +1,148 @@
+"""
+История остатков по SKU и складам с дельта-кодированием (таблица stock_deltas).
+
+Между соседними обновлениями большинство остатков не меняется, поэтому
+record_state пишет только изменившиеся пары (sku, склад). Не реже раза в
+STOCK_KEYFRAME_INTERVAL_HOURS часов пишется полный срез (keyframe). Без
+него восстановление состояния пришлось бы начинать с самого начала истории,
+а очистка старых строк была бы невозможна.
+
+Состояние — словарь {(sku, склад): остаток}; нулевые остатки в нем не хранятся.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, insert
+
+from ..models import db, StockDelta
+
+
+StockState = dict[tuple[str, str], int]
+
+
+def last_keyframe_at(marketplace: str, ts: datetime) -> datetime | None:
+    """Время последнего keyframe маркетплейса не позже ``ts``."""
+    return (
+        db.session.query(func.max(StockDelta.captured_at))
+        .filter(StockDelta.marketplace == marketplace, StockDelta.is_keyframe.is_(True), StockDelta.captured_at <= ts)
+        .scalar()
+    )
+
+
+def _apply(state: StockState, rows) -> None:
+    for sku, warehouse_name, quantity in rows:
+        if quantity:
+            state[(sku, warehouse_name)] = quantity
+        else:
+            state.pop((sku, warehouse_name), None)
+
+
+def state_at(marketplace: str, ts: datetime | None = None, sku: str | None = None) -> StockState:
+    """
+    Восстанавливает остатки маркетплейса на момент ``ts`` (UTC, по умолчанию — сейчас).
+
+    Читает ближайший предшествующий keyframe и изменения после него; с
+    ``sku`` — только строки этого SKU (по индексу marketplace, sku, captured_at).
+    """
+    ts = ts or datetime.utcnow()
+    keyframe_at = last_keyframe_at(marketplace, ts)
+    if keyframe_at is None:
+        return {}
+    columns = (StockDelta.sku, StockDelta.warehouse_name, StockDelta.quantity)
+    keyframe = db.session.query(*columns).filter(
+        StockDelta.marketplace == marketplace,
+        StockDelta.is_keyframe.is_(True),
+        StockDelta.captured_at == keyframe_at,
+    )
+    deltas = db.session.query(*columns).filter(
+        StockDelta.marketplace == marketplace,
+        StockDelta.captured_at > keyframe_at,
+        StockDelta.captured_at <= ts,
+    )
+    if sku is not None:
+        keyframe = keyframe.filter(StockDelta.sku == sku)
+        deltas = deltas.filter(StockDelta.sku == sku)
+    state: StockState = {}
+    _apply(state, keyframe)
+    _apply(state, deltas.order_by(StockDelta.captured_at, StockDelta.id))
+    return state
+
+
+def record_state(marketplace: str, state: StockState, captured_at: datetime | None = None) -> int:
+    """
+    Записывает срез остатков как изменения относительно предыдущего состояния.
+
+    Строки добавляются в текущую сессию, транзакцию фиксирует вызывающий код.
+    Возвращает количество записанных строк.
+    """
+    captured_at = captured_at or datetime.utcnow()
+    state = {key: qty for key, qty in state.items() if qty}
+    interval = timedelta(hours=current_app.config.get("STOCK_KEYFRAME_INTERVAL_HOURS", 24))
+
+    last_keyframe = last_keyframe_at(marketplace, captured_at)
+    is_keyframe = last_keyframe is None or captured_at - last_keyframe >= interval
+    previous = state_at(marketplace, captured_at) if last_keyframe is not None else {}
+    if is_keyframe:
+        changes = dict(state)
+    else:
+        changes = {key: qty for key, qty in state.items() if previous.get(key) != qty}
+    # Исчезнувшие пары пишутся нулями и в keyframe: иначе пустой срез не
+    # записался бы вовсе, и состояние строилось бы от старого keyframe
+    changes.update({key: 0 for key in previous if key not in state})
+
+    if changes:
+        db.session.execute(insert(StockDelta), [
+            {
+                "marketplace": marketplace,
+                "sku": sku,
+                "warehouse_name": warehouse_name,
+                "quantity": qty,
+                "captured_at": captured_at,
+                "is_keyframe": is_keyframe,
+            }
+            for (sku, warehouse_name), qty in changes.items()
+        ])
+    return len(changes)
+
+
+def sku_series(marketplace: str, sku: str, start: datetime, end: datetime) -> list[tuple[datetime, dict[str, int]]]:
+    """
+    Возвращает историю остатков SKU по складам: [(момент, {склад: остаток}), ...].
+
+    Первая точка — состояние на ``start``, дальше — точка на каждое изменение
+    в интервале (start, end]. Keyframe внутри интервала сбрасывает состояние
+    SKU к записанному в нем срезу.
+    """
+    current = {wh: qty for (_sku, wh), qty in state_at(marketplace, start, sku).items()}
+    series = [(start, dict(current))]
+
+    keyframe_times = {
+        ts for (ts,) in db.session.query(StockDelta.captured_at).filter(
+            StockDelta.marketplace == marketplace,
+            StockDelta.is_keyframe.is_(True),
+            StockDelta.captured_at > start,
+            StockDelta.captured_at <= end,
+        ).distinct()
+    }
+    rows = db.session.query(StockDelta.captured_at, StockDelta.warehouse_name, StockDelta.quantity).filter(
+        StockDelta.marketplace == marketplace,
+        StockDelta.sku == sku,
+        StockDelta.captured_at > start,
+        StockDelta.captured_at <= end,
+    ).order_by(StockDelta.captured_at, StockDelta.id)
+
+    changes: dict[datetime, list[tuple[str, int]]] = {ts: [] for ts in keyframe_times}
+    for ts, warehouse_name, quantity in rows:
+        changes.setdefault(ts, []).append((warehouse_name, quantity))
+
+    for ts in sorted(changes):
+        if ts in keyframe_times:
+            current = {}
+        for warehouse_name, quantity in changes[ts]:
+            if quantity:
+                current[warehouse_name] = quantity
+            else:
+                current.pop(warehouse_name, None)
+        if current != series[-1][1]:
+            series.append((ts, dict(current)))
+    return series
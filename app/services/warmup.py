@@ -0,0 +1,119 @@
+"""
+Прогрев кэша Flask-Caching при старте воркера.
+
+После деплоя или перезапуска кэш пуст, и первый посетитель ждет все запросы
+к API маркетплейсов. warm_up() кладет в кэш последние сохраненные снимки из
+kv_store под теми же ключами, что и у memoize-функций сервисов, с исходным
+``fetched_at`` и флагом ``warmed``. Затем в фоне запускается обновление
+данных из API; его выполняет только один воркер (блокировка в общем кэше).
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Iterator, NamedTuple
+from zoneinfo import ZoneInfo
+
+from flask import Flask
+
+from .. import cache
+from ..utils.cache_utils import get_timeout_to_next_half_hour
+from ..utils.persistent_cache import load_from_persistent_cache
+from . import ozon_api, wb_api
+
+
+REVALIDATE_LOCK_KEY = "warmup:revalidate"
+REVALIDATE_LOCK_TIMEOUT = 300
+
+
+class Source(NamedTuple):
+    """Memoize-функция сервиса, ее аргументы и ключ снимка в kv_store."""
+    name: str
+    account: str
+    loader: Callable
+    persistent_key: str
+    args: tuple
+    timeout: int
+
+
+def iter_sources(app: Flask, catalogs: dict[str, dict] | None = None) -> Iterator[Source]:
+    """
+    Перечисляет источники данных дашборда с теми же аргументами, что и маршрут ``/``.
+
+    Генератор ленивый: SKU аккаунта Ozon без OZON_SKUS_n читаются из каталога
+    в момент выдачи его источника остатков, поэтому при обновлении каталог,
+    идущий раньше, уже сохранен. Уже загруженные каталоги можно передать
+    в ``catalogs`` ({client_id: каталог}) — тогда kv_store не читается.
+    """
+    tz = ZoneInfo(app.config.get("TIMEZONE", "Europe/Moscow"))
+    day = datetime.now(tz).date().isoformat()
+
+    wb_token = (app.config.get("WB_API_TOKEN", "") or "").strip()
+    if wb_token:
+        yield Source("wb_stocks", "wb", wb_api.load_stocks, "wb_stocks", (wb_token,), get_timeout_to_next_half_hour())
+        yield Source("wb_today", "wb", wb_api.load_today_metrics, f"wb_today:{day}", (wb_token, tz), get_timeout_to_next_half_hour())
+
+    for client_id, api_key, skus in ozon_api._make_hashable(app.config.get("OZON_ACCOUNTS", [])):
+        yield Source("ozon_today", client_id, ozon_api.fetch_account_today, f"ozon_today:{client_id}:{day}", (client_id, api_key, tz), get_timeout_to_next_half_hour())
+        if not skus:
+            catalog_key = f"ozon_catalog:{client_id}"
+            yield Source("ozon_catalog", client_id, ozon_api.fetch_catalog, catalog_key, (client_id, api_key), app.config["OZON_CATALOG_TTL_SECONDS"])
+            catalog = (catalogs or {}).get(client_id) or load_from_persistent_cache(catalog_key) or {}
+            skus = ozon_api.skus_from_catalog(catalog)
+            if not skus:
+                continue
+        yield Source("ozon_stocks", client_id, ozon_api.fetch_account_stocks, f"ozon_stocks:{client_id}", (client_id, api_key, skus), get_timeout_to_next_half_hour())
+
+
+def cache_key(source: Source) -> str:
+    """Ключ записи источника в кэше Flask-Caching (тот же, что у memoize)."""
+    return source.loader.make_cache_key(source.loader.uncached, *source.args)
+
+
+def warm_from_snapshots(app: Flask) -> int:
+    """Кладет в кэш снимки из kv_store, если ключ еще не занят. Возвращает число прогретых записей."""
+    warmed = 0
+    with app.app_context():
+        for source in iter_sources(app):
+            snapshot = load_from_persistent_cache(source.persistent_key)
+            if not snapshot:
+                continue
+            if source.loader is not ozon_api.fetch_catalog:
+                snapshot = dict(snapshot, warmed=True)
+            if cache.add(cache_key(source), snapshot, timeout=source.timeout):
+                warmed += 1
+    logging.info("Cache warm-up: %d entries loaded from persistent cache", warmed)
+    return warmed
+
+
+def revalidate(app: Flask) -> None:
+    """
+    Обновляет все источники из API и перезаписывает их записи в кэше.
+
+    Выполняется не более чем одним воркером одновременно. Если источник не
+    загрузился, прогретая запись удаляется: дальше работает обычный путь
+    load_with_fallback с пометкой ``stale`` и повторными попытками.
+    """
+    with app.app_context():
+        if not cache.add(REVALIDATE_LOCK_KEY, True, timeout=REVALIDATE_LOCK_TIMEOUT):
+            return
+        try:
+            for source in iter_sources(app):
+                key = cache_key(source)
+                try:
+                    cache.set(key, source.loader.uncached(*source.args), timeout=source.timeout)
+                except Exception as exc:
+                    logging.warning("Revalidation of %s failed: %s", source.persistent_key, exc)
+                    cached = cache.get(key)
+                    if isinstance(cached, dict) and cached.get("warmed"):
+                        cache.delete(key)
+        finally:
+            cache.delete(REVALIDATE_LOCK_KEY)
+
+
+def warm_up(app: Flask) -> None:
+    """Прогревает кэш снимками и запускает фоновое обновление из API."""
+    try:
+        warm_from_snapshots(app)
+    except Exception:
+        logging.exception("Cache warm-up failed")
+    threading.Thread(target=revalidate, args=(app,), name="cache-revalidate", daemon=True).start()
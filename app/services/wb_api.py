@@ -1,107 +1,120 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from collections import defaultdict
-import logging
-import requests
-import json
-from pydantic import ValidationError
+from flask import current_app
 
 from .. import cache
+from ..utils import metrics
+from .http_client import call
+from .event_store import record_events, wb_rows
 from ..utils.sku_aliases import alias_sku, sort_pairs_by_alias
-from ..utils.cache_utils import get_timeout_to_next_half_hour
-from ..models import db
-from ..models import KeyValue
+from ..utils.compact import EventSummaryBuilder, StockTableBuilder
+from ..utils.cache_utils import fetch_lock, get_timeout_to_next_half_hour
+from ..utils.persistent_cache import save_to_persistent_cache as _save_to_persistent_cache, load_with_fallback
 from ..schemas import WBStockItem, WBOrderItem, WBSaleItem
 
 
 WB_STATS_BASE = "https://statistics-api.wildberries.ru"
 
 
+def _base_url() -> str:
+    """Базовый URL API статистики; переопределяется WB_STATS_BASE в конфигурации."""
+    return current_app.config.get("WB_STATS_BASE") or WB_STATS_BASE
+
+
 def _headers(token: str) -> dict:
     return {"Authorization": token}
 
 
+def aggregate_stocks(validated_items: list[WBStockItem]) -> dict:
+    """
+    Агрегирует провалидированные строки остатков по складам и SKU.
+
+    Детализация по SKU, складам и товарам в пути хранится в компактной
+    таблице ``stock_table`` (см. app/utils/compact.py).
+    """
+    table = StockTableBuilder()
+    total = 0
+    total_in_transit = 0
+    for it in validated_items:
+        total += it.quantity
+        total_in_transit += it.in_way_to_client
+        table.add(
+            alias_sku(str(it.supplier_article)),
+            it.warehouse_name or "Неизвестно",
+            it.quantity,
+            it.in_way_to_client,
+            it.in_way_from_client,
+        )
+    return {
+        "total": total,
+        "total_in_transit": total_in_transit,
+        "stock_table": table.build(),
+    }
+
+
 @cache.memoize(timeout=get_timeout_to_next_half_hour())
-def fetch_stocks(token: str) -> dict:
+@fetch_lock
+@metrics.counts_cache_misses
+def load_stocks(token: str) -> dict:
     """
     Загружает и агрегирует данные об остатках на складах Wildberries.
 
     Возвращает словарь с общей суммой остатков, детализацией по складам,
     по SKU, а также информацией о товарах в пути к/от клиента.
-    В случае ошибки API пытается загрузить данные из персистентного кэша.
+    При ошибке API выбрасывает исключение (оно не кэшируется).
     """
     day_key = f"wb_stocks"
-    try:
-        # Запрашиваем данные за длительный период, чтобы получить все активные SKU
-        date_from = (datetime.utcnow() - timedelta(days=365)).strftime("%Y-%m-%d")
-        url = f"{WB_STATS_BASE}/api/v1/supplier/stocks"
-        resp = requests.get(url, headers=_headers(token), params={"dateFrom": date_from}, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-        
-        # Валидация
+    # Запрашиваем данные за длительный период, чтобы получить все активные SKU
+    date_from = (datetime.utcnow() - timedelta(days=365)).strftime("%Y-%m-%d")
+    url = f"{_base_url()}/api/v1/supplier/stocks"
+    resp = call("wb:stocks", "get", url, headers=_headers(token), params={"dateFrom": date_from}, timeout=30)
+    resp.raise_for_status()
+    data = resp.json()
+    
+    # Валидация
+    with metrics.observe_validation("wb:stocks") as probe:
         validated_items = [WBStockItem.model_validate(item) for item in data]
+        probe.rows = len(validated_items)
+
+    result = dict(aggregate_stocks(validated_items), fetched_at=datetime.now(ZoneInfo("UTC")).isoformat())
+    _save_to_persistent_cache(day_key, result)
+    return result
 
-        by_warehouse: dict[str, int] = defaultdict(int)
-        by_sku: dict[str, int] = defaultdict(int)
-        by_sku_in_way_to: dict[str, int] = defaultdict(int)
-        by_sku_in_way_from: dict[str, int] = defaultdict(int)
-        by_sku_warehouses: dict[str, dict[str, int]] = {}
-        total = 0
-        total_in_transit = 0
-        for it in validated_items:
-            qty = it.quantity
-            in_way_to = it.in_way_to_client
-            in_way_from = it.in_way_from_client
-            wh_name = it.warehouse_name or "Неизвестно"
-            by_warehouse[wh_name] += qty
-            total += qty
-            total_in_transit += in_way_to
-            sku_key = alias_sku(str(it.supplier_article))
-            by_sku[sku_key] += qty
-            by_sku_in_way_to[sku_key] += in_way_to
-            by_sku_in_way_from[sku_key] += in_way_from
-            sku_wh = by_sku_warehouses.setdefault(sku_key, defaultdict(int))
-            sku_wh[wh_name] += qty
-
-        warehouses = sorted(by_warehouse.items(), key=lambda x: x[0])
-        skus = sort_pairs_by_alias(list(by_sku.items()))
-        sku_details: dict[str, list[tuple[str, int]]] = {}
-        for sku_name, wh_map in by_sku_warehouses.items():
-            pairs = [(w, q) for w, q in wh_map.items() if q > 0]
-            pairs.sort(key=lambda x: (-x[1], x[0]))
-            sku_details[sku_name] = pairs
-        result = {
-            "total": total,
-            "warehouses": warehouses,
-            "skus": skus,
-            "sku_details": sku_details,
-            "total_in_transit": total_in_transit,
-            "sku_in_way": {
-                "to_client": dict(by_sku_in_way_to),
-                "from_client": dict(by_sku_in_way_from),
-            },
-        }
-        _save_to_persistent_cache(day_key, result)
-        return result
-    except (ValidationError, Exception) as exc:
-        logging.exception("WB fetch_stocks failed: %s", exc)
-        cached = _load_from_persistent_cache(day_key)
-        if cached:
-            return cached
-        raise
-
-
-def _fetch_and_deduplicate_items(url: str, token: str, date_from: str, tz: ZoneInfo, item_key: str, date_field: str, id_field: str, pydantic_model) -> list[dict]:
-    """Запрашивает данные (заказы/продажи), фильтрует по дате и убирает дубликаты."""
-    resp = requests.get(url, headers=_headers(token), params={"dateFrom": date_from}, timeout=30)
+
+def fetch_stocks(token: str) -> dict:
+    """
+    Возвращает остатки Wildberries (см. load_stocks).
+
+    В случае ошибки API или разомкнутого circuit breaker сразу отдает
+    данные из персистентного кэша с пометкой ``stale``.
+    """
+    return load_with_fallback(load_stocks, "wb_stocks", token)
+
+
+def _fetch_and_deduplicate_items(endpoint: str, url: str, token: str, date_from: str, tz: ZoneInfo, item_key: str, date_field: str, id_field: str, pydantic_model, kind: str) -> list[dict]:
+    """
+    Запрашивает данные (заказы/продажи), фильтрует по дате и убирает дубликаты.
+
+    Все полученные строки, включая отмененные и вчерашние, сохраняются в
+    хранилище событий как ``kind`` (см. event_store).
+    """
+    resp = call(endpoint, "get", url, headers=_headers(token), params={"dateFrom": date_from}, timeout=30)
     resp.raise_for_status()
     data = resp.json()
     items_raw = data if isinstance(data, list) else data.get(item_key, [])
     
     # Валидация
-    validated_items = [pydantic_model.model_validate(item) for item in items_raw]
+    with metrics.observe_validation(endpoint) as probe:
+        validated_items = [pydantic_model.model_validate(item) for item in items_raw]
+        probe.rows = len(validated_items)
+
+    record_events(wb_rows(kind, validated_items, tz))
+    return deduplicate_items(validated_items, tz, id_field)
 
+
+def deduplicate_items(validated_items: list, tz: ZoneInfo, id_field: str) -> list[dict]:
+    """Оставляет сегодняшние неотмененные записи без дубликатов по ``id_field``."""
     seen_ids: set[str] = set()
     dedup_items: list[dict] = []
     today_start_local = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
@@ -124,113 +137,82 @@ def _fetch_and_deduplicate_items(url: str, token: str, date_from: str, tz: ZoneI
     return dedup_items
 
 
+def aggregate_today(dedup_orders: list[dict], dedup_sales: list[dict], tz: ZoneInfo) -> dict:
+    """
+    Считает заказы и продажи за сегодня с детализацией по SKU.
+
+    Детализация хранится в сводках событий ограниченного размера
+    ``ordered_events`` и ``purchased_events`` (см. app/utils/compact.py).
+    """
+    ordered_events = EventSummaryBuilder()
+    for it in dedup_orders:
+        ordered_events.add(
+            alias_sku(str(it.get("supplier_article"))),
+            datetime.fromisoformat(it.get("date")).astimezone(tz),
+            it.get("oblast_okrug_name", "Неизвестно"),
+            it.get("warehouse_name", "Неизвестно"),
+        )
+
+    purchased_events = EventSummaryBuilder()
+    purchased_sku_counts: dict[str, int] = defaultdict(int)
+    for it in dedup_sales:
+        sku_key = alias_sku(str(it.get("supplier_article")))
+        purchased_events.add(
+            sku_key,
+            datetime.fromisoformat(it.get("date")).astimezone(tz),
+            it.get("oblast_okrug_name", "Неизвестно"),
+            it.get("warehouse_name", "Неизвестно"),
+        )
+        purchased_sku_counts[sku_key] += 1
+
+    return {
+        "ordered": len(dedup_orders),
+        "purchased": len(dedup_sales),
+        "ordered_events": ordered_events.build(),
+        "purchased_events": purchased_events.build(),
+        "purchased_skus": sort_pairs_by_alias(list(purchased_sku_counts.items())),
+    }
+
+
 @cache.memoize(timeout=get_timeout_to_next_half_hour())
-def fetch_today_metrics(token: str, tz: ZoneInfo) -> dict:
+@fetch_lock
+@metrics.counts_cache_misses
+def load_today_metrics(token: str, tz: ZoneInfo) -> dict:
     """
     Загружает и агрегирует данные о заказах и продажах за сегодняшний день по московскому времени.
 
     Возвращает словарь с количеством заказов и продаж, а также с детализацией
     по каждому SKU для отображения в интерактивных списках.
-    В случае ошибки API пытается загрузить данные из персистентного кэша.
+    При ошибке API выбрасывает исключение (оно не кэшируется).
     """
     day_key = f"wb_today:{datetime.now(tz).date().isoformat()}"
-    try:
-        # Запрашиваем данные с начала вчерашнего дня, чтобы гарантированно
-        # захватить все события, произошедшие сегодня по UTC.
-        start_utc = datetime.now(ZoneInfo("UTC")).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
-        date_from = start_utc.strftime("%Y-%m-%d")
-
-        # Orders
-        orders_url = f"{WB_STATS_BASE}/api/v1/supplier/orders"
-        dedup_orders = _fetch_and_deduplicate_items(orders_url, token, date_from, tz, "orders", "date", "srid", WBOrderItem)
-        ordered_count = len(dedup_orders)
-
-        ordered_skus_details: dict[str, list] = defaultdict(list)
-        for it in dedup_orders:
-            sku_key = alias_sku(str(it.get("supplier_article")))
-            order_date_utc = datetime.fromisoformat(it.get("date"))
-            order_date_local = order_date_utc.astimezone(tz)
-            
-            details = {
-                "time": order_date_local.strftime('%H:%M'),
-                "city": it.get("oblast_okrug_name", "Неизвестно"),
-                "warehouse": it.get("warehouse_name", "Неизвестно"),
-            }
-            ordered_skus_details[sku_key].append(details)
-        
-        # Сортируем заказы внутри каждого SKU по времени
-        for sku in ordered_skus_details:
-            ordered_skus_details[sku].sort(key=lambda x: x['time'])
-
-        # Sales
-        sales_url = f"{WB_STATS_BASE}/api/v1/supplier/sales"
-        dedup_sales = _fetch_and_deduplicate_items(sales_url, token, date_from, tz, "sales", "date", "srid", WBSaleItem)
-        purchased_count = len(dedup_sales)
-
-        purchased_skus_details: dict[str, list] = defaultdict(list)
-        for it in dedup_sales:
-            sku_key = alias_sku(str(it.get("supplier_article")))
-            sale_date_utc = datetime.fromisoformat(it.get("date"))
-            sale_date_local = sale_date_utc.astimezone(tz)
-            
-            details = {
-                "time": sale_date_local.strftime('%H:%M'),
-                "city": it.get("oblast_okrug_name", "Неизвестно"),
-                "warehouse": it.get("warehouse_name", "Неизвестно"),
-            }
-            purchased_skus_details[sku_key].append(details)
-
-        # Сортируем продажи внутри каждого SKU по времени
-        for sku in purchased_skus_details:
-            purchased_skus_details[sku].sort(key=lambda x: x['time'])
-
-        purchased_sku_counts: dict[str, int] = defaultdict(int)
-        for it in dedup_sales:
-            sku_key = alias_sku(str(it.get("supplier_article")))
-            purchased_sku_counts[sku_key] += 1
-        purchased_skus = sort_pairs_by_alias(list(purchased_sku_counts.items()))
-
-        result = {
-            "ordered": ordered_count,
-            "purchased": purchased_count,
-            "ordered_skus_details": ordered_skus_details,
-            "purchased_skus_details": purchased_skus_details,
-            "purchased_skus": purchased_skus,
-        }
-        _save_to_persistent_cache(day_key, result)
-        return result
-    except (ValidationError, Exception) as exc:
-        logging.exception("WB fetch_today_metrics failed: %s", exc)
-        cached = _load_from_persistent_cache(day_key)
-        if cached:
-            return cached
-        raise
-
-
-def _save_to_persistent_cache(key: str, data: dict):
-    """Сохраняет данные в резервный кэш в БД."""
-    try:
-        row = KeyValue.query.filter_by(key=key).first()
-        if not row:
-            row = KeyValue(key=key)
-        row.value_json = json.dumps(data, ensure_ascii=False)
-        row.updated_at = datetime.utcnow()
-        db.session.add(row)
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        logging.exception("Failed to save to persistent cache")
-
-
-def _load_from_persistent_cache(key: str) -> dict | None:
-    """Загружает данные из резервного кэша в БД."""
-    try:
-        row = KeyValue.query.filter_by(key=key).first()
-        if row and row.value_json:
-            logging.warning("Returning data from persistent cache for key %s", key)
-            return json.loads(row.value_json)
-    except Exception:
-        logging.exception("Failed to load from persistent cache")
-    return None
+    # Запрашиваем данные с начала вчерашнего дня, чтобы гарантированно
+    # захватить все события, произошедшие сегодня по UTC.
+    start_utc = datetime.now(ZoneInfo("UTC")).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+    date_from = start_utc.strftime("%Y-%m-%d")
+
+    # Orders
+    orders_url = f"{_base_url()}/api/v1/supplier/orders"
+    dedup_orders = _fetch_and_deduplicate_items("wb:orders", orders_url, token, date_from, tz, "orders", "date", "srid", WBOrderItem, "order")
+
+    # Sales
+    sales_url = f"{_base_url()}/api/v1/supplier/sales"
+    dedup_sales = _fetch_and_deduplicate_items("wb:sales", sales_url, token, date_from, tz, "sales", "date", "srid", WBSaleItem, "sale")
+
+    result = dict(
+        aggregate_today(dedup_orders, dedup_sales, tz),
+        fetched_at=datetime.now(ZoneInfo("UTC")).isoformat(),
+    )
+    _save_to_persistent_cache(day_key, result)
+    return result
 
 
+def fetch_today_metrics(token: str, tz: ZoneInfo) -> dict:
+    """
+    Возвращает заказы и продажи Wildberries за сегодня (см. load_today_metrics).
+
+    В случае ошибки API или разомкнутого circuit breaker сразу отдает
+    данные из персистентного кэша с пометкой ``stale``.
+    """
+    day_key = f"wb_today:{datetime.now(tz).date().isoformat()}"
+    return load_with_fallback(load_today_metrics, day_key, token, tz)
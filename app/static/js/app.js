@@ -15,53 +15,47 @@ document.addEventListener('DOMContentLoaded', function () {
     })
   }
 
-  // Mini charts for WB and Ozon (last 14 days)
-  async function drawDailyChart(canvasId, mp) {
-    const el = document.getElementById(canvasId)
-    if (!el || !window.Chart) return
-    try {
-      const resp = await fetch(`/api/metrics/daily?mp=${encodeURIComponent(mp)}`)
-      if (!resp.ok) return
-      const data = await resp.json()
-      const labels = data.map(d => d.date.slice(5))
-      const ordered = data.map(d => d.ordered)
-      const purchased = data.map(d => d.purchased)
-      const ctx = el.getContext('2d')
-      new Chart(ctx, {
-        type: 'line',
-        data: {
-          labels,
-          datasets: [
-            {
-              label: 'Заказано',
-              data: ordered,
-              borderColor: '#0d6efd',
-              backgroundColor: 'rgba(13,110,253,0.1)',
-              tension: 0.3,
-              pointRadius: 2,
-            },
-            {
-              label: 'Выкуплено',
-              data: purchased,
-              borderColor: '#198754',
-              backgroundColor: 'rgba(25,135,84,0.1)',
-              tension: 0.3,
-              pointRadius: 2,
-            }
-          ]
-        },
-        options: {
-          responsive: true,
-          maintainAspectRatio: false,
-          plugins: { legend: { display: true, position: 'bottom' } },
-          scales: { x: { display: true }, y: { display: true, beginAtZero: true } }
-        }
-      })
-    } catch (e) {}
-  }
+  // Intraday order curves: today vs the same time yesterday and a week ago
+  document.querySelectorAll('.intraday-chart').forEach(function (el) {
+    fetch('/api/intraday?marketplace=' + encodeURIComponent(el.dataset.marketplace))
+      .then(function (resp) { return resp.ok ? resp.json() : null })
+      .then(function (data) { if (data) drawIntradayChart(el, data) })
+      .catch(function () {})
+  })
 
-  drawDailyChart('wbDailyChart', 'wb')
-  drawDailyChart('ozonDailyChart', 'ozon')
+  // Notice about fresh data from the shared cache (SSE; the banner is rendered only with the Redis cache)
+  const updatesBanner = document.getElementById('updatesBanner')
+  if (updatesBanner && window.EventSource) {
+    let timer = null
+    const source = new EventSource('/api/updates')
+    source.addEventListener('update', function () {
+      // Refresh writes several sources in a row: show the notice once
+      clearTimeout(timer)
+      timer = setTimeout(function () { updatesBanner.classList.remove('d-none') }, 2000)
+    })
+  }
 })
 
-
+function drawIntradayChart (el, data) {
+  const width = 300
+  const height = 90
+  const series = [
+    { values: data.last_week, stroke: '#adb5bd', dash: '4 3' },
+    { values: data.yesterday, stroke: '#6c757d', dash: '' },
+    { values: data.today, stroke: '#2780e3', dash: '' }
+  ]
+  const max = Math.max(1, ...series.flatMap(function (s) { return s.values.filter(function (v) { return v !== null }) }))
+  const x = function (hour) { return (hour / 23) * (width - 4) + 2 }
+  const y = function (value) { return height - 2 - (value / max) * (height - 4) }
+  const lines = series.map(function (s) {
+    const points = s.values
+      .map(function (v, hour) { return v === null ? null : x(hour).toFixed(1) + ',' + y(v).toFixed(1) })
+      .filter(Boolean)
+      .join(' ')
+    return '<polyline fill="none" stroke-width="2" stroke="' + s.stroke + '" stroke-dasharray="' + s.dash + '" points="' + points + '"/>'
+  })
+  const now = data.today.filter(function (v) { return v !== null })
+  const hour = now.length - 1
+  const title = hour >= 0 ? 'к ' + hour + ':59 — ' + now[hour] + ', вчера — ' + data.yesterday[hour] + ', неделю назад — ' + data.last_week[hour] : ''
+  el.innerHTML = '<svg viewBox="0 0 ' + width + ' ' + height + '" width="100%" height="' + height + '" role="img"><title>' + title + '</title>' + lines.join('') + '</svg>'
+}
@@ -0,0 +1,94 @@
+"""
+Статические файлы с хэшем содержимого в имени (``/assets/app.3f2a9c1d0b7e.js``).
+
+При старте воркера для каждого файла из ``app/static`` считается хэш
+содержимого. Шаблоны получают адрес через ``asset_url("js/app.js")``, а
+маршрут ``/assets/<имя>`` отдает файл с ``Cache-Control: immutable`` на
+ASSETS_MAX_AGE секунд: после деплоя изменившийся файл получает новое имя,
+неизменившиеся браузер берет из своего кэша без запроса.
+
+Сторонние CSS/JS лежат в ``app/static/vendor`` и скачиваются
+``scripts/vendor_assets.py`` (список — VENDOR). Если файла еще нет,
+asset_url отдает адрес CDN, чтобы страница не осталась без стилей.
+"""
+import hashlib
+import logging
+import os
+
+from flask import Blueprint, Flask, abort, send_from_directory, url_for
+
+
+# Файл в app/static -> исходный адрес (версии зафиксированы)
+VENDOR = {
+    "vendor/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootswatch@5.3.3/dist/cosmo/bootstrap.min.css",
+    "vendor/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
+}
+
+
+def fingerprint(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def hashed_name(name: str, digest: str) -> str:
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+class AssetManifest:
+    """Соответствие файлов ``static`` и их имен с хэшем."""
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+        self.urls: dict[str, str] = {}
+        self.files: dict[str, str] = {}
+        self._warned: set[str] = set()
+        self.refresh()
+
+    def refresh(self) -> None:
+        urls, files = {}, {}
+        for root, _dirs, names in os.walk(self.static_folder):
+            for name in names:
+                path = os.path.join(root, name)
+                logical = os.path.relpath(path, self.static_folder).replace(os.sep, "/")
+                hashed = hashed_name(logical, fingerprint(path))
+                urls[logical] = hashed
+                files[hashed] = logical
+        self.urls, self.files = urls, files
+
+    def url(self, logical: str) -> str:
+        hashed = self.urls.get(logical)
+        if hashed:
+            return url_for("assets.asset", name=hashed)
+        if logical in VENDOR:
+            if logical not in self._warned:
+                self._warned.add(logical)
+                logging.warning("Vendored asset %s is missing, using CDN (run scripts/vendor_assets.py)", logical)
+            return VENDOR[logical]
+        return url_for("static", filename=logical)
+
+
+def init_assets(app: Flask) -> None:
+    """Регистрирует маршрут /assets и функцию шаблонов ``asset_url``."""
+    manifest = AssetManifest(app.static_folder)
+    max_age = app.config.get("ASSETS_MAX_AGE", 31536000)
+    bp = Blueprint("assets", __name__)
+
+    @bp.route("/assets/<path:name>")
+    def asset(name: str):
+        logical = manifest.files.get(name)
+        if logical is None:
+            abort(404)
+        resp = send_from_directory(app.static_folder, logical, max_age=max_age, etag=False)
+        resp.headers["Cache-Control"] = f"public, max-age={max_age}, immutable"
+        return resp
+
+    def asset_url(logical: str) -> str:
+        # В режиме отладки файлы правятся на ходу — хэши пересчитываются
+        if app.debug:
+            manifest.refresh()
+        return manifest.url(logical)
+
+    app.register_blueprint(bp)
+    app.add_template_global(asset_url)
+    app.extensions["assets"] = manifest
@@ -0,0 +1,18 @@
+import hmac
+
+from flask import current_app, request
+
+
+def is_admin_request() -> bool:
+    """
+    Проверяет, что запрос сделан администратором.
+
+    Токен передается в заголовке ``X-Admin-Token`` или параметре
+    ``admin_token`` и сравнивается с ADMIN_TOKEN из конфигурации.
+    Если ADMIN_TOKEN не задан, администраторов нет.
+    """
+    expected = current_app.config.get("ADMIN_TOKEN", "")
+    if not expected:
+        return False
+    provided = request.headers.get("X-Admin-Token") or request.args.get("admin_token") or ""
+    return hmac.compare_digest(provided.encode(), expected.encode())
@@ -1,6 +1,15 @@
+import functools
+import hashlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
+from flask import current_app
+
 def get_timeout_to_next_half_hour(*args, **kwargs):
     """
     Вычисляет количество секунд до следующего полного или получасового часа.
@@ -20,3 +29,74 @@ def get_timeout_to_next_half_hour(*args, **kwargs):
     timeout = (next_run - now).total_seconds()
     # Возвращаем 0, если таймаут отрицательный (на всякий случай)
     return max(0, int(timeout))
+
+
+class FetchInProgressError(Exception):
+    """Источник уже загружает другой процесс, а вызывающий готов отдать резервные данные."""
+
+
+_prefer_stale: ContextVar[bool] = ContextVar("prefer_stale", default=False)
+
+
+@contextmanager
+def prefer_stale():
+    """
+    Внутри блока fetch_lock не ждет чужую загрузку, а сразу выбрасывает
+    FetchInProgressError, чтобы вызывающий отдал данные из резервного кэша.
+    """
+    token = _prefer_stale.set(True)
+    try:
+        yield
+    finally:
+        _prefer_stale.reset(token)
+
+
+def fetch_lock(f):
+    """
+    Распределенная блокировка загрузки: при промахе кэша тело функции
+    выполняет только один процесс (на любом узле), остальные ждут его
+    результат в общем кэше.
+
+    Ставится под ``@cache.memoize``: блокировка — запись ``cache.add``
+    (в Redis — SET NX) с таймаутом FETCH_LOCK_TIMEOUT_SECONDS. Дождавшись
+    снятия блокировки, процесс берет значение по ключу memoize; если его
+    нет (загрузка не удалась) или ожидание дольше FETCH_LOCK_WAIT_SECONDS,
+    загружает сам. Внутри prefer_stale() вместо ожидания выбрасывается
+    FetchInProgressError. Загрузка без блокировки — ``wrapper.unlocked``.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        from .. import cache
+
+        config = current_app.config
+        digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+        lock_key = f"fetch_lock:{f.__module__}.{f.__qualname__}:{digest}"
+        memoized = getattr(sys.modules[f.__module__], f.__name__, None)
+        if memoized is None or not hasattr(memoized, "make_cache_key"):
+            memoized = None
+        if cache.add(lock_key, os.getpid(), timeout=config.get("FETCH_LOCK_TIMEOUT_SECONDS", 120)):
+            # Вложенные загрузчики владельца блокировки ждут как обычно
+            token = _prefer_stale.set(False)
+            try:
+                value = f(*args, **kwargs)
+                # memoize запишет значение только после снятия блокировки:
+                # ждущие процессы должны найти его сразу, а не загружать заново
+                if memoized is not None:
+                    cache.set(memoized.make_cache_key(memoized.uncached, *args, **kwargs), value, timeout=memoized.cache_timeout)
+                return value
+            finally:
+                _prefer_stale.reset(token)
+                cache.delete(lock_key)
+        if _prefer_stale.get():
+            raise FetchInProgressError(f"{f.__qualname__} is being loaded by another process")
+
+        deadline = time.monotonic() + config.get("FETCH_LOCK_WAIT_SECONDS", 60)
+        while cache.has(lock_key) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if memoized is not None:
+            value = cache.get(memoized.make_cache_key(memoized.uncached, *args, **kwargs))
+            if value is not None:
+                return value
+        return f(*args, **kwargs)
+    wrapper.unlocked = f
+    return wrapper
@@ -0,0 +1,126 @@
+"""
+Circuit breaker для эндпоинтов маркетплейсов.
+
+После ``failure_threshold`` ошибок подряд (включая таймауты) автомат
+размыкается, и запросы к эндпоинту сразу завершаются ошибкой
+CircuitOpenError — сервисы при этом отдают last-known-good данные из
+резервного кэша, не дожидаясь таймаута. По истечении паузы автомат
+переходит в полуоткрытое состояние и пропускает один пробный запрос;
+пауза растет экспоненциально до ``backoff_max`` секунд.
+
+Состояние хранится в памяти процесса: каждый воркер Gunicorn ведет свои
+автоматы.
+"""
+import threading
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_settings = {
+    "failure_threshold": 3,
+    "backoff_base": 30.0,
+    "backoff_max": 600.0,
+}
+
+_breakers: dict[str, "CircuitBreaker"] = {}
+_registry_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Запрос не выполнен, так как автомат эндпоинта разомкнут."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, backoff_base: float, backoff_max: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_count = 0
+        self.next_probe_at = 0.0
+        self.last_error: str | None = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Решает, можно ли выполнить запрос к эндпоинту прямо сейчас."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self.next_probe_at:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_count = 0
+            self.last_error = None
+            self._probe_in_flight = False
+
+    def record_failure(self, error: str | None = None) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_count += 1
+                backoff = min(self.backoff_base * 2 ** (self.opened_count - 1), self.backoff_max)
+                self.state = OPEN
+                self.next_probe_at = time.monotonic() + backoff
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            retry_in = max(0, int(self.next_probe_at - time.monotonic())) if self.state == OPEN else 0
+            return {
+                "name": self.name,
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": retry_in,
+                "last_error": self.last_error,
+            }
+
+
+def configure(failure_threshold: int, backoff_base: float, backoff_max: float) -> None:
+    """Задает параметры для всех автоматов (вызывается из create_app)."""
+    _settings.update(
+        failure_threshold=failure_threshold,
+        backoff_base=backoff_base,
+        backoff_max=backoff_max,
+    )
+    with _registry_lock:
+        for breaker in _breakers.values():
+            breaker.failure_threshold = failure_threshold
+            breaker.backoff_base = backoff_base
+            breaker.backoff_max = backoff_max
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, **_settings)
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_states() -> list[dict]:
+    """Возвращает состояние всех автоматов, отсортированное по имени."""
+    with _registry_lock:
+        breakers = sorted(_breakers.values(), key=lambda b: b.name)
+    return [b.snapshot() for b in breakers]
+
+
+def reset_breakers() -> None:
+    with _registry_lock:
+        _breakers.clear()
@@ -0,0 +1,337 @@
+"""
+Компактное представление агрегатов, которые кладутся в кэш.
+
+Детализация заказов и остатков хранится не в словарях со строковыми ключами,
+а в кортежах чисел. Повторяющиеся строки (склады, города) хранятся один раз
+в списке ``strings``, а записи ссылаются на них по индексу. В pickle и в
+памяти воркера это занимает в разы меньше места. В резервном кэше (json)
+кортежи превращаются в списки, поэтому представления принимают оба варианта.
+
+Сводка событий (заказы, продажи) — ограниченного размера при любом числе заказов:
+    {"strings": [...], "summaries": {sku: (число событий, (24 счетчика по часам),
+      top-K городов ((город, количество, ошибка), ...), top-K складов (...),
+      последние события ((минута суток, город, склад), ...) от новых к старым)}}
+Таблица остатков:
+    {"strings": [...], "skus": (sku, ...),
+     "rows": ((остаток, в пути к клиенту, от клиента, ((склад, остаток), ...)), ...)}
+
+Презентер и шаблон работают через EventSummaryView и StockView. Они отдают
+сводки по SKU (события с полями time/city/warehouse), пары (sku, количество)
+и словари по SKU.
+"""
+import heapq
+from collections import defaultdict
+from collections.abc import Mapping
+from datetime import datetime
+from typing import NamedTuple
+
+from .sku_aliases import sort_pairs_by_alias
+
+
+# Размер сводки событий на SKU: городов и складов в top-K, последних событий
+SUMMARY_TOP_K = 5
+SUMMARY_LATEST = 20
+# Счетчиков Space-Saving на каждое место в top-K: запас снижает ошибку оценки
+SPACE_SAVING_SLACK = 4
+
+
+class StringPool:
+    """Словарь строк: каждая уникальная строка хранится один раз."""
+
+    __slots__ = ("strings", "_index")
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._index: dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+class Event(NamedTuple):
+    """Событие (заказ или продажа) в виде, который ждет шаблон."""
+    time: str
+    city: str
+    warehouse: str
+
+
+class SpaceSaving:
+    """
+    Приближенный top-K частых значений (алгоритм Space-Saving) в памяти O(k).
+
+    Хранится не больше ``k`` счетчиков. Новое значение при заполненной
+    таблице вытесняет значение с минимальным счетчиком и наследует его
+    счетчик как ошибку: оценка ``count`` завышена не более чем на ``error``,
+    а любое значение с частотой больше n/k гарантированно остается в таблице.
+    """
+
+    __slots__ = ("k", "_counts")
+
+    def __init__(self, k: int):
+        self.k = k
+        # значение -> [оценка количества, ошибка]
+        self._counts: dict[str, list[int]] = {}
+
+    def add(self, item: str, count: int = 1, error: int = 0) -> None:
+        entry = self._counts.get(item)
+        if entry is not None:
+            entry[0] += count
+            entry[1] += error
+        elif len(self._counts) < self.k:
+            self._counts[item] = [count, error]
+        else:
+            victim = min(self._counts, key=lambda key: self._counts[key][0])
+            floor = self._counts.pop(victim)[0]
+            self._counts[item] = [floor + count, floor + error]
+
+    def top(self) -> list[tuple[str, int, int]]:
+        """Тройки (значение, оценка количества, ошибка) по убыванию количества."""
+        return sorted(((item, c, e) for item, (c, e) in self._counts.items()), key=lambda t: (-t[1], t[0]))
+
+
+class _SkuSummary:
+    __slots__ = ("count", "hours", "cities", "warehouses", "latest", "seq")
+
+    def __init__(self, top_k: int):
+        self.count = 0
+        self.hours = [0] * 24
+        self.cities = SpaceSaving(top_k * SPACE_SAVING_SLACK)
+        self.warehouses = SpaceSaving(top_k * SPACE_SAVING_SLACK)
+        # Куча из (минута суток, порядковый номер, город, склад) — последние события
+        self.latest: list[tuple[int, int, str, str]] = []
+        self.seq = 0
+
+
+class EventSummaryBuilder:
+    """
+    Собирает сводку событий по SKU с ограниченной памятью.
+
+    Вместо списка всех событий на SKU хранятся: число событий, гистограмма
+    по часам, top-K городов и складов (SpaceSaving) и ``latest`` последних
+    событий. Размер сводки не зависит от числа заказов за день.
+    """
+
+    __slots__ = ("top_k", "latest", "_by_sku")
+
+    def __init__(self, top_k: int = SUMMARY_TOP_K, latest: int = SUMMARY_LATEST):
+        self.top_k = top_k
+        self.latest = latest
+        self._by_sku: dict[str, _SkuSummary] = {}
+
+    def _entry(self, sku: str) -> _SkuSummary:
+        entry = self._by_sku.get(sku)
+        if entry is None:
+            entry = self._by_sku[sku] = _SkuSummary(self.top_k)
+        return entry
+
+    def _push_latest(self, entry: _SkuSummary, minute: int, city: str, warehouse: str) -> None:
+        entry.seq += 1
+        item = (minute, entry.seq, city, warehouse)
+        if len(entry.latest) < self.latest:
+            heapq.heappush(entry.latest, item)
+        elif item > entry.latest[0]:
+            heapq.heapreplace(entry.latest, item)
+
+    def _add(self, sku: str, minute: int, city: str, warehouse: str) -> None:
+        entry = self._entry(sku)
+        entry.count += 1
+        entry.hours[minute // 60] += 1
+        entry.cities.add(city)
+        entry.warehouses.add(warehouse)
+        self._push_latest(entry, minute, city, warehouse)
+
+    def add(self, sku: str, when: datetime, city: str, warehouse: str) -> None:
+        """Добавляет событие; ``when`` — локальное время события."""
+        self._add(sku, when.hour * 60 + when.minute, city, warehouse)
+
+    def extend(self, table: dict | None) -> None:
+        """
+        Добавляет сводку другого аккаунта. Принимает и прежние таблицы
+        событий ({"strings", "rows"}) — например, из снимков kv_store.
+        """
+        if not table:
+            return
+        strings = table["strings"]
+        if "summaries" not in table:
+            for sku, rows in table["rows"].items():
+                for minute, city, warehouse in rows:
+                    self._add(sku, minute, strings[city], strings[warehouse])
+            return
+        for sku, (count, hours, cities, warehouses, latest) in table["summaries"].items():
+            entry = self._entry(sku)
+            entry.count += count
+            for hour, n in enumerate(hours):
+                entry.hours[hour] += n
+            for index, n, error in cities:
+                entry.cities.add(strings[index], n, error)
+            for index, n, error in warehouses:
+                entry.warehouses.add(strings[index], n, error)
+            for minute, city, warehouse in latest:
+                self._push_latest(entry, minute, strings[city], strings[warehouse])
+
+    def build(self) -> dict:
+        """Возвращает сводку; последние события — от новых к старым."""
+        pool = StringPool()
+        summaries = {}
+        for sku, entry in self._by_sku.items():
+            summaries[sku] = (
+                entry.count,
+                tuple(entry.hours),
+                tuple((pool.add(item), n, error) for item, n, error in entry.cities.top()[: self.top_k]),
+                tuple((pool.add(item), n, error) for item, n, error in entry.warehouses.top()[: self.top_k]),
+                tuple((minute, pool.add(city), pool.add(warehouse)) for minute, _seq, city, warehouse in sorted(entry.latest, reverse=True)),
+            )
+        return {"strings": pool.strings, "summaries": summaries}
+
+
+class SkuEvents(NamedTuple):
+    """Сводка событий одного SKU для шаблона."""
+    count: int
+    hours: list[int]
+    top_cities: list[tuple[str, int]]
+    top_warehouses: list[tuple[str, int]]
+    latest: list[Event]
+
+
+class EventSummaryView(Mapping):
+    """Отображение {sku: SkuEvents} поверх сводки событий."""
+
+    __slots__ = ("_strings", "_summaries")
+
+    def __init__(self, table: dict | None):
+        if table and "summaries" not in table:
+            builder = EventSummaryBuilder()
+            builder.extend(table)
+            table = builder.build()
+        self._strings = table["strings"] if table else []
+        self._summaries = table["summaries"] if table else {}
+
+    def __getitem__(self, sku: str) -> SkuEvents:
+        strings = self._strings
+        count, hours, cities, warehouses, latest = self._summaries[sku]
+        return SkuEvents(
+            count,
+            list(hours),
+            [(strings[index], n) for index, n, _error in cities],
+            [(strings[index], n) for index, n, _error in warehouses],
+            [Event(f"{minute // 60:02d}:{minute % 60:02d}", strings[city], strings[warehouse]) for minute, city, warehouse in latest],
+        )
+
+    def __iter__(self):
+        return iter(self._summaries)
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+
+class StockTableBuilder:
+    """Собирает таблицу остатков по SKU и складам."""
+
+    __slots__ = ("_pool", "_by_sku")
+
+    def __init__(self):
+        self._pool = StringPool()
+        # sku -> [остаток, в пути к клиенту, от клиента, {склад: остаток}]
+        self._by_sku: dict[str, list] = {}
+
+    def _entry(self, sku: str) -> list:
+        entry = self._by_sku.get(sku)
+        if entry is None:
+            entry = self._by_sku[sku] = [0, 0, 0, defaultdict(int)]
+        return entry
+
+    def add(self, sku: str, warehouse: str, qty: int, in_way_to: int = 0, in_way_from: int = 0) -> None:
+        entry = self._entry(sku)
+        entry[0] += qty
+        entry[1] += in_way_to
+        entry[2] += in_way_from
+        entry[3][self._pool.add(warehouse)] += qty
+
+    def add_transit(self, sku: str, in_way_to: int = 0, in_way_from: int = 0) -> None:
+        """Добавляет товары в пути к SKU, уже попавшему в таблицу."""
+        entry = self._by_sku.get(sku)
+        if entry is not None:
+            entry[1] += in_way_to
+            entry[2] += in_way_from
+
+    def __contains__(self, sku: str) -> bool:
+        return sku in self._by_sku
+
+    def extend(self, table: dict | None) -> None:
+        """Добавляет остатки другой таблицы (например, другого аккаунта)."""
+        if not table:
+            return
+        strings = table["strings"]
+        for sku, (qty, in_way_to, in_way_from, warehouses) in zip(table["skus"], table["rows"]):
+            entry = self._entry(sku)
+            entry[0] += qty
+            entry[1] += in_way_to
+            entry[2] += in_way_from
+            for warehouse, wh_qty in warehouses:
+                entry[3][self._pool.add(strings[warehouse])] += wh_qty
+
+    def build(self) -> dict:
+        """Возвращает таблицу; SKU упорядочены по алиасам, склады — по убыванию остатка."""
+        strings = self._pool.strings
+        ordered = sort_pairs_by_alias([(sku, entry[0]) for sku, entry in self._by_sku.items()])
+        skus = tuple(sku for sku, _qty in ordered)
+        rows = []
+        for sku in skus:
+            qty, in_way_to, in_way_from, warehouses = self._by_sku[sku]
+            pairs = sorted(warehouses.items(), key=lambda p: (-p[1], strings[p[0]]))
+            rows.append((qty, in_way_to, in_way_from, tuple(pairs)))
+        return {"strings": strings, "skus": skus, "rows": tuple(rows)}
+
+
+class StockView:
+    """Доступ к таблице остатков в прежнем виде: пары, словари по SKU, итоги по складам."""
+
+    __slots__ = ("_strings", "_skus", "_rows")
+
+    def __init__(self, table: dict | None):
+        self._strings = table["strings"] if table else []
+        self._skus = table["skus"] if table else ()
+        self._rows = table["rows"] if table else ()
+
+    @property
+    def skus(self) -> list[tuple[str, int]]:
+        return [(sku, row[0]) for sku, row in zip(self._skus, self._rows)]
+
+    @property
+    def sku_details(self) -> dict[str, list[tuple[str, int]]]:
+        strings = self._strings
+        return {
+            sku: [(strings[wh], qty) for wh, qty in row[3] if qty > 0]
+            for sku, row in zip(self._skus, self._rows)
+        }
+
+    @property
+    def warehouses(self) -> list[tuple[str, int]]:
+        totals: dict[str, int] = defaultdict(int)
+        for row in self._rows:
+            for wh, qty in row[3]:
+                totals[self._strings[wh]] += qty
+        return sorted(totals.items(), key=lambda x: x[0])
+
+    @property
+    def cells(self) -> dict[tuple[str, str], int]:
+        """Ненулевые остатки по парам (sku, склад)."""
+        strings = self._strings
+        return {
+            (sku, strings[wh]): qty
+            for sku, row in zip(self._skus, self._rows)
+            for wh, qty in row[3]
+            if qty
+        }
+
+    @property
+    def in_way_to(self) -> dict[str, int]:
+        return {sku: row[1] for sku, row in zip(self._skus, self._rows)}
+
+    @property
+    def in_way_from(self) -> dict[str, int]:
+        return {sku: row[2] for sku, row in zip(self._skus, self._rows)}
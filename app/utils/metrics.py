@@ -0,0 +1,128 @@
+"""
+Метрики Prometheus для цепочки загрузки, кэширования и отрисовки.
+
+Под Gunicorn метрики пишутся в общий каталог PROMETHEUS_MULTIPROC_DIR
+(его задает gunicorn.conf.py), и /metrics агрегирует значения всех
+воркеров. Без этой переменной используется обычный реестр процесса.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from . import timing
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+FETCH_DURATION = Histogram(
+    "mp_fetch_duration_seconds",
+    "Длительность запросов к API маркетплейсов",
+    ["endpoint", "account"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+FETCH_ERRORS = Counter(
+    "mp_fetch_errors_total",
+    "Ошибки запросов к API маркетплейсов",
+    ["endpoint", "account", "reason"],
+)
+CACHE_LOOKUPS = Counter(
+    "mp_cache_lookups_total",
+    "Обращения к кэшируемым функциям: hit, miss или stale (резервный кэш)",
+    ["function", "result"],
+)
+VALIDATION_DURATION = Histogram(
+    "mp_validation_duration_seconds",
+    "Время валидации ответов API Pydantic-схемами",
+    ["payload"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+VALIDATION_ROWS = Histogram(
+    "mp_validation_rows",
+    "Количество строк в провалидированном ответе",
+    ["payload"],
+    buckets=(10, 100, 1_000, 10_000, 100_000, 1_000_000),
+)
+RENDER_DURATION = Histogram(
+    "mp_render_duration_seconds",
+    "Время подготовки контекста и отрисовки шаблона",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+CIRCUIT_STATE = Gauge(
+    "mp_circuit_state",
+    "Состояние circuit breaker: 0 — замкнут, 1 — полуоткрыт, 2 — разомкнут",
+    ["endpoint"],
+    multiprocess_mode="livemax",
+)
+
+_CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+_probe = threading.local()
+
+
+def counts_cache_misses(f):
+    """
+    Помечает вызов тела функции как промах кэша.
+
+    Ставится под ``@cache.memoize``: тело выполняется только при промахе,
+    поэтому observe_cache отличает hit от miss без лишнего чтения кэша.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        _probe.miss = True
+        return f(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def observe_cache(function: str):
+    """Считает обращение к кэшируемой функции; отдает dict с ключом ``result``."""
+    outer_miss = getattr(_probe, "miss", False)
+    _probe.miss = False
+    outcome = {"result": None}
+    try:
+        yield outcome
+    finally:
+        result = outcome["result"] or ("miss" if _probe.miss else "hit")
+        outcome["result"] = result
+        _probe.miss = outer_miss
+        CACHE_LOOKUPS.labels(function, result).inc()
+        timing.note(result)
+
+
+class _ValidationProbe:
+    rows = 0
+
+
+@contextmanager
+def observe_validation(payload: str):
+    """Замеряет валидацию ответа; количество строк задается через ``probe.rows``."""
+    probe = _ValidationProbe()
+    start = time.perf_counter()
+    yield probe
+    VALIDATION_DURATION.labels(payload).observe(time.perf_counter() - start)
+    VALIDATION_ROWS.labels(payload).observe(probe.rows)
+
+
+def set_circuit_state(endpoint: str, state: str) -> None:
+    CIRCUIT_STATE.labels(endpoint).set(_CIRCUIT_STATE_VALUES.get(state, 0))
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Возвращает метрики в текстовом формате Prometheus и их Content-Type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,123 @@
+"""
+Резервный (персистентный) кэш результатов в таблице kv_store.
+
+Используется сервисами маркетплейсов как источник last-known-good данных,
+когда внешний API недоступен.
+"""
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from typing import Callable
+
+from ..models import db, KeyValue
+from . import metrics
+from .cache_utils import FetchInProgressError, prefer_stale
+from .circuit_breaker import CircuitOpenError
+from .storage import submit_write
+
+
+_deferred_lock = threading.Lock()
+_deferred: list[Callable[[], None]] | None = None
+
+
+@contextmanager
+def deferred_writes():
+    """
+    Откладывает запись в БД: внутри блока save_to_persistent_cache и другие
+    писатели, использующие defer_write, только накапливают функции записи
+    в возвращаемом списке. Вызванные позже, они пишут без фиксации транзакции.
+
+    Действует на весь процесс, в том числе на рабочие потоки. Нужен пакетному
+    обновлению, которое затем пишет все одной транзакцией.
+    """
+    global _deferred
+    with _deferred_lock:
+        _deferred = []
+        writes = _deferred
+    try:
+        yield writes
+    finally:
+        with _deferred_lock:
+            _deferred = None
+
+
+def defer_write(write: Callable[[], None]) -> bool:
+    """
+    Откладывает ``write`` и возвращает True, если активен deferred_writes
+    или запущена очередь единственного писателя (см. app/utils/storage.py).
+    """
+    with _deferred_lock:
+        if _deferred is not None:
+            _deferred.append(write)
+            return True
+    return submit_write(write)
+
+
+def save_to_persistent_cache(key: str, data: dict, commit: bool = True):
+    """Сохраняет данные в резервный кэш в БД (с ``commit=False`` — без фиксации транзакции)."""
+    if defer_write(partial(save_to_persistent_cache, key, data, commit=False)):
+        return
+    try:
+        row = KeyValue.query.filter_by(key=key).first()
+        if not row:
+            row = KeyValue(key=key)
+        row.value_json = json.dumps(data, ensure_ascii=False)
+        row.updated_at = datetime.utcnow()
+        db.session.add(row)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logging.exception("Failed to save to persistent cache")
+        if not commit:
+            raise
+
+
+def load_from_persistent_cache(key: str) -> dict | None:
+    """Загружает данные из резервного кэша в БД."""
+    try:
+        row = KeyValue.query.filter_by(key=key).first()
+        if row and row.value_json:
+            logging.warning("Returning data from persistent cache for key %s", key)
+            return json.loads(row.value_json)
+    except Exception:
+        logging.exception("Failed to load from persistent cache")
+    return None
+
+
+def load_with_fallback(loader, key: str, *args) -> dict:
+    """
+    Вызывает ``loader(*args)``, а при ошибке отдает данные из резервного кэша.
+
+    Результат из резервного кэша помечается флагом ``stale`` и текстом
+    ошибки в ``error``. Если резервных данных нет, исключение пробрасывается.
+    Если источник уже загружает другой процесс, резервные данные отдаются
+    сразу, с флагом ``warmed`` («идет обновление»); без них — ждем загрузку.
+    Исход обращения (hit/miss/stale/error) попадает в метрики кэша.
+    """
+    with metrics.observe_cache(loader.__name__) as outcome:
+        try:
+            try:
+                with prefer_stale():
+                    return dict(loader(*args), stale=False, error=None)
+            except FetchInProgressError as exc:
+                cached = load_from_persistent_cache(key)
+                if cached:
+                    logging.info("%s: %s, serving persistent copy", key, exc)
+                    outcome["result"] = "stale"
+                    return dict(cached, stale=False, warmed=True, error=None)
+            return dict(loader(*args), stale=False, error=None)
+        except Exception as exc:
+            if isinstance(exc, CircuitOpenError):
+                logging.warning("%s: %s", key, exc)
+            else:
+                logging.exception("Loading %s failed: %s", key, exc)
+            cached = load_from_persistent_cache(key)
+            if cached:
+                outcome["result"] = "stale"
+                return dict(cached, stale=True, error=str(exc) or type(exc).__name__)
+            outcome["result"] = "error"
+            raise
@@ -0,0 +1,67 @@
+"""
+Профилирование медленных запросов администратора через cProfile.
+
+Включается PROFILING_ENABLED=1. Профилируется доля PROFILE_SAMPLE_RATE
+запросов администратора (см. is_admin_request); если запрос занял больше
+PROFILE_SLOW_MS миллисекунд, статистика pstats сохраняется в PROFILE_DIR.
+Хранятся только последние PROFILE_MAX_FILES файлов.
+"""
+import cProfile
+import logging
+import os
+import random
+import time
+import uuid
+
+from flask import Flask, g, request
+
+from .auth import is_admin_request
+
+
+def _prune(directory: str, max_files: int) -> None:
+    files = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".pstats")]
+    files.sort(key=os.path.getmtime)
+    for path in files[: max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def init_profiling(app: Flask) -> None:
+    if not app.config.get("PROFILING_ENABLED"):
+        return
+
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 1.0)
+    slow_ms = app.config.get("PROFILE_SLOW_MS", 500)
+    profile_dir = app.config.get("PROFILE_DIR")
+    max_files = app.config.get("PROFILE_MAX_FILES", 50)
+
+    @app.before_request
+    def start_profiler():
+        if random.random() >= sample_rate or not is_admin_request():
+            return
+        g.profiler = cProfile.Profile()
+        g.profiler_started = time.perf_counter()
+        g.profiler.enable()
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        elapsed_ms = (time.perf_counter() - g.pop("profiler_started")) * 1000
+        if elapsed_ms < slow_ms:
+            return response
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            name = (
+                f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}-"
+                f"{request.endpoint or 'unknown'}-{int(elapsed_ms)}ms.pstats"
+            )
+            profiler.dump_stats(os.path.join(profile_dir, name))
+            _prune(profile_dir, max_files)
+        except OSError:
+            logging.exception("Failed to save profile")
+        return response
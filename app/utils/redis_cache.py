@@ -0,0 +1,360 @@
+"""
+Бэкенд Flask-Caching на Redis для развертывания на нескольких хостах.
+
+Все узлы за балансировщиком читают и пишут одни и те же записи, поэтому
+результат загрузки из API хранится один раз, а не в каталоге ``.cache``
+каждого хоста:
+
+- значение сериализуется так же, как в SQLiteCache (pickle, крупные —
+  со сжатием zlib), и предваряется заголовком: версия записи и момент
+  истечения;
+- каждый процесс держит распакованные значения в памяти. Запись
+  публикует в канал pub/sub (CACHE_REDIS_CHANNEL) ключ и новую версию;
+  фоновый поток подписчика в каждом процессе выбрасывает устаревшие
+  локальные копии и передает событие слушателям (поток SSE ``/api/updates``).
+  Пока подписка активна, попадание в локальную копию обходится без
+  обращения к Redis; без подписки версия сверяется коротким GETRANGE.
+
+Для тестов и одиночного хоста без Redis есть FakeRedis: CACHE_REDIS_URL
+вида ``memory://<имя>`` — экземпляры с одним именем в одном процессе
+работают как общий сервер.
+
+Подключение: CACHE_TYPE = "app.utils.redis_cache.RedisCache".
+"""
+import fnmatch
+import json
+import logging
+import os
+import queue
+import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from flask_caching.backends.base import BaseCache
+
+from .sqlite_cache import dumps, loads
+
+
+# Заголовок значения: версия (8 байт) и момент истечения в мс эпохи (0 — бессрочно)
+_HEADER = struct.Struct(">8sQ")
+
+
+class FakeRedis:
+    """
+    Redis в памяти процесса: только команды, которые использует RedisCache.
+
+    ``FakeRedis.from_url("memory://name")`` возвращает общий сервер для
+    одинаковых имен — так в тестах несколько «узлов» делят одни данные.
+    """
+
+    _servers: dict[str, "FakeRedis"] = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, list[queue.Queue]] = {}
+
+    @classmethod
+    def from_url(cls, url: str) -> "FakeRedis":
+        with cls._servers_lock:
+            return cls._servers.setdefault(url, cls())
+
+    def _alive(self, name: str) -> bytes | None:
+        item = self._data.get(name)
+        if item is None:
+            return None
+        if item[1] and item[1] <= time.time():
+            del self._data[name]
+            return None
+        return item[0]
+
+    def get(self, name: str) -> bytes | None:
+        with self._lock:
+            return self._alive(name)
+
+    def getrange(self, name: str, start: int, end: int) -> bytes:
+        with self._lock:
+            value = self._alive(name) or b""
+        return value[start : end + 1]
+
+    def set(self, name: str, value: bytes, px: int | None = None, nx: bool = False) -> bool | None:
+        with self._lock:
+            if nx and self._alive(name) is not None:
+                return None
+            self._data[name] = (value, time.time() + px / 1000 if px else 0)
+            return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def exists(self, name: str) -> int:
+        with self._lock:
+            return int(self._alive(name) is not None)
+
+    def scan_iter(self, match: str = "*"):
+        with self._lock:
+            names = [name for name in self._data if fnmatch.fnmatchcase(name, match)]
+        yield from (name.encode() for name in names)
+
+    def publish(self, channel: str, message: str) -> int:
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for q in subscribers:
+            q.put(message.encode())
+        return len(subscribers)
+
+    def pubsub(self) -> "_FakePubSub":
+        return _FakePubSub(self)
+
+
+class _FakePubSub:
+    def __init__(self, server: FakeRedis):
+        self._server = server
+        self._queue: queue.Queue = queue.Queue()
+        self._channels: list[str] = []
+
+    def subscribe(self, channel: str) -> None:
+        with self._server._lock:
+            self._server._subscribers.setdefault(channel, []).append(self._queue)
+        self._channels.append(channel)
+
+    def get_message(self, ignore_subscribe_messages: bool = True, timeout: float = 0.0) -> dict | None:
+        try:
+            data = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return {"type": "message", "data": data}
+
+    def close(self) -> None:
+        with self._server._lock:
+            for channel in self._channels:
+                self._server._subscribers[channel].remove(self._queue)
+        self._channels = []
+
+
+def _make_client(url: str):
+    if url.startswith("memory://"):
+        return FakeRedis.from_url(url)
+    import redis  # только для этого бэкенда
+
+    return redis.Redis.from_url(url, socket_timeout=5, health_check_interval=30)
+
+
+class RedisCache(BaseCache):
+    """
+    :param client: клиент redis-py (или FakeRedis).
+    :param key_prefix: префикс ключей в Redis (общая база для нескольких приложений).
+    :param channel: канал pub/sub для уведомлений о новых версиях.
+    :param local_entries: сколько распакованных значений держать в памяти процесса.
+    :param compress_min_bytes: значения больше этого размера сжимаются zlib; 0 — не сжимать.
+    """
+
+    def __init__(
+        self,
+        client,
+        default_timeout: int = 300,
+        key_prefix: str = "mp:",
+        channel: str = "mp:cache",
+        local_entries: int = 256,
+        compress_min_bytes: int = 1024,
+    ):
+        super().__init__(default_timeout=default_timeout)
+        self.client = client
+        self.key_prefix = key_prefix
+        self.channel = channel
+        self.local_entries = local_entries
+        self.compress_min_bytes = compress_min_bytes
+        self._local: OrderedDict = OrderedDict()
+        self._local_lock = threading.Lock()
+        # Счетчик уведомлений по ключу и для clear: значение, прочитанное до
+        # уведомления, в локальную копию уже не попадает
+        self._generations: dict[str, int] = {}
+        self._clear_generation = 0
+        self._listeners: list[Callable[[dict], None]] = []
+        self._subscriber_pid: int | None = None
+        self._subscribed = threading.Event()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        args.insert(0, _make_client(config["CACHE_REDIS_URL"]))
+        kwargs.update(
+            dict(
+                key_prefix=config.get("CACHE_KEY_PREFIX") or "mp:",
+                channel=config.get("CACHE_REDIS_CHANNEL", "mp:cache"),
+            )
+        )
+        return cls(*args, **kwargs)
+
+    # Подписка на уведомления
+
+    def _ensure_subscriber(self) -> None:
+        # Поток на процесс; после fork (воркеры Gunicorn) запускается заново
+        if self._subscriber_pid == os.getpid():
+            return
+        with self._local_lock:
+            if self._subscriber_pid == os.getpid():
+                return
+            self._subscriber_pid = os.getpid()
+            self._subscribed = threading.Event()
+            self._local.clear()
+        threading.Thread(target=self._listen, name="cache-subscriber", daemon=True).start()
+
+    def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub()
+                pubsub.subscribe(self.channel)
+                self._subscribed.set()
+                while True:
+                    message = pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._on_message(json.loads(message["data"]))
+            except Exception:
+                logging.exception("Cache subscriber disconnected")
+            finally:
+                # Пропущенные уведомления: локальным копиям больше нельзя доверять
+                self._subscribed.clear()
+                with self._local_lock:
+                    self._local.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(1)
+
+    def _on_message(self, event: dict) -> None:
+        if event.get("op") == "clear":
+            with self._local_lock:
+                self._local.clear()
+                self._generations.clear()
+                self._clear_generation += 1
+        else:
+            with self._local_lock:
+                self._generations[event["key"]] = self._generations.get(event["key"], 0) + 1
+                local = self._local.get(event["key"])
+                if local and local[0].hex() != event.get("version"):
+                    del self._local[event["key"]]
+        if event.get("op") == "set":
+            for listener in list(self._listeners):
+                try:
+                    listener(event)
+                except Exception:
+                    logging.exception("Cache update listener failed")
+
+    def wait_subscribed(self, timeout: float | None = None) -> bool:
+        """Ждет активной подписки на канал в текущем процессе."""
+        self._ensure_subscriber()
+        return self._subscribed.wait(timeout)
+
+    def add_listener(self, listener: Callable[[dict], None]) -> None:
+        """Подписывает ``listener`` на события записи: {"op": "set", "key", "version"}."""
+        self._ensure_subscriber()
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict], None]) -> None:
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _publish(self, op: str, key: str | None = None, version: bytes | None = None) -> None:
+        event = {"op": op, "key": key, "version": version.hex() if version else None}
+        try:
+            self.client.publish(self.channel, json.dumps(event))
+        except Exception:
+            logging.exception("Cache update publish failed")
+
+    # Локальные копии
+
+    def _generation(self, key: str) -> tuple[int, int]:
+        with self._local_lock:
+            return self._clear_generation, self._generations.get(key, 0)
+
+    def _remember(self, key: str, version: bytes, expires: float, value, generation: tuple[int, int] | None = None) -> None:
+        with self._local_lock:
+            # Пока шло чтение, пришло уведомление о новой версии: прочитанное
+            # значение могло устареть, а подписка его уже не перепроверит
+            if generation is not None and generation != (self._clear_generation, self._generations.get(key, 0)):
+                self._local.pop(key, None)
+                return
+            self._local[key] = (version, expires, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_entries:
+                self._local.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._local_lock:
+            self._local.pop(key, None)
+
+    # API Flask-Caching
+
+    def get(self, key: str):
+        self._ensure_subscriber()
+        now = time.time()
+        with self._local_lock:
+            local = self._local.get(key)
+        if local and (not local[1] or local[1] > now):
+            if self._subscribed.is_set():
+                return local[2]
+            head = self.client.getrange(self.key_prefix + key, 0, _HEADER.size - 1)
+            if len(head) == _HEADER.size and _HEADER.unpack(head)[0] == local[0]:
+                return local[2]
+        generation = self._generation(key)
+        blob = self.client.get(self.key_prefix + key)
+        if blob is None:
+            self._forget(key)
+            return None
+        version, expires_ms = _HEADER.unpack_from(blob)
+        try:
+            value = loads(blob[_HEADER.size :])
+        except Exception:
+            return None
+        self._remember(key, version, expires_ms / 1000, value, generation)
+        return value
+
+    def _write(self, key: str, value, timeout, only_if_absent: bool) -> bool:
+        timeout = self._normalize_timeout(timeout)
+        if timeout < 0:
+            self.delete(key)
+            return True
+        version = secrets.token_bytes(8)
+        expires = time.time() + timeout if timeout else 0
+        blob = _HEADER.pack(version, int(expires * 1000)) + dumps(value, self.compress_min_bytes)
+        written = self.client.set(self.key_prefix + key, blob, px=timeout * 1000 if timeout else None, nx=only_if_absent)
+        if not written:
+            return False
+        self._remember(key, version, expires, value)
+        self._publish("add" if only_if_absent else "set", key, version)
+        return True
+
+    def set(self, key: str, value, timeout=None) -> bool:
+        return self._write(key, value, timeout, only_if_absent=False)
+
+    def add(self, key: str, value, timeout=None) -> bool:
+        """Атомарно записывает значение, только если ключа нет (SET NX)."""
+        return self._write(key, value, timeout, only_if_absent=True)
+
+    def delete(self, key: str) -> bool:
+        self._forget(key)
+        deleted = self.client.delete(self.key_prefix + key) > 0
+        self._publish("delete", key)
+        return deleted
+
+    def has(self, key: str) -> bool:
+        return bool(self.client.exists(self.key_prefix + key))
+
+    def clear(self) -> bool:
+        with self._local_lock:
+            self._local.clear()
+        names = list(self.client.scan_iter(match=self.key_prefix + "*"))
+        for i in range(0, len(names), 500):
+            self.client.delete(*names[i : i + 500])
+        self._publish("clear")
+        return True
@@ -0,0 +1,226 @@
+"""
+Бэкенд Flask-Caching на SQLite в режиме WAL, общий для всех воркеров хоста.
+
+В отличие от FileSystemCache (отдельный pickle-файл на ключ, который каждый
+воркер открывает и распаковывает при каждом попадании):
+
+- все записи лежат в одном файле БД; замена значения — одна транзакция,
+  поэтому читатели видят либо старое, либо новое значение целиком;
+- у каждой записи есть номер версии. Воркер держит распакованные значения
+  в памяти и при чтении запрашивает только версию: BLOB читается и
+  распаковывается, лишь если значение изменил другой процесс;
+- размер ограничен числом записей (CACHE_THRESHOLD) и байтами
+  (CACHE_SQLITE_MAX_BYTES), при превышении вытесняются просроченные и давно
+  не читавшиеся записи (LRU).
+
+Значения, возвращаемые из памяти процесса, общие для всех вызовов get, —
+их нельзя изменять на месте.
+
+Подключение: CACHE_TYPE = "app.utils.sqlite_cache.SQLiteCache".
+"""
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from flask_caching.backends.base import BaseCache
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+"""
+
+# Первый байт сериализованного значения: pickle как есть или pickle + zlib
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+
+def dumps(value, compress_min_bytes: int) -> bytes:
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if compress_min_bytes and len(data) >= compress_min_bytes:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def loads(blob: bytes):
+    if blob[:1] == _ZLIB:
+        return pickle.loads(zlib.decompress(blob[1:]))
+    return pickle.loads(blob[1:])
+
+
+class SQLiteCache(BaseCache):
+    """
+    :param path: путь к файлу БД (каталог создается при необходимости).
+    :param threshold: максимум записей; 0 — без ограничения.
+    :param max_bytes: максимум суммарного размера значений; 0 — без ограничения.
+    :param local_entries: сколько распакованных значений держать в памяти процесса.
+    :param compress_min_bytes: значения больше этого размера сжимаются zlib; 0 — не сжимать.
+    :param touch_interval: не чаще чем раз в столько секунд обновлять время
+        последнего чтения записи (для LRU), чтобы попадания не превращались в запись.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        default_timeout: int = 300,
+        threshold: int = 500,
+        max_bytes: int = 256 * 1024 * 1024,
+        local_entries: int = 256,
+        compress_min_bytes: int = 64 * 1024,
+        touch_interval: float = 60,
+    ):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.local_entries = local_entries
+        self.compress_min_bytes = compress_min_bytes
+        self.touch_interval = touch_interval
+        self._tls = threading.local()
+        self._local: OrderedDict = OrderedDict()
+        self._local_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        path = config.get("CACHE_SQLITE_PATH") or os.path.join(config["CACHE_DIR"], "cache.sqlite3")
+        args.insert(0, path)
+        kwargs.update(
+            dict(
+                threshold=config["CACHE_THRESHOLD"],
+                max_bytes=config.get("CACHE_SQLITE_MAX_BYTES", 256 * 1024 * 1024),
+            )
+        )
+        return cls(*args, **kwargs)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение на поток; после fork (воркеры Gunicorn) открывается заново
+        conn = getattr(self._tls, "conn", None)
+        if conn is None or self._tls.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._tls.conn = conn
+            self._tls.pid = os.getpid()
+        return conn
+
+    def _expires_at(self, timeout) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return float("inf") if timeout == 0 else time.time() + timeout
+
+    def _remember(self, key: str, version: int, value) -> None:
+        with self._local_lock:
+            self._local[key] = (version, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_entries:
+                self._local.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._local_lock:
+            self._local.pop(key, None)
+
+    def get(self, key: str):
+        now = time.time()
+        with self._local_lock:
+            local = self._local.get(key)
+        known_version = local[0] if local else None
+        row = self._connect().execute(
+            "SELECT version, expires, accessed, CASE WHEN version = ? THEN NULL ELSE value END "
+            "FROM cache WHERE key = ?",
+            (known_version, key),
+        ).fetchone()
+        if row is None or row[1] <= now:
+            self._forget(key)
+            return None
+        version, _expires, accessed, blob = row
+        if now - accessed >= self.touch_interval:
+            self._connect().execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        if blob is None:
+            with self._local_lock:
+                if key in self._local:
+                    self._local.move_to_end(key)
+            return local[1]
+        try:
+            value = loads(blob)
+        except Exception:
+            return None
+        self._remember(key, version, value)
+        return value
+
+    def _write(self, key: str, value, timeout, only_if_absent: bool) -> bool:
+        blob = dumps(value, self.compress_min_bytes)
+        version = secrets.randbits(62)
+        now = time.time()
+        conn = self._connect()
+        sql = (
+            "INSERT INTO cache (key, value, version, expires, accessed, size) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = excluded.version, "
+            "expires = excluded.expires, accessed = excluded.accessed, size = excluded.size"
+        )
+        params = (key, blob, version, self._expires_at(timeout), now, len(blob))
+        if only_if_absent:
+            sql += " WHERE cache.expires <= ?"
+            params += (now,)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            written = conn.execute(sql, params).rowcount > 0
+            if written:
+                self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if written:
+            self._remember(key, version, value)
+        return written
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        count, total = conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM cache").fetchone()
+        if (not self.threshold or count <= self.threshold) and (not self.max_bytes or total <= self.max_bytes):
+            return
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        rows = conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+        count, total = len(rows), sum(size for _key, size in rows)
+        victims = []
+        for key, size in rows[:-1]:  # только что записанное значение не вытесняем
+            if (not self.threshold or count <= self.threshold) and (not self.max_bytes or total <= self.max_bytes):
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+    def set(self, key: str, value, timeout=None) -> bool:
+        return self._write(key, value, timeout, only_if_absent=False)
+
+    def add(self, key: str, value, timeout=None) -> bool:
+        """Атомарно записывает значение, только если ключа нет или он просрочен."""
+        return self._write(key, value, timeout, only_if_absent=True)
+
+    def delete(self, key: str) -> bool:
+        self._forget(key)
+        return self._connect().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def has(self, key: str) -> bool:
+        row = self._connect().execute("SELECT expires FROM cache WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def clear(self) -> bool:
+        with self._local_lock:
+            self._local.clear()
+        self._connect().execute("DELETE FROM cache")
+        return True
@@ -0,0 +1,242 @@
+"""
+Единый куб остатков: маркетплейс × товар × склад × показатель.
+
+Таблицы остатков WB и Ozon (``stock_table``, см. compact.py) складываются в
+одну структуру на плоских массивах ``array``:
+
+- оси — кортежи имен маркетплейсов, товаров (SKU с алиасом, общие для
+  WB и Ozon) и складов; показатели — METRICS;
+- ненулевые ячейки (маркетплейс, товар, склад) хранятся подряд, по
+  маркетплейсу и товару, значения — по len(METRICS) чисел на ячейку;
+- суммы по товарам и по складам считаются один раз при построении, поэтому
+  итоги, товар на всех маркетплейсах и рейтинг складов — срезы готовых
+  массивов, без обхода ячеек.
+
+Товары в пути к клиенту и от клиента в таблицах известны только по SKU и
+лежат в ячейке склада NO_WAREHOUSE; в рейтинг складов она не входит.
+
+Куб строится один раз на версию данных (время загрузки источников):
+stock_cube() держит последний куб в памяти процесса и в общем кэше.
+"""
+import json
+import threading
+from array import array
+
+from .. import cache
+
+
+METRICS = ("available", "to_client", "from_client")
+AVAILABLE, TO_CLIENT, FROM_CLIENT = range(len(METRICS))
+NO_WAREHOUSE = ""
+CACHE_KEY = "stock_cube"
+
+_K = len(METRICS)
+
+
+class StockCube:
+    """Куб остатков; создается через StockCube.build."""
+
+    __slots__ = (
+        "marketplaces", "products", "warehouses", "version",
+        "_product_index", "_order", "_present",
+        "_row_start", "_cell_warehouse", "_cell_values",
+        "_product_totals", "_warehouse_totals",
+    )
+
+    def __init__(self, marketplaces, products, warehouses, order, row_start, cell_warehouse, cell_values, version=""):
+        self.marketplaces: tuple[str, ...] = marketplaces
+        self.products: tuple[str, ...] = products
+        self.warehouses: tuple[str, ...] = warehouses
+        self.version = version
+        self._product_index = {sku: i for i, sku in enumerate(products)}
+        # Порядок товаров в плитках маркетплейса (как в stock_table — по алиасам)
+        self._order: tuple[array, ...] = order
+        # Есть ли товар на маркетплейсе (в том числе с нулевым остатком)
+        self._present = bytearray(len(marketplaces) * len(products))
+        for m, products_order in enumerate(order):
+            for p in products_order:
+                self._present[m * len(products) + p] = 1
+        # Ячейки строки (маркетплейс, товар): [_row_start[r], _row_start[r + 1])
+        self._row_start: array = row_start
+        self._cell_warehouse: array = cell_warehouse
+        self._cell_values: array = cell_values
+        n_m, n_p, n_w = len(marketplaces), len(products), len(warehouses)
+        self._product_totals = array("q", bytes(8 * n_m * n_p * _K))
+        self._warehouse_totals = array("q", bytes(8 * n_m * n_w * _K))
+        for m in range(n_m):
+            for p in range(n_p):
+                row = m * n_p + p
+                for cell in range(row_start[row], row_start[row + 1]):
+                    w = cell_warehouse[cell]
+                    for k in range(_K):
+                        value = cell_values[cell * _K + k]
+                        self._product_totals[row * _K + k] += value
+                        self._warehouse_totals[(m * n_w + w) * _K + k] += value
+
+    @classmethod
+    def build(cls, tables: dict[str, dict | None], version: str = "") -> "StockCube":
+        """Строит куб из таблиц остатков {маркетплейс: stock_table}; None — нет данных."""
+        marketplaces = tuple(tables)
+        products: dict[str, int] = {}
+        warehouses: dict[str, int] = {NO_WAREHOUSE: 0}
+        rows: dict[tuple[int, int], list[tuple[int, int, int, int]]] = {}
+        order = []
+        for m, table in enumerate(tables.values()):
+            skus = table["skus"] if table else ()
+            strings = table["strings"] if table else []
+            order.append(array("i", (products.setdefault(sku, len(products)) for sku in skus)))
+            for sku, (_qty, in_way_to, in_way_from, pairs) in zip(skus, table["rows"] if table else ()):
+                cells = rows.setdefault((m, products[sku]), [])
+                for wh, qty in pairs:
+                    if qty:
+                        cells.append((warehouses.setdefault(strings[wh], len(warehouses)), qty, 0, 0))
+                if in_way_to or in_way_from:
+                    cells.append((0, 0, in_way_to, in_way_from))
+        n_p = len(products)
+        row_start = array("i", [0])
+        cell_warehouse = array("i")
+        cell_values = array("i")
+        for m in range(len(marketplaces)):
+            for p in range(n_p):
+                for w, *values in rows.get((m, p), ()):
+                    cell_warehouse.append(w)
+                    cell_values.extend(values)
+                row_start.append(len(cell_warehouse))
+        return cls(marketplaces, tuple(products), tuple(warehouses), tuple(order), row_start, cell_warehouse, cell_values, version)
+
+    # Срезы
+
+    def _m(self, marketplace: str) -> int | None:
+        try:
+            return self.marketplaces.index(marketplace)
+        except ValueError:
+            return None
+
+    def _selected(self, marketplace: str | None) -> list[int]:
+        if marketplace is None:
+            return list(range(len(self.marketplaces)))
+        m = self._m(marketplace)
+        return [] if m is None else [m]
+
+    def total(self, metric: int = AVAILABLE, marketplace: str | None = None) -> int:
+        """Итог показателя по маркетплейсу или по всем."""
+        n_w = len(self.warehouses)
+        return sum(
+            sum(self._warehouse_totals[(m * n_w) * _K + metric : (m + 1) * n_w * _K : _K])
+            for m in self._selected(marketplace)
+        )
+
+    def product(self, sku: str) -> dict[str, tuple[int, int, int]]:
+        """Товар на всех маркетплейсах: {маркетплейс: (остаток, к клиенту, от клиента)}."""
+        p = self._product_index.get(sku)
+        if p is None:
+            return {}
+        n_p = len(self.products)
+        result = {}
+        for m, marketplace in enumerate(self.marketplaces):
+            start = (m * n_p + p) * _K
+            if self._present[m * n_p + p]:
+                result[marketplace] = tuple(self._product_totals[start : start + _K])
+        return result
+
+    def product_rows(self, marketplace: str) -> list[tuple[str, int, int, int]]:
+        """Товары маркетплейса в порядке плиток: (sku, остаток, к клиенту, от клиента)."""
+        m = self._m(marketplace)
+        if m is None:
+            return []
+        n_p = len(self.products)
+        totals = self._product_totals
+        return [
+            (self.products[p], *totals[(m * n_p + p) * _K : (m * n_p + p + 1) * _K])
+            for p in self._order[m]
+        ]
+
+    def product_warehouses(self, marketplace: str, sku: str) -> list[tuple[str, int]]:
+        """Остатки товара по складам маркетплейса, по убыванию."""
+        m, p = self._m(marketplace), self._product_index.get(sku)
+        if m is None or p is None:
+            return []
+        row = m * len(self.products) + p
+        # Ячейки строки идут в порядке stock_table — уже по убыванию остатка
+        return [
+            (self.warehouses[self._cell_warehouse[cell]], self._cell_values[cell * _K + AVAILABLE])
+            for cell in range(self._row_start[row], self._row_start[row + 1])
+            if self._cell_warehouse[cell]
+        ]
+
+    def sku_details(self, marketplace: str) -> dict[str, list[tuple[str, int]]]:
+        """Склады по каждому товару маркетплейса (для подсказок плиток)."""
+        m = self._m(marketplace)
+        if m is None:
+            return {}
+        return {self.products[p]: self.product_warehouses(marketplace, self.products[p]) for p in self._order[m]}
+
+    def warehouse_totals(self, marketplace: str | None = None, metric: int = AVAILABLE) -> dict[str, int]:
+        """Итоги показателя по складам (без NO_WAREHOUSE); склады без остатка не входят."""
+        n_w = len(self.warehouses)
+        totals: dict[str, int] = {}
+        for m in self._selected(marketplace):
+            column = self._warehouse_totals[m * n_w * _K + metric : (m + 1) * n_w * _K : _K]
+            for w in range(1, n_w):
+                if column[w]:
+                    totals[self.warehouses[w]] = totals.get(self.warehouses[w], 0) + column[w]
+        return totals
+
+    def warehouse_ranking(self, marketplace: str | None = None, metric: int = AVAILABLE, limit: int | None = None) -> list[tuple[str, int]]:
+        """Склады по убыванию показателя."""
+        ranking = sorted(self.warehouse_totals(marketplace, metric).items(), key=lambda x: (-x[1], x[0]))
+        return ranking[:limit] if limit else ranking
+
+    def product_ranking(self, metric: int = AVAILABLE, limit: int | None = None) -> list[tuple[str, int, dict[str, int]]]:
+        """Товары по убыванию суммы показателя на всех маркетплейсах: (sku, сумма, {маркетплейс: значение})."""
+        n_p = len(self.products)
+        ranking = []
+        for p, sku in enumerate(self.products):
+            parts = {
+                marketplace: self._product_totals[(m * n_p + p) * _K + metric]
+                for m, marketplace in enumerate(self.marketplaces)
+            }
+            ranking.append((sku, sum(parts.values()), parts))
+        ranking.sort(key=lambda x: (-x[1], x[0]))
+        return ranking[:limit] if limit else ranking
+
+
+def cube_version(wb_stocks: dict | None, ozon_stocks: dict | None) -> str:
+    """Версия данных для куба: время загрузки и итоги источников."""
+    wb_stocks, ozon_stocks = wb_stocks or {}, ozon_stocks or {}
+    return json.dumps([
+        wb_stocks.get("fetched_at"),
+        wb_stocks.get("total"),
+        [(acc.get("client_id"), acc.get("fetched_at")) for acc in ozon_stocks.get("accounts", [])],
+        ozon_stocks.get("total"),
+    ])
+
+
+_last: StockCube | None = None
+_lock = threading.Lock()
+
+
+def stock_cube(wb_stocks: dict | None, ozon_stocks: dict | None) -> StockCube:
+    """
+    Куб по результатам загрузчиков остатков (fetch_stocks WB и Ozon).
+
+    Строится, только если данные загружены заново: последний куб хранится
+    в памяти процесса и в общем кэше под версией cube_version.
+    """
+    global _last
+    version = cube_version(wb_stocks, ozon_stocks)
+    cube = _last
+    if cube is not None and cube.version == version:
+        return cube
+    with _lock:
+        if _last is not None and _last.version == version:
+            return _last
+        cube = cache.get(CACHE_KEY)
+        if cube is None or cube.version != version:
+            cube = StockCube.build(
+                {"wb": (wb_stocks or {}).get("stock_table"), "ozon": (ozon_stocks or {}).get("stock_table")},
+                version,
+            )
+            cache.set(CACHE_KEY, cube)
+        _last = cube
+    return cube
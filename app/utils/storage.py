@@ -0,0 +1,158 @@
+"""
+Настройка хранилища SQLAlchemy для конкурентной записи.
+
+SQLite (по умолчанию): каждое соединение переводится в режим WAL (читатели
+не блокируют писателя), ``busy_timeout`` заставляет ждать блокировку вместо
+немедленного "database is locked", ``synchronous=NORMAL`` убирает fsync на
+каждый коммит. Внутри процесса записи из запросов идут через очередь
+единственного писателя (WriteQueue): он применяет их пачкой и фиксирует
+одной транзакцией, поэтому воркеры Gunicorn не ждут блокировку в запросе.
+
+Postgres: явный размер пула, ``pool_pre_ping`` (соединения, разорванные
+сервером, не попадают в запрос), ``pool_recycle`` и ``statement_timeout``.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Callable
+
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from ..models import db
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS для бэкенда из SQLALCHEMY_DATABASE_URI."""
+    backend = make_url(config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    if backend == "sqlite":
+        # Таймаут ожидания блокировки на уровне драйвера, в секундах
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000}}
+    if backend == "postgresql":
+        return {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT_SECONDS"],
+            "pool_recycle": config["DB_POOL_RECYCLE_SECONDS"],
+            "pool_pre_ping": True,
+            "connect_args": {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"},
+        }
+    return {}
+
+
+def _sqlite_pragmas(busy_timeout_ms: int, synchronous: str) -> Callable:
+    def on_connect(dbapi_connection, _record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+    return on_connect
+
+
+class WriteQueue:
+    """
+    Очередь записей с единственным потоком-писателем.
+
+    Запись — функция без аргументов, которая добавляет изменения в сессию,
+    не фиксируя транзакцию (см. persistent_cache.defer_write). Писатель
+    забирает из очереди до ``max_batch`` записей и фиксирует их одним
+    коммитом; если пачка не записалась, записи повторяются по одной.
+    """
+
+    def __init__(self, app: Flask, max_batch: int = 100):
+        self._app = app
+        self._max_batch = max_batch
+        # После fork поток писателя в дочернем процессе не существует
+        self.pid = os.getpid()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def in_writer(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, write: Callable[[], None]) -> None:
+        self._queue.put(write)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Ждет фиксации всех уже поставленных записей. Возвращает False по таймауту."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _apply(self, batch: list[Callable[[], None]]) -> None:
+        try:
+            for write in batch:
+                write()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for write in batch:
+                try:
+                    write()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    logging.exception("Queued database write failed")
+
+    def _run(self) -> None:
+        with self._app.app_context():
+            while True:
+                items = [self._queue.get()]
+                while len(items) < self._max_batch:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                batch = [item for item in items if not isinstance(item, threading.Event)]
+                if batch:
+                    self._apply(batch)
+                # Отметки flush() срабатывают после фиксации предшествующих записей
+                for item in items:
+                    if isinstance(item, threading.Event):
+                        item.set()
+
+
+_writer: WriteQueue | None = None
+
+
+def submit_write(write: Callable[[], None]) -> bool:
+    """Ставит запись в очередь писателя, если она запущена (и вызов не из самого писателя)."""
+    writer = _writer
+    if writer is None or writer.pid != os.getpid() or writer.in_writer():
+        return False
+    writer.submit(write)
+    return True
+
+
+def flush_writes(timeout: float = 10) -> bool:
+    """Ждет фиксации записей, поставленных в очередь писателя этого процесса."""
+    writer = _writer
+    if writer is None or writer.pid != os.getpid() or writer.in_writer():
+        return True
+    return writer.flush(timeout)
+
+
+def configure_engine(app: Flask) -> None:
+    """Дополняет SQLALCHEMY_ENGINE_OPTIONS; вызывается до db.init_app."""
+    options = engine_options(app.config)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def init_storage(app: Flask) -> None:
+    """Включает прагмы SQLite и очередь единственного писателя; вызывается после db.init_app."""
+    global _writer
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+    event.listen(engine, "connect", _sqlite_pragmas(app.config["SQLITE_BUSY_TIMEOUT_MS"], app.config["SQLITE_SYNCHRONOUS"]))
+    if app.config.get("DB_WRITE_QUEUE") and (_writer is None or _writer.pid != os.getpid()):
+        _writer = WriteQueue(app)
+        # Скрипты завершаются сразу после работы — не терять поставленные записи
+        atexit.register(_writer.flush, 10)
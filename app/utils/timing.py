@@ -0,0 +1,75 @@
+"""
+Сбор интервалов для заголовка Server-Timing.
+
+Интервалы текущего запроса хранятся в ``flask.g``; заголовок добавляется
+в after_request (см. init_server_timing). Вне контекста запроса все
+функции модуля ничего не делают.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import Flask, g, has_request_context
+
+
+class _Span:
+    __slots__ = ("name", "notes", "duration_ms")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.notes: list[str] = []
+        self.duration_ms = 0.0
+
+
+def _state() -> dict | None:
+    if not has_request_context():
+        return None
+    if "server_timing" not in g:
+        g.server_timing = {"spans": [], "stack": []}
+    return g.server_timing
+
+
+@contextmanager
+def span(name: str):
+    """Замеряет участок обработки запроса под именем ``name``."""
+    state = _state()
+    if state is None:
+        yield None
+        return
+    item = _Span(name)
+    state["stack"].append(item)
+    start = time.perf_counter()
+    try:
+        yield item
+    finally:
+        item.duration_ms = (time.perf_counter() - start) * 1000
+        state["stack"].pop()
+        state["spans"].append(item)
+
+
+def note(text: str) -> None:
+    """Добавляет пометку (например, hit/miss кэша) к текущему интервалу."""
+    state = _state()
+    if state and state["stack"]:
+        state["stack"][-1].notes.append(text)
+
+
+def header_value() -> str:
+    state = _state()
+    if not state:
+        return ""
+    parts = []
+    for item in state["spans"]:
+        value = f"{item.name};dur={item.duration_ms:.1f}"
+        if item.notes:
+            value += f';desc="{",".join(item.notes)}"'
+        parts.append(value)
+    return ", ".join(parts)
+
+
+def init_server_timing(app: Flask) -> None:
+    @app.after_request
+    def add_server_timing(response):
+        value = header_value()
+        if value:
+            response.headers["Server-Timing"] = value
+        return response
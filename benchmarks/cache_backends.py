@@ -0,0 +1,141 @@
+"""
+Сравнение бэкендов кэша: FileSystemCache и SQLiteCache (app/utils/sqlite_cache.py).
+
+В качестве значений берутся агрегированные результаты сервисов WB на
+синтетических данных (как их кладет в кэш memoize). Для каждого размера
+замеряются запись, чтение неизменившегося значения в одном процессе и
+пропускная способность чтения из нескольких процессов одновременно
+(как воркеры Gunicorn).
+
+Пример:
+    python -m benchmarks.cache_backends --sizes 1k,100k --processes 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from zoneinfo import ZoneInfo
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+from benchmarks import generators
+from app.schemas import WBStockItem, WBOrderItem, WBSaleItem
+from app.services import wb_api
+from app.utils.sqlite_cache import SQLiteCache
+
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def _payloads(rows: int, seed: int) -> dict:
+    stocks = [WBStockItem.model_validate(it) for it in generators.wb_stocks(rows, seed)]
+    orders = [WBOrderItem.model_validate(it) for it in generators.wb_orders(rows, seed + 1, TZ)]
+    sales = [WBSaleItem.model_validate(it) for it in generators.wb_sales(rows, seed + 2, TZ)]
+    return {
+        "stocks": wb_api.aggregate_stocks(stocks),
+        "today": wb_api.aggregate_today(
+            wb_api.deduplicate_items(orders, TZ, "srid"),
+            wb_api.deduplicate_items(sales, TZ, "srid"),
+            TZ,
+        ),
+    }
+
+
+def _make_backend(name: str, workdir: str):
+    if name == "filesystem":
+        return FileSystemCache(os.path.join(workdir, "fs"), threshold=500, default_timeout=3600)
+    return SQLiteCache(os.path.join(workdir, "sqlite", "cache.sqlite3"), default_timeout=3600)
+
+
+def _reader(name: str, workdir: str, keys: list[str], seconds: float, queue) -> None:
+    backend = _make_backend(name, workdir)
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for key in keys:
+            assert backend.get(key) is not None
+            done += 1
+    queue.put(done)
+
+
+def run_backend(name: str, payloads: dict, repeat: int, processes: int, seconds: float) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"cache-bench-{name}-")
+    try:
+        backend = _make_backend(name, workdir)
+        keys = list(payloads)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for key, value in payloads.items():
+                backend.set(key, value)
+        set_ms = (time.perf_counter() - start) * 1000 / (repeat * len(keys))
+
+        # Первое чтение в новом процессе-воркере всегда распаковывает значение
+        fresh = _make_backend(name, workdir)
+        start = time.perf_counter()
+        for key in keys:
+            fresh.get(key)
+        cold_get_ms = (time.perf_counter() - start) * 1000 / len(keys)
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for key in keys:
+                fresh.get(key)
+        hit_get_ms = (time.perf_counter() - start) * 1000 / (repeat * len(keys))
+
+        queue = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_reader, args=(name, workdir, keys, seconds, queue))
+            for _ in range(processes)
+        ]
+        for p in procs:
+            p.start()
+        total = sum(queue.get() for _ in procs)
+        for p in procs:
+            p.join()
+
+        return {
+            "set_ms": round(set_ms, 3),
+            "cold_get_ms": round(cold_get_ms, 3),
+            "hit_get_ms": round(hit_get_ms, 3),
+            f"gets_per_sec_{processes}p": round(total / seconds),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k", help=f"через запятую: {', '.join(generators.SIZES)}")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0, help="длительность замера в нескольких процессах")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results: dict = {}
+    for size in args.sizes.split(","):
+        payloads = _payloads(generators.SIZES[size], args.seed)
+        results[size] = {
+            name: run_backend(name, payloads, args.repeat, args.processes, args.seconds)
+            for name in ("filesystem", "sqlite")
+        }
+        print(f"{size}: {json.dumps(results[size], ensure_ascii=False)}", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Конкурентная запись в базу из нескольких процессов (как воркеры Gunicorn
+и скрипт обновления, пишущие persistent_cache).
+
+Каждый процесс создает приложение с собственным движком и сохраняет
+``--writes`` значений через save_to_persistent_cache. Режимы:
+
+    default  — SQLite без настроек (журнал DELETE, без busy_timeout);
+    tuned    — WAL, busy_timeout, synchronous=NORMAL (app/utils/storage.py);
+    queued   — tuned плюс очередь единственного писателя в каждом процессе;
+    postgres — пул соединений и statement_timeout (если задан --postgres).
+
+Для каждого режима выводятся записи в секунду (до фиксации последней
+записи), p95 задержки вызова в запросе (для queued — постановки в очередь)
+и число ошибок "database is locked".
+
+Пример:
+    python -m benchmarks.db_contention --processes 4 --writes 2000
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+
+from config import Config
+from app.models import db
+from app.utils import storage
+from app.utils.persistent_cache import save_to_persistent_cache
+
+
+MODES = ("default", "tuned", "queued", "postgres")
+
+
+class _LockCounter(logging.Handler):
+    """Считает ошибки записи, которые save_to_persistent_cache логирует и глотает."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.locked = 0
+        self.failed = 0
+
+    def emit(self, record):
+        self.failed += 1
+        if record.exc_info and "locked" in str(record.exc_info[1]):
+            self.locked += 1
+
+
+def _make_app(mode: str, uri: str) -> Flask:
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI=uri, DB_WRITE_QUEUE=mode == "queued")
+    if mode == "default":
+        # Драйвер sqlite3 по умолчанию ждет 5 с; «без настроек» — без ожидания
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 0}}
+    else:
+        storage.configure_engine(app)
+    db.init_app(app)
+    if mode != "default":
+        storage.init_storage(app)
+    return app
+
+
+def _writer(mode: str, uri: str, worker: int, writes: int, payload_size: int, queue) -> None:
+    counter = _LockCounter()
+    logging.getLogger().addHandler(counter)
+    app = _make_app(mode, uri)
+    payload = {"rows": list(range(payload_size))}
+    latencies = []
+    with app.app_context():
+        began = time.perf_counter()
+        for i in range(writes):
+            start = time.perf_counter()
+            save_to_persistent_cache(f"bench:{worker}:{i % 50}", payload)
+            latencies.append(time.perf_counter() - start)
+        if storage._writer is not None:
+            storage._writer.flush()
+        elapsed = time.perf_counter() - began
+    queue.put({"writes": writes, "seconds": elapsed, "locked": counter.locked, "failed": counter.failed, "latencies": latencies})
+
+
+def run_mode(mode: str, uri: str, processes: int, writes: int, payload_size: int) -> dict:
+    app = _make_app(mode, uri)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+    queue = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_writer, args=(mode, uri, n, writes, payload_size, queue))
+        for n in range(processes)
+    ]
+    for p in procs:
+        p.start()
+    results = [queue.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    latencies = sorted(x for r in results for x in r["latencies"])
+    total = sum(r["writes"] for r in results)
+    failed = sum(r["failed"] for r in results)
+    seconds = max(r["seconds"] for r in results)
+    return {
+        "writes_per_sec": round((total - failed) / seconds),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None,
+        "locked_errors": sum(r["locked"] for r in results),
+        "failed": failed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="default,tuned,queued", help=f"через запятую: {', '.join(MODES)}")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=2000, help="записей на процесс")
+    parser.add_argument("--payload-size", type=int, default=200, help="элементов в сохраняемом значении")
+    parser.add_argument("--postgres", help="URI базы Postgres для режима postgres")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    if args.postgres and "postgres" not in modes:
+        modes.append("postgres")
+
+    results: dict = {}
+    for mode in modes:
+        if mode == "postgres":
+            if not args.postgres:
+                print("postgres: skipped (no --postgres URI)", flush=True)
+                continue
+            results[mode] = run_mode(mode, args.postgres, args.processes, args.writes, args.payload_size)
+        else:
+            workdir = tempfile.mkdtemp(prefix=f"db-bench-{mode}-")
+            try:
+                uri = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+                results[mode] = run_mode(mode, uri, args.processes, args.writes, args.payload_size)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+        print(f"{mode}: {json.dumps(results[mode], ensure_ascii=False)}", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
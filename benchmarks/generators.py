@@ -0,0 +1,208 @@
+"""
+Генераторы синтетических ответов API Wildberries и Ozon.
+
+Все генераторы детерминированы: одинаковые ``seed`` и ``rows`` дают
+одинаковый ответ. Форма записей повторяет реальные ответы API, включая
+поля, которые сервисы не читают, — от них зависит стоимость декодирования.
+"""
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+WAREHOUSES = [
+    "Коледино", "Подольск", "Электросталь", "Казань", "Краснодар", "Тула",
+    "Санкт-Петербург Уткина Заводь", "Екатеринбург - Испытателей 14г",
+    "Новосибирск", "Невинномысск", "Хабаровск", "Белые Столбы",
+]
+OZON_CLUSTERS = [
+    "Москва, МО и Дальние регионы", "Санкт-Петербург и СЗО", "Казань",
+    "Екатеринбург", "Новосибирск", "Краснодар", "Ростов", "Самара", "Уфа",
+]
+OKRUGS = [
+    "Центральный федеральный округ", "Северо-Западный федеральный округ",
+    "Приволжский федеральный округ", "Южный федеральный округ",
+    "Уральский федеральный округ", "Сибирский федеральный округ",
+    "Дальневосточный федеральный округ", "Северо-Кавказский федеральный округ",
+]
+CITIES = [
+    "Москва", "Санкт-Петербург", "Казань", "Екатеринбург", "Новосибирск",
+    "Краснодар", "Нижний Новгород", "Самара", "Ростов-на-Дону", "Уфа",
+    "Пермь", "Воронеж", "Волгоград", "Тюмень", "Омск", "Челябинск",
+]
+
+
+def _articles(rng: random.Random, count: int) -> list[str]:
+    return [f"ART-{rng.randrange(10**6):06d}-{i}" for i in range(count)]
+
+
+def _today_start(tz: ZoneInfo) -> datetime:
+    return datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def wb_stocks(rows: int, seed: int = 42) -> list[dict]:
+    """Ответ /api/v1/supplier/stocks: строка на пару (артикул, склад)."""
+    rng = random.Random(seed)
+    articles = _articles(rng, max(1, rows // len(WAREHOUSES)))
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    result = []
+    for i in range(rows):
+        article = articles[i % len(articles)]
+        result.append({
+            "lastChangeDate": now,
+            "warehouseName": WAREHOUSES[rng.randrange(len(WAREHOUSES))],
+            "supplierArticle": article,
+            "nmId": 100_000 + (i % len(articles)),
+            "barcode": f"2000{rng.randrange(10**9):09d}",
+            "quantity": rng.randrange(0, 500),
+            "inWayToClient": rng.randrange(0, 20),
+            "inWayFromClient": rng.randrange(0, 5),
+            "quantityFull": rng.randrange(0, 600),
+            "category": "Хозяйственные товары",
+            "subject": "Пакеты",
+            "brand": "Valery",
+            "techSize": "0",
+            "Price": rng.randrange(100, 5000),
+            "Discount": rng.randrange(0, 70),
+            "isSupply": True,
+            "isRealization": False,
+            "SCCode": "Tech",
+        })
+    return result
+
+
+def _wb_events(rows: int, seed: int, tz: ZoneInfo, kind: str) -> list[dict]:
+    rng = random.Random(seed)
+    articles = _articles(rng, max(1, min(rows // 20, 5_000)))
+    start = _today_start(tz)
+    result = []
+    for i in range(rows):
+        # ~10% вчерашних записей, ~5% отмен, ~2% дубликатов — как в реальных выгрузках
+        offset = rng.randrange(-86_400 if rng.random() < 0.1 else 0, 86_400)
+        moment = start + timedelta(seconds=offset)
+        srid = f"{kind}-{seed}-{i if rng.random() > 0.02 else max(0, i - 1)}"
+        item = {
+            "date": moment.isoformat(timespec="seconds"),
+            "lastChangeDate": moment.isoformat(timespec="seconds"),
+            "warehouseName": WAREHOUSES[rng.randrange(len(WAREHOUSES))],
+            "countryName": "Россия",
+            "oblastOkrugName": OKRUGS[rng.randrange(len(OKRUGS))],
+            "regionName": CITIES[rng.randrange(len(CITIES))],
+            "supplierArticle": articles[rng.randrange(len(articles))],
+            "nmId": 100_000 + rng.randrange(len(articles)),
+            "barcode": f"2000{rng.randrange(10**9):09d}",
+            "category": "Хозяйственные товары",
+            "subject": "Пакеты",
+            "brand": "Valery",
+            "techSize": "0",
+            "totalPrice": rng.randrange(100, 5000),
+            "discountPercent": rng.randrange(0, 70),
+            "isCancel": rng.random() < 0.05,
+            "gNumber": f"{rng.randrange(10**18)}",
+            "sticker": f"{rng.randrange(10**10)}",
+            "srid": srid,
+        }
+        if kind == "sale":
+            item.update({
+                "saleID": f"S{rng.randrange(10**10)}",
+                "forPay": round(rng.uniform(50, 4000), 2),
+                "finishedPrice": round(rng.uniform(50, 4000), 2),
+            })
+        result.append(item)
+    return result
+
+
+def wb_orders(rows: int, seed: int = 42, tz: ZoneInfo = ZoneInfo("Europe/Moscow")) -> list[dict]:
+    """Ответ /api/v1/supplier/orders за сегодня и вчера."""
+    return _wb_events(rows, seed, tz, "order")
+
+
+def wb_sales(rows: int, seed: int = 43, tz: ZoneInfo = ZoneInfo("Europe/Moscow")) -> list[dict]:
+    """Ответ /api/v1/supplier/sales за сегодня и вчера."""
+    return _wb_events(rows, seed, tz, "sale")
+
+
+def ozon_stocks(rows: int, seed: int = 44) -> dict:
+    """Ответ /v1/analytics/stocks: строка на пару (SKU, кластер)."""
+    rng = random.Random(seed)
+    skus = max(1, rows // len(OZON_CLUSTERS))
+    items = []
+    for i in range(rows):
+        sku_index = i % skus
+        items.append({
+            "sku": 1_000_000 + sku_index,
+            "offer_id": f"OFFER-{sku_index}",
+            "name": f"Товар {sku_index}",
+            "warehouse_name": OZON_CLUSTERS[rng.randrange(len(OZON_CLUSTERS))],
+            "cluster_id": rng.randrange(1, 50),
+            "available_stock_count": rng.randrange(0, 500),
+            "transit_stock_count": rng.randrange(0, 30),
+            "requested_stock_count": rng.randrange(0, 30),
+            "return_from_customer_stock_count": rng.randrange(0, 5),
+            "ads": round(rng.uniform(0, 20), 2),
+            "idc": round(rng.uniform(0, 120), 1),
+        })
+    return {"items": items}
+
+
+def ozon_returns(rows: int, seed: int = 46) -> dict:
+    """Ответ /v3/returns/company/fbo: возвраты примерно для 2% строк остатков."""
+    rng = random.Random(seed)
+    skus = max(1, rows // len(OZON_CLUSTERS))
+    result = []
+    for i in range(max(1, rows // 50)):
+        offer = rng.randrange(skus)
+        result.append({
+            "id": 10**8 + i,
+            "posting_number": f"{10**7 + i}-0001-1",
+            "products": [{"offer_id": f"OFFER-{offer}", "quantity": rng.choice((1, 1, 2))}],
+        })
+    return {"result": result}
+
+
+def ozon_postings(rows: int, seed: int = 45, tz: ZoneInfo = ZoneInfo("Europe/Moscow")) -> dict:
+    """Ответ /v2/posting/fbo/list: ``rows`` отправлений по 1–3 товара."""
+    rng = random.Random(seed)
+    offers = max(1, min(rows // 20, 5_000))
+    start = _today_start(tz)
+    statuses = ["awaiting_packaging", "awaiting_deliver", "delivering", "delivered", "cancelled"]
+    result = []
+    for i in range(rows):
+        moment = (start + timedelta(seconds=rng.randrange(0, 86_400))).astimezone(ZoneInfo("UTC"))
+        stamp = moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        products = []
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            offer = rng.randrange(offers)
+            products.append({
+                "sku": 1_000_000 + offer,
+                "offer_id": f"OFFER-{offer}",
+                "name": f"Товар {offer}",
+                "quantity": rng.choice((1, 1, 1, 2)),
+                "price": f"{rng.randrange(100, 5000)}.00",
+                "currency_code": "RUB",
+            })
+        result.append({
+            "order_id": 10**9 + i,
+            "order_number": f"{10**7 + i}-0001",
+            "posting_number": f"{10**7 + i}-0001-1",
+            "status": statuses[rng.randrange(len(statuses))],
+            "cancel_reason_id": 0,
+            "created_at": stamp,
+            "in_process_at": stamp,
+            "cluster_from": OZON_CLUSTERS[rng.randrange(len(OZON_CLUSTERS))],
+            "cluster_to": OZON_CLUSTERS[rng.randrange(len(OZON_CLUSTERS))],
+            "products": products,
+            "analytics_data": {
+                "city": CITIES[rng.randrange(len(CITIES))],
+                "region": OKRUGS[rng.randrange(len(OKRUGS))],
+                "delivery_type": "PVZ",
+                "is_premium": False,
+                "payment_type_group_name": "Карты оплаты",
+                "warehouse_id": rng.randrange(10**6),
+                "warehouse_name": WAREHOUSES[rng.randrange(len(WAREHOUSES))],
+                "is_legal": False,
+            },
+        })
+    return {"result": result}
@@ -0,0 +1,158 @@
+"""
+Нагрузочный тест дашборда против локального мока API маркетплейсов.
+
+Запускает benchmarks/mock_marketplace.py и настоящее приложение под
+Gunicorn (с изолированными кэшем и БД во временном каталоге), затем
+запрашивает главную страницу из нескольких потоков и печатает
+p50/p95/p99 задержки страницы и число вызовов API мока.
+
+Пример:
+    python -m benchmarks.loadtest --requests 500 --concurrency 16 --rows 10000 --latency-ms 150
+    python -m benchmarks.loadtest --force-every 50 --error-rate 0.1 --json report.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def _wait_for(url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not start in {timeout}s")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="всего запросов к странице")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=3, help="воркеров Gunicorn")
+    parser.add_argument("--app-port", type=int, default=9200)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--ozon-accounts", type=int, default=2)
+    parser.add_argument("--force-every", type=int, default=0, help="каждый N-й запрос с ?force=1 (холодный кэш)")
+    parser.add_argument("--json", help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mp-loadtest-")
+    mock_base = f"http://127.0.0.1:{args.mock_port}"
+    app_base = f"http://127.0.0.1:{args.app_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "SKIP_DOTENV": "1",
+        "WB_STATS_BASE": mock_base,
+        "OZON_BASE": mock_base,
+        "WB_API_TOKEN": "loadtest",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        "CACHE_DIR": os.path.join(workdir, "cache"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(workdir, "metrics"),
+    })
+    for i in range(1, args.ozon_accounts + 1):
+        env[f"OZON_CLIENT_ID_{i}"] = f"client{i}"
+        env[f"OZON_API_KEY_{i}"] = f"key{i}"
+    env.pop(f"OZON_CLIENT_ID_{args.ozon_accounts + 1}", None)
+
+    mock_cmd = [
+        sys.executable, "-m", "benchmarks.mock_marketplace",
+        "--port", str(args.mock_port),
+        "--rows", str(args.rows),
+        "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate),
+    ]
+    app_cmd = [
+        sys.executable, "-m", "gunicorn",
+        "--workers", str(args.workers),
+        "--bind", f"127.0.0.1:{args.app_port}",
+        "--timeout", "120",
+        "wsgi:app",
+    ]
+    mock = subprocess.Popen(mock_cmd, cwd=PROJECT_ROOT, env=env, stderr=subprocess.DEVNULL)
+    app = None
+    try:
+        _wait_for(f"{mock_base}/__stats", 120)
+        app = subprocess.Popen(app_cmd, cwd=PROJECT_ROOT, env=env, stderr=subprocess.DEVNULL)
+        _wait_for(f"{app_base}/metrics", 60)
+        requests.post(f"{mock_base}/__reset", timeout=5)
+
+        latencies: list[float] = []
+        statuses: dict[int, int] = {}
+        lock = threading.Lock()
+
+        def hit(i: int) -> None:
+            force = args.force_every and i % args.force_every == 0
+            start = time.perf_counter()
+            try:
+                status = requests.get(f"{app_base}/", params={"force": "1"} if force else None, timeout=300).status_code
+            except requests.RequestException:
+                status = 0
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(hit, range(1, args.requests + 1)))
+        wall = time.perf_counter() - started
+
+        upstream = requests.get(f"{mock_base}/__stats", timeout=5).json()
+        report = {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "wall_seconds": round(wall, 3),
+            "rps": round(args.requests / wall, 2),
+            "statuses": statuses,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50), 1),
+                "p95": round(_percentile(latencies, 95), 1),
+                "p99": round(_percentile(latencies, 99), 1),
+                "max": round(max(latencies), 1),
+            },
+            "upstream_calls": upstream,
+        }
+    finally:
+        if app is not None:
+            app.terminate()
+            app.wait(timeout=30)
+        mock.terminate()
+        mock.wait(timeout=30)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if set(report["statuses"]) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
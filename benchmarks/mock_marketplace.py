@@ -0,0 +1,199 @@
+"""
+Локальный мок API Wildberries и Ozon для нагрузочного тестирования.
+
+Реализует эндпоинты, которые вызывают app/services/wb_api.py и
+app/services/ozon_api.py, и отдает данные из benchmarks/generators.py.
+Поддерживает задержку, инъекцию ошибок 5xx и 429, пагинацию и размер
+ответа. Списочные методы Ozon, как и настоящий API, отдают полные страницы
+запрошенного размера, а limit больше page_size отклоняют с 400. Счетчики вызовов доступны по GET /__stats, сброс — POST /__reset.
+
+Запуск:
+    python -m benchmarks.mock_marketplace --port 9100 --rows 10000 --latency-ms 200 --error-rate 0.05
+
+Приложение направляется на мок переменными окружения:
+    WB_STATS_BASE=http://127.0.0.1:9100 OZON_BASE=http://127.0.0.1:9100
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from zoneinfo import ZoneInfo
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask, abort, jsonify, request
+
+from benchmarks import generators
+
+PRODUCTS_UPDATED_AT = "2024-01-01T00:00:00Z"
+
+
+def create_mock_app(
+    rows: int = 1_000,
+    latency_ms: float = 0,
+    jitter_ms: float = 0,
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    page_size: int = 1_000,
+    seed: int = 42,
+    tz: ZoneInfo = ZoneInfo("Europe/Moscow"),
+) -> Flask:
+    app = Flask(__name__)
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    calls: Counter = Counter()
+    calls_lock = threading.Lock()
+
+    data = {
+        "wb_stocks": generators.wb_stocks(rows, seed),
+        "wb_orders": generators.wb_orders(rows, seed + 1, tz),
+        "wb_sales": generators.wb_sales(rows, seed + 2, tz),
+        "ozon_stocks": generators.ozon_stocks(rows, seed + 3)["items"],
+        "ozon_postings": generators.ozon_postings(rows, seed + 4, tz)["result"],
+        "ozon_returns": generators.ozon_returns(rows, seed + 5)["result"],
+    }
+    stocks_by_sku: dict[int, list] = {}
+    for item in data["ozon_stocks"]:
+        stocks_by_sku.setdefault(item["sku"], []).append(item)
+    products = [
+        {"product_id": sku, "offer_id": items[0]["offer_id"], "archived": False, "updated_at": PRODUCTS_UPDATED_AT}
+        for sku, items in sorted(stocks_by_sku.items())
+    ]
+
+    @app.before_request
+    def inject_faults():
+        if request.path.startswith("/__"):
+            return None
+        with calls_lock:
+            calls[request.path] += 1
+        with rng_lock:
+            delay = latency_ms + rng.uniform(0, jitter_ms)
+            roll = rng.random()
+        if delay:
+            time.sleep(delay / 1000)
+        if roll < rate_limit_rate:
+            return jsonify({"message": "Too Many Requests"}), 429
+        if roll < rate_limit_rate + error_rate:
+            return jsonify({"message": "Internal Server Error"}), 500
+        return None
+
+    def _limit(body: dict) -> int:
+        limit = int(body.get("limit", 1000))
+        if not 0 < limit <= page_size:
+            abort(400)
+        return limit
+
+    # --- Wildberries ---
+
+    @app.get("/api/v1/supplier/stocks")
+    def wb_stocks():
+        return jsonify(data["wb_stocks"])
+
+    @app.get("/api/v1/supplier/orders")
+    def wb_orders():
+        return jsonify(data["wb_orders"])
+
+    @app.get("/api/v1/supplier/sales")
+    def wb_sales():
+        return jsonify(data["wb_sales"])
+
+    # --- Ozon ---
+
+    @app.post("/v1/analytics/stocks")
+    def ozon_analytics_stocks():
+        skus = (request.get_json(silent=True) or {}).get("skus", [])
+        if len(skus) > 100:
+            abort(400)
+        items = [item for sku in skus for item in stocks_by_sku.get(int(sku), [])]
+        return jsonify({"items": items})
+
+    @app.post("/v2/posting/fbo/list")
+    def ozon_postings():
+        body = request.get_json(silent=True) or {}
+        limit = _limit(body)
+        offset = int(body.get("offset", 0))
+        status = (body.get("filter") or {}).get("status")
+        postings = data["ozon_postings"]
+        if status:
+            postings = [p for p in postings if p["status"] == status]
+        return jsonify({"result": postings[offset : offset + limit]})
+
+    @app.post("/v3/returns/company/fbo")
+    def ozon_returns():
+        body = request.get_json(silent=True) or {}
+        limit = _limit(body)
+        offset = int(body.get("offset", 0))
+        return jsonify({"result": data["ozon_returns"][offset : offset + limit]})
+
+    @app.post("/v3/product/list")
+    def ozon_product_list():
+        body = request.get_json(silent=True) or {}
+        limit = _limit(body)
+        start = int(body.get("last_id") or 0)
+        page = products[start : start + limit]
+        last_id = str(start + limit) if start + limit < len(products) else ""
+        return jsonify({"result": {"items": page, "total": len(products), "last_id": last_id}})
+
+    @app.post("/v3/product/info/list")
+    def ozon_product_info():
+        ids = (request.get_json(silent=True) or {}).get("product_id", [])
+        items = [
+            {
+                "id": pid,
+                "offer_id": stocks_by_sku[pid][0]["offer_id"],
+                "sources": [{"sku": pid, "source": "sds"}],
+                "updated_at": PRODUCTS_UPDATED_AT,
+            }
+            for pid in ids
+            if pid in stocks_by_sku
+        ]
+        return jsonify({"items": items})
+
+    # --- Служебные ---
+
+    @app.get("/__stats")
+    def stats():
+        with calls_lock:
+            return jsonify({"calls": dict(calls), "total": sum(calls.values())})
+
+    @app.post("/__reset")
+    def reset():
+        with calls_lock:
+            calls.clear()
+        return jsonify({"ok": True})
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--rows", type=int, default=1_000, help="строк в каждом наборе данных")
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка каждого ответа")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="случайная добавка к задержке")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--page-size", type=int, default=1_000, help="максимальный limit списочных методов Ozon")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    app = create_mock_app(
+        rows=args.rows,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        page_size=args.page_size,
+        seed=args.seed,
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
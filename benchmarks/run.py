@@ -0,0 +1,197 @@
+"""
+Офлайн-бенчмарк цепочки обработки данных WB/Ozon.
+
+Для каждого размера (1k, 100k, 1m строк) генерирует синтетические ответы
+API (см. benchmarks/generators.py) и замеряет время и пиковую память
+этапов: decode (json.loads), validation (Pydantic), aggregation
+(функции сервисов), presenter и render (шаблон dashboard.html).
+
+Результаты пишутся в JSON; при указании --baseline сравниваются с
+сохраненным эталоном, и при регрессии скрипт завершается с кодом 1.
+
+Примеры:
+    python -m benchmarks.run --sizes 1k,100k --output bench.json
+    python -m benchmarks.run --sizes 1k --baseline benchmarks/baseline.json
+    python -m benchmarks.run --sizes 1k,100k --output benchmarks/baseline.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("CACHE_WARMUP_ON_BOOT", "0")
+
+from benchmarks import generators
+from app import create_app
+from app.presenters import prepare_dashboard_context
+from app.schemas import WBStockItem, WBOrderItem, WBSaleItem, OzonStockResponse, OzonPostingResponse
+from app.services import wb_api, ozon_api
+
+
+TZ = ZoneInfo("Europe/Moscow")
+
+
+def _measure(fn, repeat: int, trace_memory: bool) -> tuple[object, dict]:
+    """Выполняет ``fn`` repeat раз (лучшее время) и отдельно — под tracemalloc."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    stats = {"seconds": round(best, 6)}
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats["peak_mb"] = round(peak / 2**20, 3)
+    return result, stats
+
+
+def run_size(app, rows: int, seed: int, repeat: int, trace_memory: bool) -> dict:
+    payloads = {
+        "wb_stocks": generators.wb_stocks(rows, seed),
+        "wb_orders": generators.wb_orders(rows, seed + 1, TZ),
+        "wb_sales": generators.wb_sales(rows, seed + 2, TZ),
+        "ozon_stocks": generators.ozon_stocks(rows, seed + 3),
+        "ozon_postings": generators.ozon_postings(rows, seed + 4, TZ),
+    }
+    raw = {name: json.dumps(data, ensure_ascii=False).encode() for name, data in payloads.items()}
+    del payloads
+
+    validators = {
+        "wb_stocks": lambda data: [WBStockItem.model_validate(item) for item in data],
+        "wb_orders": lambda data: [WBOrderItem.model_validate(item) for item in data],
+        "wb_sales": lambda data: [WBSaleItem.model_validate(item) for item in data],
+        "ozon_stocks": lambda data: OzonStockResponse.model_validate(data).items,
+        "ozon_postings": lambda data: OzonPostingResponse.model_validate(data).result,
+    }
+
+    report: dict[str, dict] = {}
+    validated: dict[str, object] = {}
+    for name, body in raw.items():
+        decoded, decode_stats = _measure(lambda: json.loads(body), repeat, trace_memory)
+        items, validation_stats = _measure(lambda: validators[name](decoded), repeat, trace_memory)
+        validated[name] = items
+        report[name] = {"bytes": len(body), "decode": decode_stats, "validation": validation_stats}
+        del decoded
+
+    aggregations = {
+        "wb_stocks": lambda: wb_api.aggregate_stocks(validated["wb_stocks"]),
+        "wb_today": lambda: wb_api.aggregate_today(
+            wb_api.deduplicate_items(validated["wb_orders"], TZ, "srid"),
+            wb_api.deduplicate_items(validated["wb_sales"], TZ, "srid"),
+            TZ,
+        ),
+        "ozon_stocks": lambda: ozon_api.merge_account_stocks([ozon_api.aggregate_stock_items(validated["ozon_stocks"])]),
+        "ozon_today": lambda: ozon_api.merge_account_today([ozon_api.aggregate_postings(validated["ozon_postings"], TZ)]),
+    }
+    aggregated: dict[str, dict] = {}
+    for name, fn in aggregations.items():
+        aggregated[name], stats = _measure(fn, repeat, trace_memory)
+        report.setdefault(name, {})["aggregation"] = stats
+    del validated
+
+    wb_data = {"stocks": aggregated["wb_stocks"], "today": aggregated["wb_today"]}
+    ozon_data = {"stocks": aggregated["ozon_stocks"], "today": aggregated["ozon_today"]}
+    now = datetime.now(TZ)
+    context, presenter_stats = _measure(
+        lambda: prepare_dashboard_context(wb_data=wb_data, ozon_data=ozon_data, now=now),
+        repeat,
+        trace_memory,
+    )
+    # Поля, которые dashboard_index добавляет к контексту презентера
+    context.update(selected_day=now.date(), today=now.date(), day_label="сегодня", updates_stream=False)
+    with app.test_request_context("/"):
+        from flask import render_template
+
+        html, render_stats = _measure(lambda: render_template("dashboard.html", **context), repeat, trace_memory)
+    report["dashboard"] = {"presenter": presenter_stats, "render": render_stats, "html_bytes": len(html.encode())}
+
+    for name, stages in report.items():
+        for stage, stats in stages.items():
+            if isinstance(stats, dict) and stats.get("seconds"):
+                stats["rows_per_sec"] = round(rows / stats["seconds"])
+    return report
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Возвращает список регрессий по времени и памяти относительно эталона."""
+    regressions = []
+    for size, datasets in results["results"].items():
+        for dataset, stages in datasets.items():
+            for stage, stats in stages.items():
+                base = baseline.get("results", {}).get(size, {}).get(dataset, {}).get(stage)
+                if not isinstance(stats, dict) or not isinstance(base, dict):
+                    continue
+                # Этапы короче миллисекунды слишком шумные для сравнения
+                if base["seconds"] >= 0.001 and stats["seconds"] > base["seconds"] * (1 + tolerance):
+                    regressions.append(f"{size}/{dataset}/{stage}: {base['seconds']:.4f}s -> {stats['seconds']:.4f}s")
+                if "peak_mb" in stats and "peak_mb" in base and stats["peak_mb"] > base["peak_mb"] * (1 + tolerance) + 1:
+                    regressions.append(f"{size}/{dataset}/{stage}: {base['peak_mb']:.1f}MB -> {stats['peak_mb']:.1f}MB")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,100k,1m", help="размеры через запятую: 1k, 100k, 1m")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на этап (берется лучшее время)")
+    parser.add_argument("--no-memory", action="store_true", help="не замерять пиковую память")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="JSON с эталонными результатами для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    app = create_app()
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "created_at": datetime.now(TZ).isoformat(timespec="seconds"),
+        },
+        "results": {},
+    }
+    for size in args.sizes.split(","):
+        size = size.strip().lower()
+        rows = generators.SIZES[size]
+        print(f"== {size} ({rows} rows)", file=sys.stderr)
+        results["results"][size] = run_size(app, rows, args.seed, args.repeat, not args.no_memory)
+        for dataset, stages in results["results"][size].items():
+            for stage, stats in stages.items():
+                if isinstance(stats, dict):
+                    peak = f" peak={stats['peak_mb']:.1f}MB" if "peak_mb" in stats else ""
+                    print(f"  {dataset:14} {stage:11} {stats['seconds']:9.4f}s{peak}", file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,7 +3,9 @@ from dotenv import load_dotenv
 
 
 # Переопределяем переменные окружения значениями из .env
-load_dotenv(override=True)
+# (SKIP_DOTENV=1 отключает это, например для нагрузочных тестов на моке API)
+if os.environ.get("SKIP_DOTENV") != "1":
+    load_dotenv(override=True)
 
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -16,8 +18,24 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite: сколько ждать блокировку записи и режим fsync (см. app/utils/storage.py)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # Записи из запросов идут через поток единственного писателя (только SQLite)
+    DB_WRITE_QUEUE = os.environ.get("DB_WRITE_QUEUE", "1") == "1"
+    # Postgres: пул соединений на воркер и ограничение времени запроса
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT_SECONDS = int(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+    DB_POOL_RECYCLE_SECONDS = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
     WB_API_TOKEN = os.environ.get("WB_API_TOKEN", "")
 
+    # Базовые URL API; переопределяются, например, для локального мок-сервера
+    WB_STATS_BASE = os.environ.get("WB_STATS_BASE", "https://statistics-api.wildberries.ru")
+    OZON_BASE = os.environ.get("OZON_BASE", "https://api-seller.ozon.ru")
+
     # --- Ozon: поддержка нескольких магазинов ---
     OZON_ACCOUNTS = []
     i = 1
@@ -38,14 +56,83 @@ class Config:
         i += 1
     # --- Конец блока Ozon ---
 
+    # Каталог товаров Ozon для аккаунтов без OZON_SKUS_n обновляется редко — раз в 6 часов
+    OZON_CATALOG_TTL_SECONDS = int(os.environ.get("OZON_CATALOG_TTL_SECONDS", "21600"))
+    # Возвраты Ozon (стрелка «в пути от клиента») меняются медленно — кэшируются на час
+    OZON_RETURNS_TTL_SECONDS = int(os.environ.get("OZON_RETURNS_TTL_SECONDS", "3600"))
+    # Глубина отслеживания статусов отправлений Ozon для подсчета выкупов, дней
+    OZON_DELIVERY_LOOKBACK_DAYS = int(os.environ.get("OZON_DELIVERY_LOOKBACK_DAYS", "14"))
+
     TIMEZONE = os.environ.get("TIMEZONE", "Europe/Moscow")
 
+    # Circuit breaker для эндпоинтов WB/Ozon: после N отказов подряд данные
+    # сразу берутся из резервного кэша, пробный запрос — через паузу с ростом до максимума
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "3"))
+    CIRCUIT_BACKOFF_BASE_SECONDS = float(os.environ.get("CIRCUIT_BACKOFF_BASE_SECONDS", "30"))
+    CIRCUIT_BACKOFF_MAX_SECONDS = float(os.environ.get("CIRCUIT_BACKOFF_MAX_SECONDS", "600"))
+
+    # Запись ответов API на диск (record) или работа по записям без сети (replay),
+    # см. app/services/http_recording.py; HTTP_REPLAY_SPEED=0 — без задержек
+    HTTP_RECORD_MODE = os.environ.get("HTTP_RECORD_MODE", "")
+    HTTP_RECORD_DIR = os.environ.get("HTTP_RECORD_DIR") or os.path.join(BASE_DIR, "..", ".recordings")
+    HTTP_REPLAY_SPEED = float(os.environ.get("HTTP_REPLAY_SPEED", "1.0"))
+
     # Кэш для API-запросов (секунды) — 30 минут по умолчанию
     CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", "1800"))
 
-    # Настройки Flask-Caching
-    CACHE_TYPE = "FileSystemCache"
-    CACHE_DIR = os.path.join(BASE_DIR, "..", ".cache")
+    # История остатков по складам хранит только изменения; полный срез — не реже раза в N часов
+    STOCK_KEYFRAME_INTERVAL_HOURS = int(os.environ.get("STOCK_KEYFRAME_INTERVAL_HOURS", "24"))
+    # Скорость заказов для запаса в днях (stock_cover) — среднее за последние N суток
+    STOCK_VELOCITY_DAYS = int(os.environ.get("STOCK_VELOCITY_DAYS", "14"))
+
+    # Хранение истории (scripts/retention.py): снимки старой таблицы stock_snapshots — N дней,
+    # дальше дневные min/max/close (stock_deltas сворачиваются так же перед удалением, см.
+    # RETENTION_STOCK_HISTORY_DAYS); дневные сводки — N дней (0 — бессрочно); строки kv_store,
+    # не обновлявшиеся N дней, удаляются. Удаление идет пачками по RETENTION_BATCH_SIZE.
+    RETENTION_RAW_SNAPSHOT_DAYS = int(os.environ.get("RETENTION_RAW_SNAPSHOT_DAYS", "14"))
+    RETENTION_DAILY_DAYS = int(os.environ.get("RETENTION_DAILY_DAYS", "0"))
+    RETENTION_KV_DAYS = int(os.environ.get("RETENTION_KV_DAYS", "7"))
+    # История остатков по складам (stock_deltas): N дней, считая от keyframe перед границей
+    RETENTION_STOCK_HISTORY_DAYS = int(os.environ.get("RETENTION_STOCK_HISTORY_DAYS", "90"))
+    RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "1000"))
+    RETENTION_BATCH_PAUSE_SECONDS = float(os.environ.get("RETENTION_BATCH_PAUSE_SECONDS", "0.05"))
+    RETENTION_VACUUM_INTERVAL_DAYS = int(os.environ.get("RETENTION_VACUUM_INTERVAL_DAYS", "7"))
+    # Почасовые суммы заказов за последние N дней сверяются с order_events (0 — не сверять)
+    RETENTION_ROLLUP_RECONCILE_DAYS = int(os.environ.get("RETENTION_ROLLUP_RECONCILE_DAYS", "8"))
+
+    # Токен администратора (заголовок X-Admin-Token или параметр admin_token)
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+    # Срок кэширования файлов /assets (в имени — хэш содержимого), секунды
+    ASSETS_MAX_AGE = int(os.environ.get("ASSETS_MAX_AGE", str(365 * 24 * 3600)))
+
+    # Профилирование медленных запросов администратора (cProfile/pstats)
+    PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "1.0"))
+    PROFILE_SLOW_MS = int(os.environ.get("PROFILE_SLOW_MS", "500"))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(BASE_DIR, "..", ".profiles")
+    PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+
+    # Настройки Flask-Caching: общий для воркеров кэш в SQLite (см. app/utils/sqlite_cache.py);
+    # CACHE_TYPE=FileSystemCache возвращает прежний файловый бэкенд, а
+    # CACHE_TYPE=app.utils.redis_cache.RedisCache — общий кэш нескольких хостов в Redis
+    CACHE_TYPE = os.environ.get("CACHE_TYPE", "app.utils.sqlite_cache.SQLiteCache")
+    CACHE_DIR = os.environ.get("CACHE_DIR") or os.path.join(BASE_DIR, "..", ".cache")
     CACHE_DEFAULT_TIMEOUT = CACHE_TTL_SECONDS
+    CACHE_THRESHOLD = int(os.environ.get("CACHE_THRESHOLD", "500"))
+    CACHE_SQLITE_MAX_BYTES = int(os.environ.get("CACHE_SQLITE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Redis: адрес (memory://<имя> — FakeRedis в памяти процесса) и канал уведомлений о новых версиях
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_REDIS_CHANNEL = os.environ.get("CACHE_REDIS_CHANNEL", "mp-dashboard:cache")
+    CACHE_KEY_PREFIX = os.environ.get("CACHE_KEY_PREFIX", "mp-dashboard:")
+    # Загрузку источника при промахе выполняет один процесс; остальные ждут его результат
+    FETCH_LOCK_TIMEOUT_SECONDS = int(os.environ.get("FETCH_LOCK_TIMEOUT_SECONDS", "120"))
+    FETCH_LOCK_WAIT_SECONDS = int(os.environ.get("FETCH_LOCK_WAIT_SECONDS", "60"))
+    # Длительность одного потока SSE /api/updates; браузер переподключается сам
+    UPDATES_STREAM_SECONDS = int(os.environ.get("UPDATES_STREAM_SECONDS", "300"))
+    # При старте воркера заполнять кэш снимками из БД и сразу обновлять их в фоне
+    CACHE_WARMUP_ON_BOOT = os.environ.get("CACHE_WARMUP_ON_BOOT", "1") == "1"
+    # Число параллельных загрузок в scripts/refresh.py
+    REFRESH_WORKERS = int(os.environ.get("REFRESH_WORKERS", "4"))
 
 
@@ -0,0 +1,27 @@
+"""
+Конфигурация Gunicorn.
+
+Задает общий каталог для метрик Prometheus, чтобы /metrics агрегировал
+значения всех воркеров. Файл подхватывается Gunicorn автоматически при
+запуске из корня проекта.
+"""
+import os
+import shutil
+
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(BASE_DIR, "..", ".metrics"))
+
+
+def on_starting(server):
+    # Метрики прошлого запуска не должны смешиваться с текущими
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
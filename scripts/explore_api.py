@@ -10,6 +10,8 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+os.environ.setdefault("CACHE_WARMUP_ON_BOOT", "0")
+
 from app import create_app
 
 # --- WB API ---
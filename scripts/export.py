@@ -0,0 +1,52 @@
+"""
+Выгружает данные в CSV или NDJSON (см. app/services/export.py).
+
+Наборы: orders, sales (за сегодня), stock_history, stock_daily, daily_metrics.
+    python scripts/export.py stock_history --from 2024-06-01 --to 2024-06-30 --sku art1,art2 > stocks.csv
+    python scripts/export.py daily_metrics --format ndjson --output metrics.ndjson
+"""
+import argparse
+import os
+import sys
+
+# Ensure project root is on sys.path when running via systemd
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("CACHE_WARMUP_ON_BOOT", "0")
+
+from app import create_app
+from app.services.export import DATASETS, FORMATS, export, parse_filter
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", choices=DATASETS)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--from", dest="start", help="первый день, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", help="последний день, YYYY-MM-DD")
+    parser.add_argument("--sku", help="SKU через запятую")
+    parser.add_argument("--marketplace", choices=("wb", "ozon"))
+    parser.add_argument("--output", help="файл для выгрузки (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    try:
+        flt = parse_filter({"from": args.start, "to": args.end, "sku": args.sku, "marketplace": args.marketplace})
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    app = create_app()
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        with app.app_context():
+            for chunk in export(args.dataset, args.format, flt):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,15 @@
-from zoneinfo import ZoneInfo
+"""
+Обновляет данные дашборда из API маркетплейсов (см. app/services/refresh.py).
+
+Источники загружаются параллельно, минуя кэш; результаты кладутся в кэш,
+резервный кэш и историю. Код возврата 1, если хоть один источник не обновился.
+    python scripts/refresh.py
+    python scripts/refresh.py --sources wb_stocks,ozon_stocks --accounts 123456
+    python scripts/refresh.py --json --no-history
+"""
+import argparse
+import json
+import logging
 import os
 import sys
 
@@ -7,60 +18,50 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from app import create_app
-from app.services.wb_api import fetch_stocks as wb_stocks, fetch_today_metrics as wb_today
-from app.services.ozon_api import fetch_stocks as oz_stocks, fetch_today_metrics as oz_today
-from app.models import db, StockSnapshot, DailyMetric
+os.environ.setdefault("CACHE_WARMUP_ON_BOOT", "0")
 
+from app import create_app
+from app.services.refresh import SOURCE_NAMES, run_refresh
 
-def main() -> None:
-    app = create_app()
-    with app.app_context():
-        from flask import current_app
-        from datetime import datetime
 
-        tz = ZoneInfo(current_app.config.get("TIMEZONE", "Europe/Moscow"))
-        ttl_short = int(current_app.config.get("CACHE_TTL_SECONDS", 120))
+def _csv(value: str) -> set[str]:
+    return {item.strip() for item in value.split(",") if item.strip()}
 
-        wb_token = current_app.config.get("WB_API_TOKEN", "")
-        ozon_client_id = current_app.config.get("OZON_CLIENT_ID", "")
-        ozon_api_key = current_app.config.get("OZON_API_KEY", "")
-        ozon_skus = current_app.config.get("OZON_SKUS", [])
 
-        # Force refresh bypassing cache
-        wb_st = wb_stocks(wb_token, ttl_seconds=ttl_short * 2, force=True)
-        wb_td = wb_today(wb_token, tz, ttl_seconds=ttl_short, force=True)
-        oz_st = oz_stocks(ozon_client_id, ozon_api_key, ozon_skus, ttl_seconds=ttl_short * 2, force=True)
-        oz_td = oz_today(ozon_client_id, ozon_api_key, tz, ttl_seconds=ttl_short, force=True)
+def _sources(value: str) -> set[str]:
+    names = _csv(value)
+    unknown = names - set(SOURCE_NAMES)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown sources: {', '.join(sorted(unknown))}")
+    return names
 
-        # Persist snapshots
-        try:
-            # WB stocks per SKU
-            for sku, qty in (wb_st.get("skus") or []):
-                db.session.add(StockSnapshot(marketplace="wb", warehouse_name="TOTAL", sku=sku, quantity=int(qty)))
-            # OZON stocks per SKU
-            for sku, qty in (oz_st.get("skus") or []):
-                db.session.add(StockSnapshot(marketplace="ozon", warehouse_name="TOTAL", sku=sku, quantity=int(qty)))
 
-            # Update daily metrics
-            def upsert_daily(mp: str, ordered: int, purchased: int) -> None:
-                today_local = datetime.now(tz).date()
-                row = DailyMetric.query.filter_by(marketplace=mp, date=today_local).first()
-                if not row:
-                    row = DailyMetric(marketplace=mp, date=today_local, ordered_count=0, purchased_count=0)
-                row.ordered_count = int(ordered or 0)
-                row.purchased_count = int(purchased or 0)
-                db.session.add(row)
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=_sources, help=f"источники через запятую: {', '.join(SOURCE_NAMES)}")
+    parser.add_argument("--accounts", type=_csv, help="client_id аккаунтов Ozon и/или wb через запятую")
+    parser.add_argument("--workers", type=int, help="число параллельных загрузок (по умолчанию REFRESH_WORKERS)")
+    parser.add_argument("--no-history", action="store_true", help="не писать историю остатков и дневные метрики")
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    args = parser.parse_args()
 
-            upsert_daily("wb", wb_td.get("ordered", 0), wb_td.get("purchased", 0))
-            upsert_daily("ozon", oz_td.get("ordered", 0), oz_td.get("purchased", 0))
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    app = create_app()
+    try:
+        reports = run_refresh(app, args.sources, args.accounts, args.workers, history=not args.no_history)
+    except Exception as exc:
+        logging.exception("Refresh failed to persist results: %s", exc)
+        return 2
 
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+    if args.json:
+        print(json.dumps([report._asdict() for report in reports], ensure_ascii=False))
+    else:
+        print(f"{'source':<14}{'account':<14}{'status':<8}{'seconds':>9}{'rows':>8}")
+        for r in reports:
+            status = "ok" if r.ok else "error"
+            print(f"{r.name:<14}{r.account:<14}{status:<8}{r.seconds:>9.2f}{r.rows:>8}" + (f"  {r.error}" if r.error else ""))
+    return 0 if reports and all(r.ok for r in reports) else 1
 
 
 if __name__ == "__main__":
-    main()
-
-
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""
+Применяет политики хранения истории (см. app/services/retention.py).
+
+Запускать раз в сутки, например таймером systemd или cron:
+    python scripts/retention.py
+    python scripts/retention.py --vacuum   # принудительный VACUUM
+"""
+import argparse
+import json
+import os
+import sys
+
+# Ensure project root is on sys.path when running via systemd
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault("CACHE_WARMUP_ON_BOOT", "0")
+
+from app import create_app
+from app.services.retention import run_retention
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vacuum", action="store_true", help="выполнить VACUUM независимо от интервала")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        report = run_retention(force_vacuum=args.vacuum)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Скачивает сторонние CSS/JS в app/static/vendor (список — app/utils/assets.py:VENDOR).
+
+Файлы коммитятся в репозиторий: страница не зависит от CDN, а маршрут
+/assets отдает их с хэшем содержимого в имени и долгим кэшированием.
+    python scripts/vendor_assets.py            # скачать недостающие
+    python scripts/vendor_assets.py --force    # перекачать все
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+# Ensure project root is on sys.path when running via systemd
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import requests
+
+from app.utils.assets import VENDOR
+
+STATIC_DIR = os.path.join(PROJECT_ROOT, "app", "static")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="перекачать уже скачанные файлы")
+    args = parser.parse_args()
+
+    failed = 0
+    for name, url in VENDOR.items():
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.exists(path) and not args.force:
+            print(f"{name}: present")
+            continue
+        try:
+            resp = requests.get(url, timeout=30)
+            resp.raise_for_status()
+        except requests.RequestException as exc:
+            print(f"{name}: failed ({exc})", file=sys.stderr)
+            failed += 1
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(resp.content)
+        print(f"{name}: {len(resp.content)} bytes, sha256 {hashlib.sha256(resp.content).hexdigest()}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
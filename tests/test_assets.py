@@ -0,0 +1,23 @@
+from flask import Flask, render_template_string
+from app.utils.assets import VENDOR, init_assets
+
+
+def test_assets_are_fingerprinted_and_immutable(tmp_path):
+    """Проверяет имя с хэшем содержимого, заголовок immutable и запасной адрес CDN."""
+    static = tmp_path / "static"
+    (static / "js").mkdir(parents=True)
+    (static / "js" / "app.js").write_text("console.log(1)")
+    app = Flask(__name__, static_folder=str(static))
+    init_assets(app)
+
+    with app.test_request_context():
+        url = render_template_string("{{ asset_url('js/app.js') }}")
+        assert url.startswith("/assets/js/app.") and url.endswith(".js")
+        assert render_template_string("{{ asset_url('vendor/bootstrap.min.css') }}") == VENDOR["vendor/bootstrap.min.css"]
+
+    client = app.test_client()
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.data == b"console.log(1)"
+    assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert client.get("/assets/js/app.000000000000.js").status_code == 404
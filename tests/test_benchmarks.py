@@ -0,0 +1,66 @@
+import requests
+from zoneinfo import ZoneInfo
+from flask import Flask
+from benchmarks import generators
+from benchmarks.run import compare
+from benchmarks.mock_marketplace import create_mock_app
+from app.schemas import WBStockItem, WBOrderItem, OzonStockResponse, OzonPostingResponse
+from app.services import http_client, ozon_api
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+def test_generators_are_seeded_and_valid():
+    """Проверяет, что генераторы детерминированы и проходят валидацию схемами."""
+    assert generators.wb_orders(50, seed=1, tz=MOSCOW_TZ) == generators.wb_orders(50, seed=1, tz=MOSCOW_TZ)
+    assert generators.wb_orders(50, seed=1, tz=MOSCOW_TZ) != generators.wb_orders(50, seed=2, tz=MOSCOW_TZ)
+
+    for item in generators.wb_stocks(50):
+        WBStockItem.model_validate(item)
+    for item in generators.wb_orders(50, tz=MOSCOW_TZ):
+        WBOrderItem.model_validate(item)
+    assert len(OzonStockResponse.model_validate(generators.ozon_stocks(50)).items) == 50
+    assert len(OzonPostingResponse.model_validate(generators.ozon_postings(50, tz=MOSCOW_TZ)).result) == 50
+
+
+def test_compare_flags_regressions():
+    """Проверяет, что сравнение с эталоном ловит замедление и рост памяти."""
+    baseline = {"results": {"1k": {"wb_stocks": {"decode": {"seconds": 0.01, "peak_mb": 10}}}}}
+    ok = {"results": {"1k": {"wb_stocks": {"decode": {"seconds": 0.011, "peak_mb": 10.5}}}}}
+    slow = {"results": {"1k": {"wb_stocks": {"decode": {"seconds": 0.02, "peak_mb": 30}}}}}
+    assert compare(ok, baseline, 0.25) == []
+    assert len(compare(slow, baseline, 0.25)) == 2
+
+
+
+def test_mock_marketplace_paginates_and_injects_errors():
+    """Проверяет пагинацию мока, подсчет вызовов и инъекцию ошибок."""
+    client = create_mock_app(rows=30, page_size=10).test_client()
+    pages = [client.post("/v2/posting/fbo/list", json={"limit": 10, "offset": o}).get_json()["result"] for o in (0, 10, 20, 30)]
+    assert [len(p) for p in pages] == [10, 10, 10, 0]
+    assert client.get("/__stats").get_json()["calls"]["/v2/posting/fbo/list"] == 4
+    assert client.post("/v2/posting/fbo/list", json={"limit": 1000}).status_code == 400
+
+    failing = create_mock_app(rows=5, error_rate=1.0).test_client()
+    assert failing.get("/api/v1/supplier/stocks").status_code == 500
+
+
+def test_app_reads_all_postings_through_mock(monkeypatch):
+    """Проверяет, что загрузчик приложения читает через мок все отправления при малой странице."""
+    mock = create_mock_app(rows=25, page_size=10).test_client()
+
+    def post(url, json=None, **kwargs):
+        answer = mock.post(url.removeprefix("http://mock"), json=json)
+        resp = requests.Response()
+        resp.status_code = answer.status_code
+        resp._content = answer.data
+        return resp
+
+    monkeypatch.setattr(http_client.requests, "post", post)
+    monkeypatch.setattr(ozon_api, "PAGE_SIZE", 10)
+    app = Flask(__name__)
+    app.config["OZON_BASE"] = "http://mock"
+    with app.app_context():
+        postings = ozon_api._fetch_postings("client1", "key", "2000-01-01T00:00:00Z")
+    assert len(postings) == 25
+    assert mock.get("/__stats").get_json()["calls"]["/v2/posting/fbo/list"] == 3
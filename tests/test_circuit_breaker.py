@@ -0,0 +1,90 @@
+import pytest
+from unittest.mock import MagicMock
+from flask import Flask
+from app import cache
+from app.services import wb_api, http_client
+from app.utils import circuit_breaker, persistent_cache
+from app.utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def app():
+    """Создает экземпляр Flask-приложения для тестов."""
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    cache.init_app(app)
+    circuit_breaker.reset_breakers()
+    return app
+
+
+def test_breaker_opens_and_probes(monkeypatch):
+    """
+    Проверяет переходы автомата: размыкание после порога ошибок,
+    пробный запрос после паузы и удвоение паузы при неудачной пробе.
+    """
+    clock = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("test", failure_threshold=2, backoff_base=10, backoff_max=60)
+
+    breaker.record_failure("timeout")
+    assert breaker.state == CLOSED
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock[0] += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Одновременно пропускается только одна проба
+    assert not breaker.allow()
+
+    breaker.record_failure("HTTP 503")
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["retry_in"] == 20
+
+    clock[0] += 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failures"] == 0
+
+
+def test_probe_failing_with_any_exception_is_recorded(app, monkeypatch):
+    """Проверяет, что проба, упавшая не сетевой ошибкой, снова размыкает автомат, а не занимает пробу навсегда."""
+    clock = [100.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(http_client.requests, "get", MagicMock(side_effect=ValueError("bad url")))
+    breaker = circuit_breaker.get_breaker("wb:stocks")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("timeout")
+
+    clock[0] += breaker.backoff_base
+    with pytest.raises(ValueError):
+        http_client.call("wb:stocks", "get", "http://wb")
+    assert breaker.state == OPEN
+
+    clock[0] += breaker.backoff_max
+    assert breaker.allow()
+
+
+def test_open_breaker_serves_stale_without_request(app, monkeypatch):
+    """
+    Проверяет, что при разомкнутом автомате WB-остатки сразу отдаются
+    из резервного кэша с пометкой stale, без обращения к API.
+    """
+    mock_get = MagicMock(side_effect=AssertionError("API must not be called"))
+    monkeypatch.setattr(http_client.requests, "get", mock_get)
+    snapshot = {"fetched_at": "2024-01-01T10:00:00+00:00", "total": 42}
+    monkeypatch.setattr(persistent_cache, "load_from_persistent_cache", lambda key: snapshot)
+
+    breaker = circuit_breaker.get_breaker("wb:stocks")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("timeout")
+
+    with app.app_context():
+        cache.clear()
+        result = wb_api.fetch_stocks("fake_token")
+
+    assert mock_get.call_count == 0
+    assert result["total"] == 42
+    assert result["stale"] is True
@@ -0,0 +1,52 @@
+import json
+from datetime import datetime
+from app.utils.compact import EventSummaryBuilder, EventSummaryView, StockTableBuilder, StockView
+
+
+def test_event_summary_is_bounded_and_survives_json():
+    """Проверяет top-K, гистограмму по часам, последние события, слияние и чтение после json."""
+    first = EventSummaryBuilder(top_k=2, latest=3)
+    for minute in range(100):
+        first.add("art1", datetime(2024, 5, 1, 9 + minute // 60, minute % 60), "Москва", "Коледино")
+    for minute in range(5):
+        first.add("art1", datetime(2024, 5, 1, 8, minute), f"Город {minute}", "Казань")
+    second = EventSummaryBuilder(top_k=2, latest=3)
+    second.add("art1", datetime(2024, 5, 1, 23, 0), "Казань", "Коледино")
+
+    merged = EventSummaryBuilder(top_k=2, latest=3)
+    merged.extend(first.build())
+    merged.extend(second.build())
+    table = merged.build()
+    assert len(table["strings"]) <= 2 * 2 + 3 * 2
+
+    summary = EventSummaryView(json.loads(json.dumps(table)))["art1"]
+    assert summary.count == 106
+    assert summary.hours[8:11] == [5, 60, 40]
+    assert summary.top_cities[0] == ("Москва", 100)
+    assert summary.top_warehouses[0] == ("Коледино", 101)
+    assert [e.time for e in summary.latest] == ["23:00", "10:39", "10:38"]
+    assert summary.latest[0].city == "Казань"
+
+
+def test_event_summary_reads_legacy_event_tables():
+    """Проверяет чтение прежних таблиц событий (снимки в kv_store до перехода на сводки)."""
+    legacy = {"strings": ["Москва", "Коледино"], "rows": {"art1": [[545, 0, 1], [725, 0, 1]]}}
+    summary = EventSummaryView(legacy)["art1"]
+    assert summary.count == 2
+    assert [e.time for e in summary.latest] == ["12:05", "09:05"]
+
+
+def test_stock_table_view_matches_previous_shape():
+    """Проверяет, что StockView отдает пары, детализацию и итоги в прежнем виде."""
+    builder = StockTableBuilder()
+    builder.add("art1", "Коледино", 5, in_way_to=1)
+    builder.add("art1", "Казань", 7)
+    builder.add("art2", "Коледино", 0, in_way_from=2)
+    view = StockView(json.loads(json.dumps(builder.build())))
+
+    assert dict(view.skus) == {"art1": 12, "art2": 0}
+    assert view.sku_details["art1"] == [("Казань", 7), ("Коледино", 5)]
+    assert view.sku_details["art2"] == []
+    assert view.warehouses == [("Казань", 7), ("Коледино", 5)]
+    assert view.in_way_to["art1"] == 1
+    assert view.in_way_from["art2"] == 2
@@ -0,0 +1,71 @@
+import pytest
+from datetime import date
+from zoneinfo import ZoneInfo
+from flask import Flask
+from app.models import db, OrderEvent
+from app.schemas import OzonPosting, WBOrderItem, WBSaleItem
+from app.services.event_store import daily_totals, day_summary, ozon_rows, record_events, wb_rows
+from app.utils.compact import EventSummaryView
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _wb_order(srid: str, when: str, sku: str, is_cancel: bool = False) -> WBOrderItem:
+    return WBOrderItem.model_validate({
+        "srid": srid, "date": when, "supplierArticle": sku,
+        "oblastOkrugName": "MSK", "warehouseName": "Kole", "isCancel": is_cancel,
+    })
+
+
+def test_events_upsert_and_day_queries(app):
+    """
+    Проверяет, что повторная загрузка обновляет строки по srid/номеру
+    отправления (в том числе отмену), а день и диапазон строятся локально.
+    """
+    orders = [
+        _wb_order("o1", "2024-06-01T07:05:00+00:00", "art1"),
+        _wb_order("o2", "2024-06-01T08:00:00+00:00", "art2"),
+        _wb_order("o3", "2024-06-02T09:00:00+00:00", "art1"),
+    ]
+    sale = WBSaleItem.model_validate({
+        "srid": "o1", "date": "2024-06-01T15:00:00+00:00", "supplierArticle": "art1",
+        "oblastOkrugName": "MSK", "warehouseName": "Kole",
+    })
+    posting = OzonPosting.model_validate({
+        "posting_number": "P-1", "status": "delivering", "in_process_at": "2024-06-01T10:00:00Z",
+        "products": [{"quantity": 2, "offer_id": "101"}, {"quantity": 1, "offer_id": "102"}],
+    })
+
+    with app.app_context():
+        assert record_events(wb_rows("order", orders, MOSCOW_TZ)) == 3
+        assert record_events(wb_rows("sale", [sale], MOSCOW_TZ)) == 1
+        assert record_events(ozon_rows("client1", [posting], MOSCOW_TZ)) == 2
+        # Повторная загрузка: o2 отменен, строки не дублируются
+        record_events(wb_rows("order", [orders[0], _wb_order("o2", "2024-06-01T08:00:00+00:00", "art2", is_cancel=True)], MOSCOW_TZ))
+        assert OrderEvent.query.count() == 6
+
+        wb_day = day_summary("wb", date(2024, 6, 1), MOSCOW_TZ)
+        assert (wb_day["ordered"], wb_day["purchased"]) == (1, 1)
+        assert [(e.time, e.city) for e in EventSummaryView(wb_day["ordered_events"])["art1"].latest] == [("10:05", "MSK")]
+
+        ozon_day = day_summary("ozon", date(2024, 6, 1), MOSCOW_TZ)
+        assert ozon_day["ordered"] == 3
+        assert dict(ozon_day["ordered_skus"]) == {"101": 2, "102": 1}
+
+        assert daily_totals(date(2024, 6, 1), date(2024, 6, 2)) == [
+            {"date": "2024-06-01", "marketplace": "ozon", "ordered": 3, "purchased": 0},
+            {"date": "2024-06-01", "marketplace": "wb", "ordered": 1, "purchased": 1},
+            {"date": "2024-06-02", "marketplace": "wb", "ordered": 1, "purchased": 0},
+        ]
+        assert daily_totals(date(2024, 6, 1), date(2024, 6, 2), marketplace="wb", skus=["art2"]) == []
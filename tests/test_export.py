@@ -0,0 +1,79 @@
+import json
+import pytest
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+from unittest.mock import MagicMock
+from flask import Flask
+from app import cache
+from app.models import db, DailyMetric, StockDelta
+from app.routes.export import export_bp
+from app.services import http_client
+from app.utils.circuit_breaker import reset_breakers
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE="SimpleCache",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        WB_API_TOKEN="fake_token",
+        OZON_ACCOUNTS=[],
+        TIMEZONE="Europe/Moscow",
+    )
+    cache.init_app(app)
+    db.init_app(app)
+    app.register_blueprint(export_bp)
+    reset_breakers()
+    with app.app_context():
+        cache.clear()
+        db.create_all()
+        for day, sku, qty in ((1, "art1", 10), (1, "art2", 4), (2, "art1", 8), (5, "art1", 6)):
+            db.session.add(StockDelta(marketplace="wb", sku=sku, warehouse_name="Коледино", quantity=qty, captured_at=datetime(2024, 6, day, 12), is_keyframe=day == 1))
+        db.session.add(StockDelta(marketplace="ozon:client1", sku="art1", warehouse_name="Склад 1", quantity=3, captured_at=datetime(2024, 6, 2, 12)))
+        db.session.add(DailyMetric(marketplace="wb", date=date(2024, 6, 1), ordered_count=5, purchased_count=2))
+        db.session.add(DailyMetric(marketplace="wb", date=date(2024, 6, 2), ordered_count=7, purchased_count=3))
+        db.session.commit()
+    return app
+
+
+def test_export_stock_history_csv_with_filters(app):
+    """Проверяет потоковую выгрузку CSV с фильтрами по датам, SKU и маркетплейсу."""
+    resp = app.test_client().get("/export/stock_history?from=2024-06-02&to=2024-06-05&sku=art1&marketplace=wb")
+    assert resp.status_code == 200
+    assert resp.is_streamed
+    assert resp.headers["Content-Type"].startswith("text/csv")
+    assert resp.get_data(as_text=True).splitlines() == [
+        "marketplace,captured_at,sku,warehouse_name,quantity,is_keyframe",
+        "wb,2024-06-02T12:00:00,art1,Коледино,8,False",
+        "wb,2024-06-05T12:00:00,art1,Коледино,6,False",
+    ]
+
+
+def test_export_daily_metrics_ndjson_and_errors(app):
+    """Проверяет NDJSON-выгрузку дневных метрик и ответ 400 на неверные параметры."""
+    client = app.test_client()
+    resp = client.get("/export/daily_metrics?format=ndjson&to=2024-06-01")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert lines == [{"marketplace": "wb", "date": "2024-06-01", "ordered_count": 5, "purchased_count": 2}]
+
+    assert client.get("/export/daily_metrics?format=xml").status_code == 400
+    assert client.get("/export/unknown").status_code == 400
+    assert client.get("/export/daily_metrics?from=2024-06-05&to=2024-06-01").status_code == 400
+
+
+def test_export_today_orders(app, monkeypatch):
+    """Проверяет выгрузку сегодняшних заказов из тех же данных, что и дашборд."""
+    now = datetime.now(ZoneInfo("Europe/Moscow")).replace(hour=10, minute=5, second=0, microsecond=0)
+    # WB отдает время заказа в UTC
+    utc = now.astimezone(ZoneInfo("UTC")).replace(tzinfo=None).isoformat()
+    orders = [
+        {"srid": "o1", "date": utc, "isCancel": False, "supplierArticle": "art1", "oblastOkrugName": "MSK", "warehouseName": "Kole"},
+        {"srid": "o2", "date": utc, "isCancel": False, "supplierArticle": "art2", "oblastOkrugName": "SPB", "warehouseName": "Utka"},
+    ]
+    monkeypatch.setattr(http_client.requests, "get", MagicMock(side_effect=lambda url, **kw: MagicMock(ok=True, json=lambda: orders if url.endswith("/orders") else [])))
+
+    resp = app.test_client().get("/export/orders?format=ndjson&sku=art2")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert lines == [{"marketplace": "wb", "date": now.date().isoformat(), "time": "10:05", "sku": "art2", "city": "SPB", "warehouse": "Utka"}]
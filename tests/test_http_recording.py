@@ -0,0 +1,77 @@
+import gzip
+import os
+import pytest
+import requests
+from unittest.mock import MagicMock
+from app.services import http_client, http_recording
+from app.utils.circuit_breaker import reset_breakers
+
+
+@pytest.fixture(autouse=True)
+def reset_mode():
+    reset_breakers()
+    yield
+    http_recording.configure()
+
+
+def _response(status: int, payload: str) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = payload.encode()
+    resp.headers["Content-Type"] = "application/json"
+    return resp
+
+
+def test_record_then_replay_offline(monkeypatch, tmp_path):
+    """
+    Проверяет, что записанные ответы и ошибки воспроизводятся без сети:
+    точное совпадение, совпадение по пути при других датах и ошибка без записи.
+    """
+    directory = str(tmp_path / "rec")
+    http_recording.configure("record", directory)
+    live = MagicMock(side_effect=[_response(200, '[{"srid": "o1"}]'), requests.ReadTimeout("slow")])
+    monkeypatch.setattr(http_client.requests, "get", live)
+
+    url = "https://statistics-api.wildberries.ru/api/v1/supplier/orders"
+    resp = http_client.call("wb:orders", "get", url, headers={"Authorization": "secret"}, params={"dateFrom": "2024-06-01"})
+    assert resp.json() == [{"srid": "o1"}]
+    with pytest.raises(requests.ReadTimeout):
+        http_client.call("wb:stocks", "get", "https://statistics-api.wildberries.ru/api/v1/supplier/stocks", params={"dateFrom": "2024-06-01"})
+    files = os.listdir(directory)
+    assert len(files) == 1 and files[0].endswith(".jsonl.gz")
+
+    http_recording.configure("replay", directory, speed=0)
+    monkeypatch.setattr(http_client.requests, "get", MagicMock(side_effect=AssertionError("network")))
+    # Другой хост (мок-сервер) и другая дата: совпадение по методу и пути
+    replayed = http_client.call("wb:orders", "get", "http://127.0.0.1:8080/api/v1/supplier/orders", params={"dateFrom": "2024-07-01"})
+    assert replayed.status_code == 200
+    assert replayed.json() == [{"srid": "o1"}]
+    with pytest.raises(requests.ReadTimeout):
+        http_client.call("wb:stocks", "get", "http://127.0.0.1:8080/api/v1/supplier/stocks")
+    with pytest.raises(requests.ConnectionError):
+        http_client.call("wb:sales", "get", "http://127.0.0.1:8080/api/v1/supplier/sales")
+
+    with gzip.open(os.path.join(directory, files[0]), "rt") as f:
+        assert "secret" not in f.read()
+
+
+def test_replay_keeps_ozon_accounts_apart(monkeypatch, tmp_path):
+    """Проверяет, что одинаковые запросы двух аккаунтов Ozon получают свои ответы и при обратном порядке воспроизведения."""
+    directory = str(tmp_path / "rec")
+    http_recording.configure("record", directory)
+    live = MagicMock(side_effect=[_response(200, '{"items": ["A"]}'), _response(200, '{"items": ["B"]}')])
+    monkeypatch.setattr(http_client.requests, "post", live)
+    url = "https://api-seller.ozon.ru/v1/analytics/stocks"
+    body = {"skus": ["101"]}
+    for client_id in ("clientA", "clientB"):
+        http_client.call("ozon:stocks", "post", url, account=client_id, headers={"Client-Id": client_id}, json=body)
+
+    http_recording.configure("replay", directory, speed=0)
+    monkeypatch.setattr(http_client.requests, "post", MagicMock(side_effect=AssertionError("network")))
+    for client_id, expected in (("clientB", ["B"]), ("clientA", ["A"])):
+        resp = http_client.call("ozon:stocks", "post", url, account=client_id, json=body)
+        assert resp.json()["items"] == expected
+    # Совпадение по пути тоже учитывает аккаунт
+    for client_id, expected in (("clientB", ["B"]), ("clientA", ["A"])):
+        resp = http_client.call("ozon:stocks", "post", url, account=client_id, json={"skus": ["202"]})
+        assert resp.json()["items"] == expected
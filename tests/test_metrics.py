@@ -0,0 +1,46 @@
+import pytest
+from unittest.mock import MagicMock
+from flask import Flask
+from prometheus_client import REGISTRY
+from app import cache
+from app.services import wb_api, http_client
+from app.utils.circuit_breaker import reset_breakers
+
+
+@pytest.fixture
+def app():
+    """Создает экземпляр Flask-приложения для тестов."""
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    cache.init_app(app)
+    reset_breakers()
+    return app
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_cache_hit_miss_and_fetch_metrics(app, monkeypatch):
+    """
+    Проверяет, что первый вызов кэшируемой функции считается промахом,
+    повторный — попаданием, а запрос к API попадает в гистограмму
+    длительности и валидации.
+    """
+    stocks = [{"quantity": 3, "warehouseName": "Коледино", "supplierArticle": "art1", "nmId": 1}]
+    monkeypatch.setattr(http_client.requests, "get", MagicMock(return_value=MagicMock(ok=True, json=lambda: stocks)))
+
+    misses = _sample("mp_cache_lookups_total", function="load_stocks", result="miss")
+    hits = _sample("mp_cache_lookups_total", function="load_stocks", result="hit")
+    fetches = _sample("mp_fetch_duration_seconds_count", endpoint="wb:stocks", account="default")
+    rows = _sample("mp_validation_rows_sum", payload="wb:stocks")
+
+    with app.app_context():
+        cache.clear()
+        wb_api.fetch_stocks("fake_token")
+        wb_api.fetch_stocks("fake_token")
+
+    assert _sample("mp_cache_lookups_total", function="load_stocks", result="miss") == misses + 1
+    assert _sample("mp_cache_lookups_total", function="load_stocks", result="hit") == hits + 1
+    assert _sample("mp_fetch_duration_seconds_count", endpoint="wb:stocks", account="default") == fetches + 1
+    assert _sample("mp_validation_rows_sum", payload="wb:stocks") == rows + 1
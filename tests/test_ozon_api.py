@@ -1,9 +1,12 @@
 import pytest
 from unittest.mock import MagicMock
 from flask import Flask
-from app.services import ozon_api
+from app.services import ozon_api, http_client
 from app import cache
+from app.utils.circuit_breaker import reset_breakers
+from app.utils import persistent_cache
 from app.schemas import OzonStockResponse, OzonStockItem
+from app.utils.compact import StockView
 
 @pytest.fixture
 def app():
@@ -11,13 +14,14 @@ def app():
     app = Flask(__name__)
     app.config["CACHE_TYPE"] = "SimpleCache"
     cache.init_app(app)
+    reset_breakers()
     return app
 
 @pytest.fixture
 def mock_requests_post(monkeypatch):
     """Фикстура для мока requests.post"""
     mock_post = MagicMock()
-    monkeypatch.setattr(ozon_api.requests, "post", mock_post)
+    monkeypatch.setattr(http_client.requests, "post", mock_post)
     return mock_post
 
 def test_fetch_stocks_aggregation(mock_requests_post, app):
@@ -42,9 +46,13 @@ def test_fetch_stocks_aggregation(mock_requests_post, app):
     ]
     response2 = OzonStockResponse(items=response2_items)
 
+    # Остатки и возвраты каждого аккаунта
+    returns1 = {"result": [{"products": [{"quantity": 2, "offer_id": "101"}, {"quantity": 1, "offer_id": "999"}]}]}
     mock_requests_post.side_effect = [
         MagicMock(ok=True, json=lambda: response1.model_dump()),
+        MagicMock(ok=True, json=lambda: returns1),
         MagicMock(ok=True, json=lambda: response2.model_dump()),
+        MagicMock(ok=True, json=lambda: {"result": []}),
     ]
 
     with app.app_context():
@@ -54,11 +62,122 @@ def test_fetch_stocks_aggregation(mock_requests_post, app):
     # Проверяем общие суммы
     assert result["total"] == 35  # 10 + 5 + 20
 
+    stocks = StockView(result["stock_table"])
+
     # Проверяем агрегацию по складам
-    assert dict(result["warehouses"])["Склад 1"] == 30  # 10 + 20
-    assert dict(result["warehouses"])["Склад 2"] == 5
+    assert dict(stocks.warehouses)["Склад 1"] == 30  # 10 + 20
+    assert dict(stocks.warehouses)["Склад 2"] == 5
 
     # Проверяем агрегацию по SKU
-    assert dict(result["skus"])["101"] == 10
-    assert dict(result["skus"])["102"] == 5
-    assert dict(result["skus"])["201"] == 20
+    assert dict(stocks.skus)["101"] == 10
+    assert dict(stocks.skus)["102"] == 5
+    assert dict(stocks.skus)["201"] == 20
+
+    # Товары в пути на склад и возвраты (только для SKU из остатков)
+    assert result["total_in_transit"] == 3
+    assert stocks.in_way_to == {"101": 1, "102": 0, "201": 2}
+    assert stocks.in_way_from == {"101": 2, "102": 0, "201": 0}
+
+
+def test_fetch_stocks_per_account_cache(mock_requests_post, app, monkeypatch):
+    """
+    Проверяет, что аккаунты кэшируются раздельно: изменение SKU одного
+    магазина не приводит к повторному запросу другого, а упавший магазин
+    отдается из резервного кэша с пометкой stale.
+    """
+    monkeypatch.setattr(ozon_api, "save_to_persistent_cache", lambda key, data: None)
+    fallback = {
+        "client_id": "client2",
+        "fetched_at": "2024-01-01T10:00:00+00:00",
+        "total": 7,
+        # Снимок из резервного кэша прошел через json: кортежи стали списками
+        "stock_table": {"strings": ["Склад 3"], "skus": ["201"], "rows": [[7, 0, 0, [[0, 7]]]]},
+    }
+    monkeypatch.setattr(persistent_cache, "load_from_persistent_cache", lambda key: fallback if key == "ozon_stocks:client2" else None)
+
+    response1 = OzonStockResponse(items=[
+        OzonStockItem(available_stock_count=10, transit_stock_count=0, warehouse_name="Склад 1", offer_id="101"),
+    ])
+    mock_requests_post.side_effect = [
+        MagicMock(ok=True, json=lambda: response1.model_dump()),
+        MagicMock(ok=True, json=lambda: {"result": []}),
+        MagicMock(ok=False, status_code=500),
+        MagicMock(ok=False, status_code=500),
+    ]
+
+    with app.app_context():
+        cache.clear()
+        result = ozon_api.fetch_stocks((
+            ("client1", "key1", ("101",)),
+            ("client2", "key2", ("201",)),
+        ))
+        # Меняем SKU второго магазина: первый должен остаться в кэше
+        ozon_api.fetch_stocks((
+            ("client1", "key1", ("101",)),
+            ("client2", "key2", ("201", "202")),
+        ))
+
+    assert mock_requests_post.call_count == 4
+    assert result["total"] == 17
+    assert dict(StockView(result["stock_table"]).skus) == {"101": 10, "201": 7}
+    statuses = {acc["client_id"]: acc for acc in result["accounts"]}
+    assert statuses["client1"]["stale"] is False
+    assert statuses["client2"]["stale"] is True
+
+
+def test_fetch_catalog_incremental(mock_requests_post, app, monkeypatch):
+    """
+    Проверяет, что при обновлении каталога /v3/product/info/list
+    запрашивается только для новых и измененных (по updated_at) товаров,
+    а SKU из каталога используются для аккаунтов без OZON_SKUS_n.
+    """
+    saved = {}
+    previous = {
+        "refreshed_at": "2020-01-01T00:00:00+00:00",
+        "products": {
+            "1": {"offer_id": "A", "sku": "1001", "updated_at": "2024-01-01T00:00:00Z"},
+            "4": {"offer_id": "D", "sku": "1004", "updated_at": "2024-01-01T00:00:00Z"},
+        },
+    }
+    monkeypatch.setattr(ozon_api, "load_from_persistent_cache", lambda key: previous if key.startswith("ozon_catalog") else None)
+    monkeypatch.setattr(ozon_api, "save_to_persistent_cache", lambda key, data: saved.update({key: data}))
+
+    list_response = {"result": {"items": [
+        {"product_id": 1, "offer_id": "A", "updated_at": "2024-02-01T00:00:00Z"},
+        {"product_id": 2, "offer_id": "B"},
+        {"product_id": 3, "offer_id": "C", "archived": True},
+        {"product_id": 4, "offer_id": "D", "updated_at": "2024-01-01T00:00:00Z"},
+    ], "total": 4, "last_id": ""}}
+    info_response = {"items": [
+        {"id": 1, "offer_id": "A", "sku": 1011, "updated_at": "2024-02-01T00:00:00Z"},
+        {"id": 2, "offer_id": "B", "sources": [{"sku": 1002, "source": "sds"}]},
+    ]}
+    mock_requests_post.side_effect = [
+        MagicMock(ok=True, json=lambda: list_response),
+        MagicMock(ok=True, json=lambda: info_response),
+    ]
+
+    with app.app_context():
+        cache.clear()
+        skus = ozon_api.catalog_skus("client1", "key1")
+
+    assert skus == ("1002", "1004", "1011")
+    info_call = mock_requests_post.call_args_list[1]
+    assert info_call.kwargs["json"] == {"product_id": [1, 2]}
+    assert set(saved["ozon_catalog:client1"]["products"]) == {"1", "2", "4"}
+
+
+def test_catalog_failure_uses_saved_catalog_without_caching_it(mock_requests_post, app, monkeypatch):
+    """Проверяет, что при ошибке API берется сохраненный каталог, а следующий запрос снова идет в API."""
+    previous = {
+        "refreshed_at": "2020-01-01T00:00:00+00:00",
+        "products": {"1": {"offer_id": "A", "sku": "1001", "updated_at": ""}},
+    }
+    monkeypatch.setattr(ozon_api, "load_from_persistent_cache", lambda key: previous if key.startswith("ozon_catalog") else None)
+    mock_requests_post.return_value = MagicMock(ok=True, json=lambda: {"result": {"items": "broken"}})
+
+    with app.app_context():
+        cache.clear()
+        assert ozon_api.catalog_skus("client1", "key1") == ("1001",)
+        assert ozon_api.catalog_skus("client1", "key1") == ("1001",)
+    assert mock_requests_post.call_count == 2
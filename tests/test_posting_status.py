@@ -0,0 +1,90 @@
+import pytest
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from unittest.mock import MagicMock
+from flask import Flask
+from app import cache
+from app.models import db, OrderEvent, OzonPostingStatus
+from app.services import http_client, ozon_api
+from app.utils.circuit_breaker import reset_breakers
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE="SimpleCache",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        OZON_DELIVERY_LOOKBACK_DAYS=14,
+    )
+    cache.init_app(app)
+    db.init_app(app)
+    reset_breakers()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _posting(number: str, status: str, created: datetime, offer_id: str = "101", quantity: int = 1) -> dict:
+    return {
+        "posting_number": number,
+        "status": status,
+        "in_process_at": created.isoformat().replace("+00:00", "Z"),
+        "products": [{"quantity": quantity, "offer_id": offer_id}],
+    }
+
+
+def test_deliveries_are_counted_incrementally(monkeypatch, app):
+    """
+    Проверяет, что первый запуск только запоминает статусы, а дальше
+    запрашиваются лишь delivered/cancelled и выкупом считается новый переход.
+    """
+    now = datetime.now(ZoneInfo("UTC"))
+    old = now - timedelta(days=3)
+    today = datetime.now(MOSCOW_TZ).replace(hour=0, minute=1).astimezone(ZoneInfo("UTC"))
+    state = {
+        "today": [_posting("P1", "awaiting_deliver", today, "102", 2)],
+        "all": [_posting("P0", "delivered", old), _posting("P1", "awaiting_deliver", today, "102", 2)],
+        "delivered": [_posting("P0", "delivered", old)],
+        "cancelled": [],
+    }
+
+    def post(url, json=None, **kwargs):
+        flt = json["filter"]
+        if "status" in flt:
+            result = state[flt["status"]]
+        elif flt["since"].startswith(datetime.now(MOSCOW_TZ).date().isoformat()):
+            result = state["today"]
+        else:
+            result = state["all"]
+        return MagicMock(ok=True, status_code=200, json=lambda: {"result": result})
+
+    mock_post = MagicMock(side_effect=post)
+    monkeypatch.setattr(http_client.requests, "post", mock_post)
+
+    with app.app_context():
+        first = ozon_api.fetch_account_today.uncached("client1", "key1", MOSCOW_TZ)
+        assert first["purchased"] == 0
+        assert OzonPostingStatus.query.count() == 2
+
+        # P1 доставлен: приходит в ответе со статусом delivered
+        state["today"] = [_posting("P1", "delivered", today, "102", 2)]
+        state["delivered"] = state["delivered"] + state["today"]
+        mock_post.reset_mock()
+        second = ozon_api.fetch_account_today.uncached("client1", "key1", MOSCOW_TZ)
+        # Заказы за сегодня и по одному запросу на delivered и cancelled
+        assert mock_post.call_count == 3
+        assert second["purchased"] == 2
+        assert second["purchased_by_sku"] == {"102": 2}
+        assert OrderEvent.query.filter_by(marketplace="ozon", kind="sale").count() == 1
+
+        third = ozon_api.fetch_account_today.uncached("client1", "key1", MOSCOW_TZ)
+        assert third["purchased"] == 2
+        assert OrderEvent.query.filter_by(marketplace="ozon", kind="sale").count() == 1
+
+        merged = ozon_api.merge_account_today([third])
+        assert merged["purchased"] == 2
+        assert merged["purchased_skus"] == [("102", 2)]
@@ -0,0 +1,187 @@
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from flask import Flask
+from app import cache
+from app.routes.dashboard import dashboard_bp
+from app.utils import persistent_cache, redis_cache
+from app.utils import cache_utils
+from app.utils.cache_utils import fetch_lock
+from app.utils.redis_cache import FakeRedis, RedisCache
+
+
+def _wait(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_nodes_share_values_and_invalidate_local_copies():
+    """
+    Проверяет, что «узлы» делят одно сжатое значение, попадания в локальную
+    копию не читают Redis, а запись на другом узле сбрасывает копию через pub/sub.
+    """
+    server = FakeRedis()
+    node_a, node_b = RedisCache(server), RedisCache(server)
+    assert node_a.wait_subscribed(2) and node_b.wait_subscribed(2)
+    events = []
+    node_b.add_listener(events.append)
+
+    value = {"rows": list(range(1000))}
+    node_a.set("k", value)
+    # Уведомление о записи приходит асинхронно: пришедшее после чтения
+    # сбросило бы локальную копию, и следующее чтение пошло бы в Redis
+    assert _wait(lambda: len(events) == 1)
+    blob = server.get("mp:k")
+    assert blob[redis_cache._HEADER.size : redis_cache._HEADER.size + 1] == b"\x01"  # zlib
+    assert node_b.get("k") == value
+    with patch.object(server, "get", wraps=server.get) as get:
+        assert node_b.get("k") == value
+        assert get.call_count == 0
+
+    node_a.set("k", {"rows": []})
+    assert _wait(lambda: len(events) == 2)
+    assert node_b.get("k") == {"rows": []}
+    assert [e["op"] for e in events] == ["set", "set"]
+
+    assert node_b.add("k", "other") is False
+    node_a.delete("k")
+    assert _wait(lambda: node_b.get("k") is None)
+    assert node_b.add("k", "other") is True
+
+
+def test_stale_read_is_not_kept_after_invalidation():
+    """
+    Проверяет гонку: чтение получило старое значение, а уведомление о новой
+    версии пришло до сохранения локальной копии — копия не сохраняется.
+    """
+    server = FakeRedis()
+    node_a, node_b = RedisCache(server), RedisCache(server)
+    assert node_a.wait_subscribed(2) and node_b.wait_subscribed(2)
+    node_a.set("k", "old")
+    generation = node_b._generation("k")
+    assert _wait(lambda: node_b._generation("k") != generation)
+
+    real_get = server.get
+
+    def get_then_overwrite(name):
+        blob = real_get(name)
+        seen = node_b._generation("k")
+        node_a.set("k", "new")
+        assert _wait(lambda: node_b._generation("k") != seen)
+        return blob
+
+    with patch.object(server, "get", side_effect=get_then_overwrite):
+        assert node_b.get("k") == "old"
+    assert node_b.get("k") == "new"
+
+
+@pytest.fixture
+def app():
+    """Создает экземпляр Flask-приложения с кэшем в FakeRedis."""
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE="app.utils.redis_cache.RedisCache",
+        CACHE_REDIS_URL=f"memory://test-{time.monotonic_ns()}",
+        FETCH_LOCK_TIMEOUT_SECONDS=10,
+        FETCH_LOCK_WAIT_SECONDS=5,
+        UPDATES_STREAM_SECONDS=5,
+    )
+    cache.init_app(app)
+    app.register_blueprint(dashboard_bp)
+    return app
+
+
+calls = []
+release = threading.Event()
+
+
+@cache.memoize(timeout=60)
+@fetch_lock
+def slow_loader(x):
+    calls.append(x)
+    release.wait(5)
+    return {"x": x}
+
+
+def test_fetch_lock_loads_once(app, monkeypatch):
+    """
+    Проверяет, что при одновременном промахе загрузка выполняется один раз:
+    ждущие потоки получают значение владельца блокировки, даже если memoize
+    еще не успел его записать.
+    """
+    calls.clear()
+    release.clear()
+    sleeping = set()
+    real_sleep = time.sleep
+
+    def sleep(seconds):
+        # time.sleep общий для всех потоков, учитываются только ждущие загрузку
+        if threading.current_thread().name.startswith("waiter"):
+            sleeping.add(threading.current_thread().name)
+        real_sleep(0.01)
+
+    monkeypatch.setattr(cache_utils.time, "sleep", sleep)
+    with app.app_context():
+        key = slow_loader.make_cache_key(slow_loader.uncached, 1)
+    at_unlock = []
+    real_delete = cache.delete
+
+    def delete(name):
+        if name.startswith("fetch_lock:"):
+            at_unlock.append(cache.get(key))
+        return real_delete(name)
+
+    monkeypatch.setattr(cache, "delete", delete)
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(slow_loader(1))
+
+    owner = threading.Thread(target=worker)
+    owner.start()
+    assert _wait(lambda: calls == [1])
+    waiters = [threading.Thread(target=worker, name=f"waiter-{i}") for i in range(3)]
+    for t in waiters:
+        t.start()
+    # Загрузка владельца завершается, только когда все остальные ждут блокировку
+    assert _wait(lambda: len(sleeping) == 3)
+    release.set()
+    for t in [owner, *waiters]:
+        t.join()
+    assert calls == [1]
+    assert results == [{"x": 1}] * 4
+    # Значение лежит в кэше уже в момент снятия блокировки
+    assert at_unlock == [{"x": 1}]
+
+
+def test_held_fetch_lock_serves_persistent_copy_at_once(app, monkeypatch):
+    """Проверяет, что при чужой загрузке load_with_fallback сразу отдает резервную копию, не дожидаясь блокировки."""
+    calls.clear()
+    snapshot = {"x": 0, "fetched_at": "2024-01-01T10:00:00+00:00"}
+    monkeypatch.setattr(persistent_cache, "load_from_persistent_cache", lambda key: snapshot)
+    with app.app_context():
+        cache.clear()
+        with patch.object(cache, "add", return_value=False):
+            result = persistent_cache.load_with_fallback(slow_loader, "slow", 2)
+    assert calls == []
+    assert (result["x"], result["warmed"], result["stale"]) == (0, True, False)
+
+
+def test_updates_stream(app):
+    """Проверяет, что поток SSE сообщает о записи в общий кэш."""
+    resp = app.test_client().get("/api/updates", buffered=False)
+    assert resp.headers["Content-Type"].startswith("text/event-stream")
+    chunks = iter(resp.response)
+    assert next(chunks).startswith(b"retry:")
+    with app.app_context():
+        assert cache.cache.wait_subscribed(2)
+        cache.set("wb_stocks", {"total": 1})
+    chunk = next(chunks)
+    assert chunk.startswith(b"event: update") and b'"key": "wb_stocks"' in chunk
+    resp.close()
@@ -0,0 +1,89 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from flask import Flask
+from app import cache
+from app.models import db, DailyMetric, KeyValue, StockDelta
+from app.services import http_client, wb_api
+from app.services.refresh import run_refresh
+from app.utils.circuit_breaker import reset_breakers
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE="SimpleCache",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        WB_API_TOKEN="fake_token",
+        OZON_ACCOUNTS=[{"client_id": "client1", "api_key": "key1", "skus": ["101"]}],
+        OZON_CATALOG_TTL_SECONDS=3600,
+        STOCK_KEYFRAME_INTERVAL_HOURS=24,
+    )
+    cache.init_app(app)
+    db.init_app(app)
+    reset_breakers()
+    with app.app_context():
+        cache.clear()
+        db.create_all()
+    return app
+
+
+def _wb_get(url, **kwargs):
+    if url.endswith("/stocks"):
+        items = [
+            {"quantity": 7, "warehouseName": "Коледино", "supplierArticle": "art1", "nmId": 1},
+            {"quantity": 3, "warehouseName": "Казань", "supplierArticle": "art1", "nmId": 1},
+        ]
+    else:
+        items = []
+    return MagicMock(ok=True, status_code=200, json=lambda: items)
+
+
+def test_refresh_writes_cache_and_history_and_reports_failures(monkeypatch, app):
+    """
+    Проверяет, что обновленные источники попадают в кэш, резервный кэш и
+    историю одной транзакцией, а сбой аккаунта Ozon отражается в отчете
+    и не затрагивает историю и дневные метрики Ozon.
+    """
+    mock_get = MagicMock(side_effect=_wb_get)
+    monkeypatch.setattr(http_client.requests, "get", mock_get)
+    monkeypatch.setattr(http_client.requests, "post", MagicMock(side_effect=RuntimeError("ozon down")))
+
+    reports = run_refresh(app, workers=4)
+
+    by_name = {(r.name, r.account): r for r in reports}
+    assert set(by_name) == {("wb_stocks", "wb"), ("wb_today", "wb"), ("ozon_today", "client1"), ("ozon_stocks", "client1")}
+    assert by_name[("wb_stocks", "wb")].ok and by_name[("wb_stocks", "wb")].rows == 2
+    assert not by_name[("ozon_stocks", "client1")].ok
+    assert by_name[("ozon_today", "client1")].error == "ozon down"
+
+    with app.app_context():
+        calls = mock_get.call_count
+        assert wb_api.fetch_stocks("fake_token")["total"] == 10
+        assert mock_get.call_count == calls
+
+        assert {kv.key for kv in KeyValue.query} >= {"wb_stocks"}
+        assert StockDelta.query.filter_by(marketplace="wb").count() == 2
+        assert StockDelta.query.filter(StockDelta.marketplace.like("ozon%")).count() == 0
+        assert [m.marketplace for m in DailyMetric.query] == ["wb"]
+
+    wb_only = run_refresh(app, names={"wb_stocks"}, accounts={"wb"})
+    assert [(r.name, r.ok) for r in wb_only] == [("wb_stocks", True)]
+    with app.app_context():
+        # Остатки не изменились — новых строк истории нет
+        assert StockDelta.query.count() == 2
+
+
+def test_refresh_loads_even_when_fetch_lock_is_held(monkeypatch, app):
+    """Проверяет, что обновление не ждет чужую блокировку загрузки и не берет закэшированный результат."""
+    mock_get = MagicMock(side_effect=_wb_get)
+    monkeypatch.setattr(http_client.requests, "get", mock_get)
+    with app.app_context():
+        cache.set(wb_api.load_stocks.make_cache_key(wb_api.load_stocks.uncached, "fake_token"), {"total": 1})
+
+    with patch.object(cache, "add", return_value=False), patch.object(cache, "has", return_value=True):
+        reports = run_refresh(app, names={"wb_stocks"}, accounts={"wb"})
+
+    assert [(r.name, r.ok, r.rows) for r in reports] == [("wb_stocks", True, 2)]
+    assert mock_get.call_count == 1
@@ -0,0 +1,97 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from app.models import db, KeyValue, StockDaily, StockDelta, StockSnapshot
+from app.services.retention import run_retention
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        RETENTION_RAW_SNAPSHOT_DAYS=14,
+        RETENTION_DAILY_DAYS=0,
+        RETENTION_KV_DAYS=7,
+        RETENTION_STOCK_HISTORY_DAYS=90,
+        RETENTION_BATCH_SIZE=2,
+        RETENTION_BATCH_PAUSE_SECONDS=0,
+        RETENTION_VACUUM_INTERVAL_DAYS=7,
+        RETENTION_ROLLUP_RECONCILE_DAYS=8,
+        TIMEZONE="Europe/Moscow",
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_retention_downsamples_and_prunes(app):
+    """
+    Проверяет свертку старых снимков в дневные min/max/close, удаление
+    сырых строк и устаревших ключей kv_store, а также идемпотентность.
+    """
+    now = datetime(2024, 6, 30, 12, 0)
+    old_day = datetime(2024, 6, 1)
+    with app.app_context():
+        for hour, qty in ((9, 10), (12, 4), (18, 7)):
+            db.session.add(StockSnapshot(marketplace="wb", warehouse_name="TOTAL", sku="art1", quantity=qty, captured_at=old_day + timedelta(hours=hour)))
+        db.session.add(StockSnapshot(marketplace="wb", warehouse_name="TOTAL", sku="art1", quantity=3, captured_at=now - timedelta(days=1)))
+        db.session.add(KeyValue(key="wb_today:2024-06-01", value_json="{}", updated_at=datetime(2024, 6, 1, 23, 0)))
+        db.session.add(KeyValue(key="wb_stocks", value_json="{}", updated_at=now))
+        db.session.commit()
+
+        report = run_retention(now=now)
+        assert report["downsampled_days"] == 1
+        assert report["snapshots_deleted"] == 3
+        assert report["kv_deleted"] == 1
+        assert report["vacuumed"] is True
+
+        daily = StockDaily.query.one()
+        assert (daily.min_quantity, daily.max_quantity, daily.close_quantity) == (4, 10, 7)
+        assert StockSnapshot.query.count() == 1
+        assert [kv.key for kv in KeyValue.query.order_by(KeyValue.key)] == ["retention:last_vacuum", "wb_stocks"]
+
+        again = run_retention(now=now)
+        assert again["downsampled_days"] == 0
+        assert again["vacuumed"] is False
+        assert StockDaily.query.count() == 1
+
+
+def _delta(sku, quantity, captured_at, is_keyframe=False):
+    return StockDelta(marketplace="wb", sku=sku, warehouse_name="Коледино", quantity=quantity, captured_at=captured_at, is_keyframe=is_keyframe)
+
+
+def test_retention_folds_stock_deltas_before_pruning(app):
+    """
+    Проверяет, что сутки stock_deltas, теряющие строки, сворачиваются в
+    stock_daily (включая исчезнувшую пару), повторная свертка частично
+    удаленного дня ничего не меняет, а водяные знаки Ozon не истекают.
+    """
+    now = datetime(2024, 9, 10, 12, 0)
+    day1, day2 = datetime(2024, 6, 1), datetime(2024, 6, 2)
+    with app.app_context():
+        db.session.add_all([
+            _delta("art1", 10, day1 + timedelta(hours=9), True),
+            _delta("art2", 5, day1 + timedelta(hours=9), True),
+            _delta("art1", 4, day1 + timedelta(hours=12)),
+            _delta("art2", 0, day1 + timedelta(hours=15)),
+            _delta("art1", 7, day1 + timedelta(hours=18)),
+            _delta("art1", 7, day2 + timedelta(hours=9), True),
+            _delta("art1", 2, day2 + timedelta(hours=12)),
+            _delta("art1", 6, now - timedelta(days=1), True),
+        ])
+        db.session.add(KeyValue(key="ozon_postings_watermark:client1", value_json="{}", updated_at=datetime(2024, 6, 1)))
+        db.session.commit()
+
+        report = run_retention(now=now)
+        # Граница — keyframe 2 июня: удалены строки 1 июня, оба дня свернуты
+        assert (report["deltas_deleted"], report["downsampled_days"]) == (5, 2)
+        daily = {(d.date.day, d.sku): (d.min_quantity, d.max_quantity, d.close_quantity) for d in StockDaily.query}
+        assert daily == {(1, "art1"): (4, 10, 7), (1, "art2"): (0, 5, 0), (2, "art1"): (2, 7, 2)}
+        assert KeyValue.query.filter_by(key="ozon_postings_watermark:client1").count() == 1
+
+        run_retention(now=now)
+        again = {(d.date.day, d.sku): (d.min_quantity, d.max_quantity, d.close_quantity) for d in StockDaily.query}
+        assert again == daily
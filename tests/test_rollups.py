@@ -0,0 +1,110 @@
+import pytest
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+from flask import Flask
+from app.models import db, HourlyRollup
+from app.routes.dashboard import dashboard_bp
+from app.schemas import OzonPosting, WBOrderItem
+from app.services.event_store import intraday_curves, ozon_rows, rebuild_rollups, record_events, wb_rows
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config["TIMEZONE"] = "Europe/Moscow"
+    db.init_app(app)
+    app.register_blueprint(dashboard_bp)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _wb_order(srid: str, when: str, is_cancel: bool = False) -> WBOrderItem:
+    return WBOrderItem.model_validate({
+        "srid": srid, "date": when, "supplierArticle": "art1",
+        "oblastOkrugName": "MSK", "warehouseName": "Kole", "isCancel": is_cancel,
+    })
+
+
+def _rollups() -> dict:
+    return {(r.marketplace, r.date, r.hour): r.count for r in HourlyRollup.query if r.count}
+
+
+def test_rollups_follow_upserts_and_rebuild(app):
+    """
+    Проверяет, что почасовые суммы обновляются приращениями (повтор не
+    удваивает, отмена вычитает, снятие отмены возвращает), а пересчет из
+    order_events дает тот же результат.
+    """
+    # 07:05 UTC = 10 ч по Москве, 08:00 UTC = 11 ч
+    orders = [_wb_order("o1", "2024-06-01T07:05:00+00:00"), _wb_order("o2", "2024-06-01T08:00:00+00:00")]
+    posting = OzonPosting.model_validate({
+        "posting_number": "P-1", "status": "delivering", "in_process_at": "2024-06-01T07:30:00Z",
+        "products": [{"quantity": 2, "offer_id": "101"}, {"quantity": 1, "offer_id": "102"}],
+    })
+    day = date(2024, 6, 1)
+    with app.app_context():
+        record_events(wb_rows("order", orders, MOSCOW_TZ))
+        record_events(ozon_rows("client1", [posting], MOSCOW_TZ))
+        record_events(wb_rows("order", orders, MOSCOW_TZ))
+        assert _rollups() == {("wb", day, 10): 1, ("wb", day, 11): 1, ("ozon", day, 10): 3}
+
+        record_events(wb_rows("order", [_wb_order("o1", "2024-06-01T07:05:00+00:00", is_cancel=True)], MOSCOW_TZ))
+        assert _rollups() == {("wb", day, 11): 1, ("ozon", day, 10): 3}
+        record_events(wb_rows("order", orders, MOSCOW_TZ))
+        assert _rollups() == {("wb", day, 10): 1, ("wb", day, 11): 1, ("ozon", day, 10): 3}
+
+        incremental = _rollups()
+        db.session.query(HourlyRollup).delete()
+        db.session.commit()
+        assert rebuild_rollups(day, day, MOSCOW_TZ) == 3
+        assert _rollups() == incremental
+
+
+def test_redetected_sale_moves_to_new_hour(app):
+    """Проверяет, что выкуп Ozon, замеченный заново в другое время, переносится из старого часа в новый."""
+    posting = OzonPosting.model_validate({
+        "posting_number": "P-1", "status": "delivered", "in_process_at": "2024-06-01T05:00:00Z",
+        "products": [{"quantity": 2, "offer_id": "101"}],
+    })
+    day = date(2024, 6, 1)
+    with app.app_context():
+        first = datetime(2024, 6, 1, 7, 10, tzinfo=timezone.utc)  # 10 ч по Москве
+        record_events(ozon_rows("client1", [posting], MOSCOW_TZ, kind="sale", occurred_at=first))
+        sales = lambda: {(r.date, r.hour): r.count for r in HourlyRollup.query.filter_by(kind="sale") if r.count}
+        assert sales() == {(day, 10): 2}
+
+        again = datetime(2024, 6, 1, 10, 40, tzinfo=timezone.utc)  # 13 ч
+        record_events(ozon_rows("client1", [posting], MOSCOW_TZ, kind="sale", occurred_at=again))
+        assert sales() == {(day, 13): 2}
+
+        incremental = _rollups()
+        db.session.query(HourlyRollup).delete()
+        db.session.commit()
+        rebuild_rollups(day, day, MOSCOW_TZ)
+        assert _rollups() == incremental
+
+
+def test_intraday_curves_compare_days(app):
+    """Проверяет накопленные кривые сегодня / вчера / неделю назад и API."""
+    orders = [
+        _wb_order("y1", "2024-05-31T06:00:00+00:00"),  # вчера, 9 ч
+        _wb_order("y2", "2024-05-31T12:00:00+00:00"),  # вчера, 15 ч
+        _wb_order("w1", "2024-05-25T07:00:00+00:00"),  # неделю назад, 10 ч
+        _wb_order("t1", "2024-06-01T07:05:00+00:00"),  # сегодня, 10 ч
+    ]
+    with app.app_context():
+        record_events(wb_rows("order", orders, MOSCOW_TZ))
+        curves = intraday_curves(date(2024, 6, 1), now_hour=12, marketplace="wb")
+    assert curves["today"][9:14] == [0, 1, 1, 1, None]
+    assert curves["yesterday"][9:16] == [1, 1, 1, 1, 1, 1, 2]
+    assert curves["last_week"][10] == 1 and curves["last_week"][-1] == 1
+
+    resp = app.test_client().get("/api/intraday?marketplace=ozon&date=2024-06-01")
+    assert resp.status_code == 200
+    assert resp.get_json()["today"][-1] == 0
+    assert app.test_client().get("/api/intraday?kind=returns").status_code == 400
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+from app.utils import sqlite_cache
+from app.utils.sqlite_cache import SQLiteCache
+
+
+def test_values_are_shared_between_instances(tmp_path):
+    """Проверяет обмен значениями между «воркерами» и отсутствие повторной распаковки."""
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = SQLiteCache(path), SQLiteCache(path)
+
+    writer.set("k", {"total": 1})
+    assert reader.get("k") == {"total": 1}
+    with patch.object(sqlite_cache, "loads", wraps=sqlite_cache.loads) as loads:
+        assert reader.get("k") == {"total": 1}
+        assert loads.call_count == 0
+        writer.set("k", {"total": 2})
+        assert reader.get("k") == {"total": 2}
+        assert loads.call_count == 1
+
+    assert reader.add("k", "other") is False
+    writer.delete("k")
+    assert reader.get("k") is None
+    assert reader.add("k", "other") is True
+
+
+def test_expiry_and_lru_eviction(tmp_path):
+    """Проверяет просрочку записей и вытеснение давно не читавшихся при превышении лимита."""
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"), threshold=2, touch_interval=0)
+    cache.set("expired", 1, timeout=-1)
+    assert cache.get("expired") is None
+
+    cache.set("a", "a")
+    cache.set("b", "b")
+    cache.get("a")
+    cache.set("c", "c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
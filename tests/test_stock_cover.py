@@ -0,0 +1,112 @@
+import pytest
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from flask import Flask
+from app import cache
+from app.models import db, StockCover
+from app.presenters import prepare_dashboard_context
+from app.routes.dashboard import dashboard_bp
+from app.schemas import OzonPosting, WBOrderItem
+from app.services.event_store import ozon_rows, record_events, wb_rows
+from app.services.stock_cover import TOTAL, refresh_cover, sku_cover
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE="SimpleCache",
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        STOCK_VELOCITY_DAYS=10,
+    )
+    cache.init_app(app)
+    db.init_app(app)
+    app.register_blueprint(dashboard_bp)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _wb_order(srid: str, when: str, warehouse: str, is_cancel: bool = False) -> WBOrderItem:
+    return WBOrderItem.model_validate({
+        "srid": srid, "date": when, "supplierArticle": "art1",
+        "oblastOkrugName": "MSK", "warehouseName": warehouse, "isCancel": is_cancel,
+    })
+
+
+def test_cover_combines_stock_and_orders(app):
+    """
+    Проверяет скорость и запас в днях по складам и итог по SKU: отмены и
+    заказы вне окна не учитываются, склад без заказов — без оценки,
+    склад с заказами без остатка — с нулевым запасом. Пересчет заменяет индекс.
+    """
+    now = datetime(2024, 6, 20, 12, 0)
+    orders = [_wb_order(f"k{i}", f"2024-06-{12 + i}T09:00:00+00:00", "Коледино") for i in range(5)]
+    orders += [
+        _wb_order("c1", "2024-06-19T09:00:00+00:00", "Коледино", is_cancel=True),
+        _wb_order("old", "2024-06-01T09:00:00+00:00", "Коледино"),
+        _wb_order("e1", "2024-06-19T10:00:00+00:00", "Электросталь"),
+    ]
+    stock = {("art1", "Коледино"): 20, ("art1", "Казань"): 4}
+    with app.app_context():
+        record_events(wb_rows("order", orders, MOSCOW_TZ))
+        assert refresh_cover("wb", stock, now) == 4
+        db.session.commit()
+        rows = {r.warehouse_name: r for r in StockCover.query.filter_by(marketplace="wb")}
+        assert (rows["Коледино"].ordered, rows["Коледино"].velocity, rows["Коледино"].days_of_cover) == (5, 0.5, 40.0)
+        assert rows["Казань"].days_of_cover is None
+        assert (rows["Электросталь"].quantity, rows["Электросталь"].days_of_cover) == (0, 0.0)
+        assert (rows[TOTAL].quantity, rows[TOTAL].ordered, rows[TOTAL].days_of_cover) == (24, 6, 40.0)
+
+        refresh_cover("wb", {("art1", "Коледино"): 1}, now)
+        db.session.commit()
+        cover = sku_cover("wb")
+        assert cover["art1"]["Коледино"] == 2.0 and "Казань" not in cover["art1"]
+
+    resp = app.test_client().get("/api/stock-cover?marketplace=wb&max_days=5")
+    assert [(r["warehouse"], r["days_of_cover"]) for r in resp.get_json()["rows"]] == [("Электросталь", 0.0), ("Коледино", 2.0)]
+    totals = app.test_client().get("/api/stock-cover?total=1").get_json()["rows"]
+    assert [(r["sku"], r["warehouse"]) for r in totals] == [("art1", TOTAL)]
+    assert app.test_client().get("/api/stock-cover?max_days=soon").status_code == 400
+
+
+def test_ozon_cover_is_per_sku_and_short_history_shortens_window(app):
+    """
+    Проверяет, что для Ozon (заказы по кластерам, остатки по складам) пишутся
+    только итоги по SKU, а скорость считается за реально покрытое историей окно.
+    """
+    now = datetime(2024, 6, 20, 12, 0)
+    posting = OzonPosting.model_validate({
+        "posting_number": "P-1", "status": "delivering", "in_process_at": "2024-06-18T12:00:00Z",
+        "cluster_from": "Москва, МО и Дальние регионы",
+        "products": [{"quantity": 4, "offer_id": "101"}],
+    })
+    stock = {("101", "ХОРУГВИНО_РФЦ"): 10, ("101", "ПУШКИНО_1_РФЦ"): 6}
+    with app.app_context():
+        record_events(ozon_rows("client1", [posting], MOSCOW_TZ))
+        assert refresh_cover("ozon", stock, now) == 1
+        db.session.commit()
+        row = StockCover.query.filter_by(marketplace="ozon").one()
+        # История — 2 дня из 10: 4 заказа / 2 дня = 2 в сутки, 16 штук — на 8 дней
+        assert (row.warehouse_name, row.quantity, row.ordered, row.velocity, row.days_of_cover) == (TOTAL, 16, 4, 2.0, 8.0)
+
+
+def test_tiles_show_cover():
+    """Проверяет запас в днях в плитке остатков и подсказке по складам."""
+    wb_data = {
+        "stocks": {
+            "total": 3,
+            "stock_table": {"strings": ["Коледино"], "skus": ("art1",), "rows": ((3, 0, 0, ((0, 3),)),)},
+        },
+        "today": {},
+    }
+    context = prepare_dashboard_context(
+        wb_data, {"error": True}, datetime(2024, 6, 20, 12, 0),
+        cover={"wb": {"art1": {TOTAL: 2.4, "Коледино": 2.4}}},
+    )
+    stocks = context["stocks_wb"]
+    assert "≈2 дн." in stocks["sku_items"][0]["cover"] and "text-danger" in stocks["sku_items"][0]["cover"]
+    assert stocks["sku_tooltips"]["art1"] == "Коледино: 3 (≈2 дн.)"
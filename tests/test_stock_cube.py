@@ -0,0 +1,71 @@
+import pickle
+import pytest
+from unittest.mock import patch
+from flask import Flask
+from app import cache
+from app.routes.dashboard import dashboard_bp
+from app.utils.compact import StockTableBuilder
+from app.utils.stock_cube import FROM_CLIENT, TO_CLIENT, StockCube, stock_cube
+
+
+def _tables() -> dict:
+    wb = StockTableBuilder()
+    wb.add("art1", "Коледино", 7, in_way_to=2, in_way_from=1)
+    wb.add("art1", "Казань", 3)
+    wb.add("art2", "Коледино", 0)
+    ozon = StockTableBuilder()
+    ozon.add("art1", "Москва", 5, in_way_to=4)
+    ozon.add("101", "Москва", 6)
+    ozon.add("101", "Казань", 1)
+    return {"wb": wb.build(), "ozon": ozon.build()}
+
+
+def test_cube_slices():
+    """
+    Проверяет итоги, товар на обоих маркетплейсах, склады товара и рейтинги
+    складов и товаров, а также то, что куб переживает кэширование (pickle).
+    """
+    cube = pickle.loads(pickle.dumps(StockCube.build(_tables(), version="v1")))
+    assert cube.version == "v1"
+    assert (cube.total(), cube.total(marketplace="wb"), cube.total(TO_CLIENT), cube.total(FROM_CLIENT, "ozon")) == (22, 10, 6, 0)
+    assert cube.product("art1") == {"wb": (10, 2, 1), "ozon": (5, 4, 0)}
+    assert cube.product("art2") == {"wb": (0, 0, 0)}
+    assert cube.product_rows("wb") == [("art1", 10, 2, 1), ("art2", 0, 0, 0)]
+    assert cube.product_warehouses("wb", "art1") == [("Коледино", 7), ("Казань", 3)]
+    assert cube.warehouse_ranking() == [("Москва", 11), ("Коледино", 7), ("Казань", 4)]
+    assert cube.warehouse_ranking("ozon", limit=1) == [("Москва", 11)]
+    assert [(sku, total) for sku, total, _parts in cube.product_ranking()] == [("art1", 15), ("101", 7), ("art2", 0)]
+
+
+@pytest.fixture
+def app():
+    """Создает экземпляр Flask-приложения с кэшем в памяти."""
+    app = Flask(__name__)
+    app.config.update(CACHE_TYPE="SimpleCache", WB_API_TOKEN="fake_token")
+    cache.init_app(app)
+    app.register_blueprint(dashboard_bp)
+    with app.app_context():
+        cache.clear()
+    return app
+
+
+def test_cube_is_built_once_per_version(app):
+    """Проверяет, что куб строится заново только при новой загрузке источников и отдается через API."""
+    tables = _tables()
+    wb_stocks = {"stock_table": tables["wb"], "total": 10, "fetched_at": "2024-06-01T10:00:00+00:00"}
+    with app.app_context(), patch.object(StockCube, "build", wraps=StockCube.build) as build:
+        first = stock_cube(wb_stocks, None)
+        assert stock_cube(dict(wb_stocks), None) is first
+        assert build.call_count == 1
+        stock_cube(dict(wb_stocks, fetched_at="2024-06-01T10:30:00+00:00"), None)
+        assert build.call_count == 2
+
+    with patch("app.routes.dashboard.wb_fetch_stocks", return_value=wb_stocks):
+        client = app.test_client()
+        totals = client.get("/api/stocks").get_json()["data"]
+        assert totals["all"] == {"available": 10, "to_client": 2, "from_client": 1}
+        ranking = client.get("/api/stocks?view=warehouses&marketplace=wb").get_json()["data"]
+        assert ranking == [{"warehouse": "Коледино", "quantity": 7}, {"warehouse": "Казань", "quantity": 3}]
+        product = client.get("/api/stocks?view=product&sku=art1").get_json()["data"]
+        assert product["wb"]["available"] == 10 and product["wb"]["warehouses"][0]["warehouse"] == "Коледино"
+        assert client.get("/api/stocks?metric=reserved").status_code == 400
@@ -0,0 +1,68 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from app.models import db, StockDelta
+from app.services.stock_history import record_state, state_at, sku_series
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой."""
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}",
+        STOCK_KEYFRAME_INTERVAL_HOURS=24,
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_record_state_writes_only_changes_and_reconstructs(app):
+    """
+    Проверяет, что между keyframe пишутся только изменения, а состояние
+    на любой момент и история SKU восстанавливаются корректно.
+    """
+    t0 = datetime(2024, 6, 1, 0, 0)
+    t1, t2, t3 = t0 + timedelta(minutes=30), t0 + timedelta(hours=1), t0 + timedelta(hours=25)
+    base = {("art1", "Коледино"): 10, ("art1", "Казань"): 5, ("art2", "Коледино"): 3}
+
+    with app.app_context():
+        assert record_state("wb", base, t0) == 3
+        assert record_state("wb", base, t1) == 0
+        assert record_state("wb", {("art1", "Коледино"): 8, ("art2", "Коледино"): 3}, t2) == 2
+        db.session.commit()
+
+        assert state_at("wb", t1) == base
+        assert state_at("wb", t2) == {("art1", "Коледино"): 8, ("art2", "Коледино"): 3}
+        assert state_at("wb", t2, sku="art2") == {("art2", "Коледино"): 3}
+        assert state_at("wb", t0 - timedelta(seconds=1)) == {}
+
+        # Через сутки после предыдущего keyframe пишется полный срез и нули для исчезнувших пар
+        assert record_state("wb", {("art1", "Коледино"): 8}, t3) == 2
+        db.session.commit()
+        assert StockDelta.query.filter_by(is_keyframe=True, captured_at=t3).count() == 2
+
+        series = sku_series("wb", "art2", t0, t3)
+        assert series == [
+            (t0, {"Коледино": 3}),
+            (t3, {}),
+        ]
+        assert sku_series("wb", "art1", t0, t2) == [
+            (t0, {"Коледино": 10, "Казань": 5}),
+            (t2, {"Коледино": 8}),
+        ]
+
+
+def test_keyframe_with_empty_state_clears_stock(app):
+    """Проверяет, что остатки, пропавшие целиком к моменту keyframe, обнуляются в истории."""
+    t0 = datetime(2024, 6, 1, 0, 0)
+    t1 = t0 + timedelta(hours=25)
+    with app.app_context():
+        record_state("wb", {("art1", "Коледино"): 10, ("art2", "Казань"): 2}, t0)
+        assert record_state("wb", {}, t1) == 2
+        db.session.commit()
+        assert state_at("wb", t1) == {}
+        assert state_at("wb", t1 + timedelta(hours=1)) == {}
+        assert sku_series("wb", "art1", t0, t1) == [(t0, {"Коледино": 10}), (t1, {})]
@@ -0,0 +1,58 @@
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from app.models import db, KeyValue
+from app.utils import storage
+from app.utils.persistent_cache import deferred_writes, load_from_persistent_cache, save_to_persistent_cache
+
+STORAGE_CONFIG = dict(
+    SQLITE_BUSY_TIMEOUT_MS=2000,
+    SQLITE_SYNCHRONOUS="NORMAL",
+    DB_WRITE_QUEUE=True,
+    DB_POOL_SIZE=3,
+    DB_MAX_OVERFLOW=2,
+    DB_POOL_TIMEOUT_SECONDS=5,
+    DB_POOL_RECYCLE_SECONDS=600,
+    DB_STATEMENT_TIMEOUT_MS=15000,
+)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Создает экземпляр Flask-приложения с временной SQLite-базой и очередью записи."""
+    monkeypatch.setattr(storage, "_writer", None)
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}", **STORAGE_CONFIG)
+    storage.configure_engine(app)
+    db.init_app(app)
+    storage.init_storage(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_sqlite_pragmas_and_write_queue(app):
+    """Проверяет режим WAL и то, что записи из запроса фиксирует поток-писатель."""
+    with app.app_context():
+        assert db.session.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert db.session.execute(text("PRAGMA busy_timeout")).scalar() == 2000
+
+        for i in range(5):
+            save_to_persistent_cache(f"key{i}", {"value": i})
+        assert storage._writer.flush(timeout=5)
+        db.session.rollback()
+        assert KeyValue.query.count() == 5
+        assert load_from_persistent_cache("key3") == {"value": 3}
+
+        # Внутри deferred_writes записи остаются у вызывающего, а не в очереди
+        with deferred_writes() as writes:
+            save_to_persistent_cache("batched", {"value": 1})
+        assert len(writes) == 1
+
+
+def test_postgres_engine_options():
+    """Проверяет параметры пула и statement_timeout для Postgres."""
+    options = storage.engine_options(dict(SQLALCHEMY_DATABASE_URI="postgresql://u:p@db/app", **STORAGE_CONFIG))
+    assert options["pool_size"] == 3
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"options": "-c statement_timeout=15000"}
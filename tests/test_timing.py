@@ -0,0 +1,53 @@
+import os
+from flask import Flask
+from app.utils.metrics import observe_cache
+from app.utils.profiling import init_profiling
+from app.utils.timing import init_server_timing, span
+
+
+def _make_app(tmp_path) -> Flask:
+    app = Flask(__name__)
+    app.config.update(
+        ADMIN_TOKEN="secret",
+        PROFILING_ENABLED=True,
+        PROFILE_SAMPLE_RATE=1.0,
+        PROFILE_SLOW_MS=0,
+        PROFILE_DIR=str(tmp_path),
+        PROFILE_MAX_FILES=2,
+    )
+    init_server_timing(app)
+    init_profiling(app)
+
+    @app.route("/")
+    def index():
+        with span("wb_stocks"):
+            with observe_cache("load_stocks") as outcome:
+                outcome["result"] = "miss"
+        with span("render_template"):
+            return "ok"
+
+    return app
+
+
+def test_server_timing_header(tmp_path):
+    """Проверяет, что интервалы и исход кэша попадают в Server-Timing."""
+    client = _make_app(tmp_path).test_client()
+    header = client.get("/").headers["Server-Timing"]
+    names = [part.split(";")[0] for part in header.split(", ")]
+    assert names == ["wb_stocks", "render_template"]
+    assert 'desc="miss"' in header
+
+
+def test_profiler_only_for_admin_with_retention(tmp_path):
+    """
+    Проверяет, что профиль пишется только для запросов администратора
+    и хранится не больше PROFILE_MAX_FILES файлов.
+    """
+    client = _make_app(tmp_path).test_client()
+    client.get("/")
+    assert os.listdir(tmp_path) == []
+
+    for _ in range(4):
+        client.get("/", headers={"X-Admin-Token": "secret"})
+    files = [f for f in os.listdir(tmp_path) if f.endswith(".pstats")]
+    assert len(files) == 2
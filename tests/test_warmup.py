@@ -0,0 +1,53 @@
+import pytest
+from zoneinfo import ZoneInfo
+from unittest.mock import MagicMock
+from flask import Flask
+from app.services import wb_api, warmup, http_client
+from app import cache
+from app.utils.circuit_breaker import reset_breakers
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+
+
+@pytest.fixture
+def app():
+    """Создает экземпляр Flask-приложения для тестов."""
+    app = Flask(__name__)
+    app.config["CACHE_TYPE"] = "SimpleCache"
+    app.config["WB_API_TOKEN"] = "fake_token"
+    app.config["OZON_ACCOUNTS"] = []
+    cache.init_app(app)
+    reset_breakers()
+    with app.app_context():
+        cache.clear()
+    return app
+
+
+def test_warm_up_serves_snapshot_then_revalidates(monkeypatch, app):
+    """
+    Проверяет, что прогретый снимок отдается без запросов к API с исходным
+    fetched_at, а фоновое обновление заменяет его свежими данными.
+    """
+    snapshot = {"total": 42, "skus": [["art1", 42]], "fetched_at": "2024-05-01T09:00:00+00:00"}
+    monkeypatch.setattr(warmup, "load_from_persistent_cache", lambda key: snapshot if key == "wb_stocks" else None)
+    mock_get = MagicMock(return_value=MagicMock(ok=True, json=lambda: []))
+    monkeypatch.setattr(http_client.requests, "get", mock_get)
+
+    assert warmup.warm_from_snapshots(app) == 1
+    with app.app_context():
+        stocks = wb_api.fetch_stocks("fake_token")
+    assert mock_get.call_count == 0
+    assert stocks["total"] == 42
+    assert stocks["warmed"] is True
+    assert stocks["fetched_at"] == snapshot["fetched_at"]
+
+    warmup.revalidate(app)
+    # Остатки, заказы и продажи
+    assert mock_get.call_count == 3
+    with app.app_context():
+        stocks = wb_api.fetch_stocks("fake_token")
+        assert wb_api.fetch_today_metrics("fake_token", MOSCOW_TZ)["ordered"] == 0
+        assert cache.get(warmup.REVALIDATE_LOCK_KEY) is None
+    assert stocks["total"] == 0
+    assert "warmed" not in stocks
+    assert mock_get.call_count == 3
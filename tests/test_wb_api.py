@@ -3,8 +3,10 @@ from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from unittest.mock import MagicMock
 from flask import Flask
-from app.services import wb_api
+from app.services import wb_api, http_client
 from app import cache
+from app.utils.circuit_breaker import reset_breakers
+from app.utils.compact import EventSummaryView
 
 MOSCOW_TZ = ZoneInfo("Europe/Moscow")
 
@@ -14,13 +16,14 @@ def app():
     app = Flask(__name__)
     app.config["CACHE_TYPE"] = "SimpleCache"
     cache.init_app(app)
+    reset_breakers()
     return app
 
 @pytest.fixture
 def mock_requests_get(monkeypatch):
     """Фикстура для мока requests.get"""
     mock_get = MagicMock()
-    monkeypatch.setattr(wb_api.requests, "get", mock_get)
+    monkeypatch.setattr(http_client.requests, "get", mock_get)
     return mock_get
 
 def test_fetch_today_metrics_filtering(mock_requests_get, app):
@@ -75,9 +78,27 @@ def test_fetch_today_metrics_filtering(mock_requests_get, app):
     assert metrics["purchased"] == 1
     
     # Проверяем детализацию
-    assert len(metrics["ordered_skus_details"]["art1"]) == 2
-    assert "art2" not in metrics["ordered_skus_details"]
-    assert "art3" not in metrics["ordered_skus_details"]
+    ordered_details = EventSummaryView(metrics["ordered_events"])
+    assert ordered_details["art1"].count == 2
+    assert ordered_details["art1"].latest[-1].city == "MSK"
+    assert "art2" not in ordered_details
+    assert "art3" not in ordered_details
     
-    assert len(metrics["purchased_skus_details"]["art1"]) == 1
-    assert "art2" not in metrics["purchased_skus_details"]
+    purchased_details = EventSummaryView(metrics["purchased_events"])
+    assert purchased_details["art1"].count == 1
+    assert "art2" not in purchased_details
+
+
+def test_force_refresh_drops_only_loader_caches(mock_requests_get, app):
+    """Проверяет, что ?force=1 сбрасывает ответы API, но не блокировки и прочие ключи кэша."""
+    from app.routes.dashboard import drop_loader_caches
+
+    mock_requests_get.return_value = MagicMock(ok=True, status_code=200, json=lambda: [])
+    with app.app_context():
+        cache.clear()
+        wb_api.load_stocks("fake_token")
+        cache.set("fetch_lock:other", 1)
+        drop_loader_caches()
+        wb_api.load_stocks("fake_token")
+        assert cache.get("fetch_lock:other") == 1
+    assert mock_requests_get.call_count == 2